@@ -1,16 +1,24 @@
 from fastapi import FastAPI, Response, APIRouter, Depends, HTTPException, Header, WebSocket, WebSocketDisconnect, Request
 from sqlalchemy.orm import Session
-from typing import Dict
+from sqlalchemy import func, select, tuple_, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from geoalchemy2.functions import ST_Distance, ST_DWithin, ST_GeogFromText
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Union
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
 import ambulancefinderservice
 from fastapi.middleware.cors import CORSMiddleware
 import json
-from datetime import datetime
-from db import get_session, engine
+from datetime import datetime, timezone
+from db import get_session, get_async_session, engine, async_engine, run_db, session_scope, async_session_scope, get_pool_stats
 # import models
 from models import Driver, Rider, TripRequest, DriverResponse, OngoingTrip, Notification
 from sqlmodel import SQLModel
 from db import engine
-from authservice import create_user, authenticate_user, get_current_user, get_current_user_flexible
+from authservice import create_user, authenticate_user, get_current_user, get_current_user_flexible, get_token_from_header_or_cookie, resolve_token, revoke_token
+from token_cache import token_cache
 from schema import (
     SignupRequest,
     SignupResponse,
@@ -21,79 +29,202 @@ from schema import (
     DriverLocationResponse
 )
 from schema import TokenData
-from driver_location_service import driver_location_service
+from driver_location_service import driver_location_service, parse_coordinates
+from location_writer import location_writer
+from notification_writer import notification_writer
+from rider_area_index import RiderAreaIndex, bounds_around, parse_bounds
+from connection_writer import ConnectionWriter
+from frames import Frame, frame_text
+from driver_feed import DriverFeed
+from location_throttle import location_throttle
+from trip_dispatcher import trip_dispatcher
+from driver_counters import driver_counters, DRIVER_COUNT_PUSH_INTERVAL, DRIVER_COUNT_RECONCILE_INTERVAL
+from user_identity import backfill_user_identities, replace_identifier
+
+# Seconds between batched driver-move frames to riders (0 sends immediately)
+RIDER_TICK_INTERVAL = float(os.getenv("RIDER_TICK_INTERVAL", "1.0"))
+# Radius (km) of the pending trip feed around a driver, and its upper bound
+TRIP_FEED_RADIUS_KM = float(os.getenv("TRIP_FEED_RADIUS_KM", "10"))
+TRIP_FEED_MAX_RADIUS_KM = float(os.getenv("TRIP_FEED_MAX_RADIUS_KM", "50"))
+# Default and maximum page size of the pending trip feed
+TRIP_FEED_PAGE_SIZE = int(os.getenv("TRIP_FEED_PAGE_SIZE", "20"))
+TRIP_FEED_MAX_PAGE_SIZE = 100
+# Default and maximum page size of the notification inbox
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_PAGE_SIZE", "50"))
+NOTIFICATIONS_MAX_PAGE_SIZE = 200
+# Statuses a notification can have
+NOTIFICATION_STATUSES = ("unread", "read", "accepted", "rejected")
+# Most notification ids accepted by one bulk status update
+NOTIFICATIONS_MAX_BULK_IDS = 1000
 
 class ConnectionManager:
     """
     Manages WebSocket connections for real-time communication.
     Maintains mappings of connections, user info, and driver locations.
+    Outbound messages are queued on a per-connection ConnectionWriter, so
+    sending never waits on a client's network.
     """
     def __init__(self):
         """
         active_connections: Dict[connection_id, WebSocket]
         """
         self.active_connections: Dict[str, WebSocket] = {}
+        # Maps connection_id to its outbound writer
+        self.writers: Dict[str, ConnectionWriter] = {}
         # Maps user_id to connection_id
         self.user_connections: Dict[int, str] = {}
+        # Maps connection_id to user_id
+        self.connection_users: Dict[str, int] = {}
+        # Connections evicted for being too slow
+        self.evicted_count = 0
         # Maps user_id to user info (role, etc.)
         self.user_info: Dict[int, dict] = {}
         # Store driver locations
         self.driver_locations: Dict[int, dict] = {}
+        # Connected rider ids
+        self.rider_ids: Set[int] = set()
+        # Connected driver ids
+        self.driver_ids: Set[int] = set()
+        # Areas of interest registered by riders via "subscribe-area"
+        self.rider_areas = RiderAreaIndex()
+        # Riders on the snapshot + delta driver feed
+        self.driver_feed = DriverFeed()
+        # Driver moves waiting for the next rider tick, by driver_id
+        self.pending_moves: Dict[int, dict] = {}
+        # Maps driver_id -> riders with an area its last position was sent to
+        self.driver_audiences: Dict[int, Set[int]] = {}
+        # Connections that asked for pushed driver counts
+        self.driver_count_subscribers: Set[str] = set()
 
     async def connect(self, websocket: WebSocket, connection_id: str, user_id: int = None, user_role: str = None):
         # Note: websocket.accept() should be called before calling this method
         self.active_connections[connection_id] = websocket
+        writer = ConnectionWriter(websocket, connection_id, on_evict=self._evict)
+        writer.start()
+        self.writers[connection_id] = writer
         if user_id:
             self.user_connections[user_id] = connection_id
+            self.connection_users[connection_id] = user_id
             self.user_info[user_id] = {
                 "role": user_role, "connection_id": connection_id}
+            if user_role == "rider":
+                self.rider_ids.add(user_id)
+            elif user_role == "driver":
+                self.driver_ids.add(user_id)
 
     def disconnect(self, connection_id: str, user_id: int = None):
         if connection_id in self.active_connections:
             del self.active_connections[connection_id]
-        if user_id and user_id in self.user_connections:
+        writer = self.writers.pop(connection_id, None)
+        if writer:
+            writer.stop()
+        self.driver_count_subscribers.discard(connection_id)
+        user_id = self.connection_users.pop(connection_id, user_id)
+        # Only drop the user mapping if it still points at this connection
+        if user_id and self.user_connections.get(user_id) == connection_id:
             del self.user_connections[user_id]
             if user_id in self.user_info:
                 del self.user_info[user_id]
             # Remove driver location if it was a driver
             if user_id in self.driver_locations:
                 del self.driver_locations[user_id]
-
-    async def send_personal_message(self, message: str, connection_id: str):
-        if connection_id in self.active_connections:
-            websocket = self.active_connections[connection_id]
-            await websocket.send_text(message)
-
-    async def send_to_user(self, message: str, user_id):
+            self.driver_audiences.pop(user_id, None)
+            self.rider_ids.discard(user_id)
+            self.driver_ids.discard(user_id)
+            self.rider_areas.unsubscribe(user_id)
+            self.driver_feed.unsubscribe(user_id)
+
+    def _evict(self, connection_id: str):
+        """Drop a connection whose client cannot keep up"""
+        self.evicted_count += 1
+        self.disconnect(connection_id)
+
+    async def send_personal_message(self, message: Union[Frame, str], connection_id: str, coalesce_key: Optional[Hashable] = None):
+        writer = self.writers.get(connection_id)
+        if writer:
+            return writer.enqueue(frame_text(message), coalesce_key)
+        return False
+
+    async def send_to_user(self, message: Union[Frame, str], user_id, coalesce_key: Optional[Hashable] = None):
         # Convert user_id to int for consistent lookup
         user_id_int = int(user_id)
-        print(f"🔍 Looking for user connection: {user_id_int}")
-        print(
-            f"🔍 Available user connections: {list(self.user_connections.keys())}")
-
-        if user_id_int in self.user_connections:
-            connection_id = self.user_connections[user_id_int]
-            print(
-                f"🔍 Found connection for user {user_id_int}: {connection_id}")
-            await self.send_personal_message(message, connection_id)
-            return True
-        else:
+        connection_id = self.user_connections.get(user_id_int)
+        if connection_id is None:
             print(f"❌ No connection found for user {user_id_int}")
             return False
+        return await self.send_personal_message(message, connection_id, coalesce_key)
 
-    async def broadcast_to_riders(self, message: str):
+    async def send_to_users(self, message: Union[Frame, str], user_ids: Iterable[int], coalesce_key: Optional[Hashable] = None):
+        """
+        Send the same message to several users.
+        The message is encoded once and the same text is queued for everyone.
+        """
+        text = None
+        for user_id in list(user_ids):
+            writer = self.writers.get(self.user_connections.get(int(user_id)))
+            if writer is None:
+                continue
+            if text is None:
+                text = frame_text(message)
+            writer.enqueue(text, coalesce_key)
+
+    async def dispatch_trip_request(self, message: Union[Frame, str], trip_data: dict):
+        """
+        Push a new trip request to the nearest available drivers.
+        Requests without a pickup point go to every connected driver.
+        """
+        req_id = trip_data.get("req_id")
+        latitude = trip_data.get("latitude")
+        longitude = trip_data.get("longitude")
+        if req_id is None or latitude is None or longitude is None:
+            await self.send_to_users(message, self.driver_ids)
+            return
+        trip_dispatcher.dispatch(
+            int(req_id), float(latitude), float(longitude),
+            message, self.send_to_users, self.driver_ids)
+
+    async def broadcast_to_riders(self, message: Union[Frame, str], coalesce_key: Optional[Hashable] = None):
         """Broadcast message only to riders"""
-        for user_id, info in self.user_info.items():
-            if info.get("role") == "rider":
-                await self.send_to_user(message, user_id)
+        await self.send_to_users(message, self.rider_ids, coalesce_key)
 
-    async def broadcast(self, message: str):
-        for connection_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(message)
-            except:
-                # Remove disconnected connections
-                self.disconnect(connection_id)
+    async def push_driver_counts(self, connection_ids: Optional[Iterable[str]] = None):
+        """
+        Push the current driver counts to subscribed connections.
+        A newer count replaces one that is still queued.
+        """
+        if connection_ids is None:
+            connection_ids = self.driver_count_subscribers
+        message = Frame({
+            "type": "driver-count",
+            "data": {
+                **driver_counters.snapshot(),
+                "connected_count": len(self.driver_ids),
+                "timestamp": datetime.now().isoformat()
+            }
+        })
+        for connection_id in list(connection_ids):
+            writer = self.writers.get(connection_id)
+            if writer:
+                writer.enqueue(frame_text(message), "driver-count")
+
+    async def broadcast(self, message: Union[Frame, str]):
+        text = frame_text(message)
+        # Snapshot: evictions may remove writers while we enqueue
+        for writer in list(self.writers.values()):
+            writer.enqueue(text)
+
+    def get_stats(self) -> dict:
+        """Get outbound queue statistics across all connections"""
+        writers = list(self.writers.values())
+        return {
+            "connections": len(writers),
+            "queued_frames": sum(writer.depth for writer in writers),
+            "max_lag_seconds": round(max((writer.lag() for writer in writers), default=0.0), 3),
+            "sent": sum(writer.stats["sent"] for writer in writers),
+            "coalesced": sum(writer.stats["coalesced"] for writer in writers),
+            "dropped": sum(writer.stats["dropped"] for writer in writers),
+            "evicted": self.evicted_count
+        }
 
     def update_driver_location(self, driver_id: int, latitude: float, longitude: float):
         """Update driver location and return nearby riders"""
@@ -104,10 +235,175 @@ class ConnectionManager:
         }
         return self.get_nearby_riders(driver_id, latitude, longitude)
 
-    def get_nearby_riders(self, driver_id: int, latitude: float, longitude: float, radius_km: float = 5.0):
-        """Get riders within radius of driver (simplified - in real app would use proper geospatial queries)"""
-        # For now, return all riders - in production you'd calculate actual distance
-        return [user_id for user_id, info in self.user_info.items() if info.get("role") == "rider"]
+    def get_nearby_riders(self, driver_id: int, latitude: float, longitude: float):
+        """
+        Get riders whose registered area of interest contains the driver.
+        Riders that never registered an area still receive every update.
+        """
+        riders = self.rider_areas.riders_for(latitude, longitude)
+        if len(self.rider_areas) < len(self.rider_ids):
+            riders.update(
+                user_id for user_id in self.rider_ids
+                if user_id not in self.rider_areas
+            )
+        return riders
+
+    def update_rider_area(self, user_id: int, area: dict):
+        """
+        Register a rider's area of interest from a "subscribe-area" payload.
+        Accepts either south/west/north/east bounds or latitude/longitude
+        with an optional radius_km (default 5 km).
+
+        Returns:
+            tuple: The registered (south, west, north, east), or None if the
+            payload is not a valid area; the previous area is then kept
+        """
+        if all(key in area for key in ("south", "west", "north", "east")):
+            bounds = parse_bounds(
+                area["south"], area["west"], area["north"], area["east"])
+        else:
+            center = parse_coordinates(area.get("latitude"), area.get("longitude"))
+            try:
+                radius_km = float(area.get("radius_km", 5.0))
+            except (TypeError, ValueError):
+                radius_km = math.nan
+            if center is None or not (math.isfinite(radius_km) and radius_km >= 0):
+                return None
+            bounds = bounds_around(*center, radius_km)
+        if bounds is None:
+            return None
+        self.rider_areas.subscribe(user_id, bounds)
+        return bounds
+
+    async def broadcast_driver_location(self, message: Union[Frame, str], driver_id: int, latitude: float, longitude: float):
+        """
+        Queue a driver location update for the riders that can see it.
+        Moves are held until the next rider tick, so each rider gets at
+        most one update per driver per tick.
+        """
+        pending = self.pending_moves.get(driver_id)
+        is_new = driver_id not in self.driver_locations or bool(pending and pending["is_new"])
+        self.driver_locations[driver_id] = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "timestamp": datetime.now().isoformat()
+        }
+        self.pending_moves[driver_id] = {"message": message, "is_new": is_new}
+
+        if RIDER_TICK_INTERVAL <= 0:
+            await self.flush_driver_moves()
+
+    async def flush_driver_moves(self):
+        """
+        Send all driver moves since the last tick.
+        Delta riders get one "drivers-delta" frame with every move they can
+        see; other riders get the latest "driver-location" per driver.
+        Riders whose area the driver has left get a final "remove" op
+        (delta riders) or the driver's final position (other riders).
+        """
+        if not self.pending_moves:
+            return
+        moves, self.pending_moves = self.pending_moves, {}
+
+        delta_ops: Dict[int, List[str]] = {}
+        for driver_id, move in moves.items():
+            location = self.driver_locations.get(driver_id)
+            if location is None:
+                continue
+            riders = self.get_nearby_riders(
+                driver_id, location["latitude"], location["longitude"])
+            # Only riders with an area can lose sight of a driver
+            in_area = {user_id for user_id in riders if user_id in self.rider_areas}
+            previous = self.driver_audiences.get(driver_id, set())
+            self.driver_audiences[driver_id] = in_area
+            # Still-connected riders that saw the driver last time but not now
+            exited = (previous - in_area) & self.rider_ids
+
+            if self.driver_feed:
+                op_texts = {}
+                legacy_riders = []
+                for user_id in riders:
+                    if user_id not in self.driver_feed:
+                        legacy_riders.append(user_id)
+                        continue
+                    entered = user_id in in_area and user_id not in previous
+                    op = "add" if move["is_new"] or entered else "move"
+                    if op not in op_texts:
+                        op_texts[op] = self.driver_feed.encode_op({
+                            "op": op,
+                            "id": driver_id,
+                            "latitude": location["latitude"],
+                            "longitude": location["longitude"],
+                            "timestamp": location["timestamp"]
+                        })
+                    delta_ops.setdefault(user_id, []).append(op_texts[op])
+
+                remove_text = None
+                for user_id in exited:
+                    if user_id not in self.driver_feed:
+                        legacy_riders.append(user_id)
+                        continue
+                    if remove_text is None:
+                        remove_text = self.driver_feed.encode_op({"op": "remove", "id": driver_id})
+                    delta_ops.setdefault(user_id, []).append(remove_text)
+                riders = legacy_riders
+            else:
+                riders = riders | exited
+
+            # Only the newest position of a driver matters while it is still queued
+            await self.send_to_users(move["message"], riders, ("driver-location", driver_id))
+
+        for user_id, op_texts in delta_ops.items():
+            await self.send_to_user(self.driver_feed.delta_text(user_id, op_texts), user_id)
+
+    async def remove_drivers(self, driver_ids: List[int], active_drivers: Dict[int, dict]):
+        """
+        Tell riders that drivers went offline.
+        Delta riders get a "remove" delta; other riders get the full list.
+        """
+        op_texts = []
+        for driver_id in driver_ids:
+            self.driver_locations.pop(driver_id, None)
+            self.pending_moves.pop(driver_id, None)
+            self.driver_audiences.pop(driver_id, None)
+            op_texts.append(self.driver_feed.encode_op({"op": "remove", "id": driver_id}))
+
+        if op_texts:
+            for user_id in list(self.driver_feed.sequences):
+                await self.send_to_user(self.driver_feed.delta_text(user_id, op_texts), user_id)
+
+        legacy_riders = [user_id for user_id in self.rider_ids if user_id not in self.driver_feed]
+        if driver_ids and legacy_riders:
+            await self.send_to_users(Frame({
+                "type": "nearby-drivers",
+                "data": [
+                    {
+                        "id": driver_id,
+                        "latitude": info["latitude"],
+                        "longitude": info["longitude"],
+                        "timestamp": info["timestamp"]
+                    }
+                    for driver_id, info in active_drivers.items()
+                ]
+            }), legacy_riders, ("nearby-drivers",))
+
+    async def send_driver_snapshot(self, user_id: int, active_drivers: Dict[int, dict]):
+        """Put a rider on the delta feed and send it a full snapshot"""
+        drivers = [
+            {
+                "id": driver_id,
+                "latitude": info["latitude"],
+                "longitude": info["longitude"],
+                "timestamp": info["timestamp"]
+            }
+            for driver_id, info in active_drivers.items()
+            if user_id not in self.rider_areas
+            or self.rider_areas.contains(user_id, info["latitude"], info["longitude"])
+        ]
+        if user_id in self.rider_areas:
+            for driver in drivers:
+                self.driver_audiences.setdefault(driver["id"], set()).add(user_id)
+        await self.send_to_user(self.driver_feed.snapshot_text(user_id, drivers), user_id)
 
     def get_all_driver_locations(self):
         """Get all active driver locations"""
@@ -118,55 +414,194 @@ manager = ConnectionManager()
 
 
 async def save_notification_to_db(notification_data: dict):
-    """Helper function to save notification to database"""
+    """
+    Helper function to save notification to database.
+    Rows are batched with other notifications; returns the new id.
+    """
+    return await notification_writer.save(notification_data)
+
+
+def _parse_driver_location(driver_id, latitude, longitude):
+    """
+    Validate a driver location sent over the socket.
+    Returns (driver_id, latitude, longitude), or None if any part is invalid.
+    """
+    coordinates = parse_coordinates(latitude, longitude)
+    if coordinates is None or isinstance(driver_id, bool):
+        return None
     try:
-        from db import SessionLocal
-        session = SessionLocal()
+        driver_id = int(driver_id)
+    except (TypeError, ValueError):
+        return None
+    return (driver_id, *coordinates)
+
+
+def _get_available_driver_locations():
+    """Load available drivers with their stored locations (blocking)."""
+    from sqlmodel import select
+    from models import Driver, DriverLocation
+
+    with session_scope() as db:
+        # Get only available drivers with their locations, projecting the
+        # columns the map needs rather than whole rows
+        statement = select(
+            Driver.driver_id, Driver.name,
+            DriverLocation.latitude, DriverLocation.longitude
+        ).join(
+            DriverLocation, Driver.driver_id == DriverLocation.driver_id
+        ).filter(Driver.is_available == True)
+        results = db.exec(statement).all()
+
+    timestamp = datetime.now().isoformat()
+    return [
+        {
+            "id": driver_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "timestamp": timestamp,
+            "name": name,
+            "status": "available"
+        }
+        for driver_id, name, latitude, longitude in results
+    ]
 
-        print(f"💾 Inserting notification into database...")
-        print(
-            f"   - Recipient: {notification_data.get('recipient_id')} ({notification_data.get('recipient_type')})")
-        print(
-            f"   - Sender: {notification_data.get('sender_id')} ({notification_data.get('sender_type')})")
-        print(f"   - Type: {notification_data.get('notification_type')}")
-        print(f"   - Amount: ৳{notification_data.get('bid_amount')}")
 
-        notification = Notification(
-            recipient_id=notification_data.get("recipient_id"),
-            recipient_type=notification_data.get("recipient_type", "rider"),
-            sender_id=notification_data.get("sender_id"),
-            sender_type=notification_data.get("sender_type", "driver"),
-            notification_type=notification_data.get(
-                "notification_type", "bid"),
-            title=notification_data.get("title"),
-            message=notification_data.get("message"),
-            req_id=notification_data.get("req_id"),
-            bid_amount=notification_data.get("bid_amount"),
-            original_amount=notification_data.get("original_amount"),
-            pickup_location=notification_data.get("pickup_location"),
-            destination=notification_data.get("destination"),
-            driver_name=notification_data.get("driver_name"),
-            driver_mobile=notification_data.get("driver_mobile"),
-            rider_name=notification_data.get("rider_name"),
-            status="unread"
-        )
+def _close_dispatch(req_id):
+    """Stop dispatching a trip request a driver has bid on."""
+    try:
+        req_id = int(req_id)
+    except (TypeError, ValueError):
+        if req_id is not None:
+            print(f"⚠️ Bid for unknown trip request {req_id!r}")
+        return
+    trip_dispatcher.close(req_id)
 
-        session.add(notification)
-        session.commit()
-        notification_id = notification.notification_id
-        session.close()
 
-        print(
-            f"✅ Notification successfully inserted into database with ID: {notification_id}")
-        return notification_id
+def _get_trip_rider_name(req_id):
+    """Look up the rider name for a trip request (blocking)."""
+    rider_name = "Rider"  # Default fallback
+    try:
+        with session_scope() as session:
+            # Join trip request to rider in one round-trip
+            rider = session.query(Rider.name, Rider.email).join(
+                TripRequest, TripRequest.rider_id == Rider.rider_id
+            ).filter(
+                TripRequest.req_id == req_id
+            ).first()
+        if rider:
+            rider_name = rider.name or rider.email or "Rider"
     except Exception as e:
-        print(f"❌ Error saving notification to database: {str(e)}")
-        if 'session' in locals():
-            session.rollback()
-            session.close()
-        return None
+        print(f"⚠️ Could not fetch rider name: {e}")
+        rider_name = "Rider"
+    return rider_name
+
+
+def _get_rider_and_driver_names(rider_id, driver_id):
+    """Look up rider and driver display names (blocking)."""
+    rider_name = "Rider"  # Default fallback
+    driver_name = "Driver"  # Default fallback
+    try:
+        # Both names as scalar subqueries of a single SELECT
+        rider_display = select(
+            func.coalesce(func.nullif(Rider.name, ""), Rider.email)
+        ).where(Rider.rider_id == rider_id).scalar_subquery()
+        driver_display = select(
+            func.coalesce(func.nullif(Driver.name, ""), Driver.email)
+        ).where(Driver.driver_id == driver_id).scalar_subquery()
+        with session_scope() as session:
+            names = session.execute(select(rider_display, driver_display)).first()
+
+        if names:
+            rider_name = names[0] or rider_name
+            driver_name = names[1] or driver_name
+    except Exception as e:
+        print(f"⚠️ Could not fetch names: {e}")
+    return rider_name, driver_name
+
+
+async def _reconcile_driver_counts():
+    """Periodically recount drivers to correct drift in the cached counters."""
+    while True:
+        await asyncio.sleep(DRIVER_COUNT_RECONCILE_INTERVAL)
+        try:
+            drift = await run_db(driver_counters.reconcile)
+            if drift:
+                print(f"⚠️ Driver counters drifted by {drift}; reconciled")
+        except Exception as e:
+            print(f"❌ Error reconciling driver counts: {e}")
+
+
+async def _push_driver_counts():
+    """Push driver counts to subscribers whenever they change."""
+    last_sent = None
+    while True:
+        await asyncio.sleep(DRIVER_COUNT_PUSH_INTERVAL)
+        try:
+            current = (driver_counters.version, len(manager.driver_ids))
+            if current != last_sent and manager.driver_count_subscribers:
+                await manager.push_driver_counts()
+                last_sent = current
+        except Exception as e:
+            print(f"❌ Error pushing driver counts: {e}")
+
+
+# Seconds between sweeps for drivers that stopped sending locations
+DRIVER_SWEEP_INTERVAL = 30
+
+
+async def _sweep_inactive_drivers():
+    """Periodically drop stale drivers and tell riders about it."""
+    while True:
+        await asyncio.sleep(DRIVER_SWEEP_INTERVAL)
+        try:
+            removed = driver_location_service.sweep_inactive()
+            for driver_id in removed:
+                location_throttle.forget(driver_id)
+            if removed:
+                await manager.remove_drivers(
+                    removed, driver_location_service.get_all_active_drivers())
+        except Exception as e:
+            print(f"❌ Error sweeping inactive drivers: {e}")
+
+
+async def _rider_tick():
+    """Flush batched driver moves to riders once per tick."""
+    while True:
+        await asyncio.sleep(RIDER_TICK_INTERVAL)
+        try:
+            await manager.flush_driver_moves()
+        except Exception as e:
+            print(f"❌ Error flushing driver moves: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers and flush their buffers on shutdown."""
+    await location_writer.start()
+    await notification_writer.start()
+    inserted = await run_db(backfill_user_identities)
+    if inserted:
+        print(f"🪪 Indexed {inserted} existing emails/mobiles in useridentity")
+    await run_db(driver_counters.reconcile)
+    tasks = [
+        asyncio.create_task(_sweep_inactive_drivers()),
+        asyncio.create_task(_reconcile_driver_counts()),
+        asyncio.create_task(_push_driver_counts()),
+    ]
+    if RIDER_TICK_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_rider_tick()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        trip_dispatcher.stop()
+        await location_writer.stop()
+        await notification_writer.stop()
+        await async_engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -189,22 +624,85 @@ def read_root():
     return {"message": "Rapid Rescue API is running", "status": "healthy"}
 
 
-@app.get("/drivers/count")
-def get_driver_count(session: Session = Depends(get_session)):
-    """Get real-time count of available and total drivers."""
-    try:
-        from models import Driver
+@app.get("/metrics/location-writer")
+def get_location_writer_metrics():
+    """Get buffer depth and flush latency of the driver location writer."""
+    return {
+        "success": True,
+        "data": location_writer.get_stats()
+    }
 
-        # Get count of available drivers
-        available_drivers = session.query(Driver).filter(
-            Driver.is_available == True
-        ).count()
 
-        # Get total drivers count
-        total_drivers = session.query(Driver).count()
+@app.get("/metrics/notification-writer")
+def get_notification_writer_metrics():
+    """Get queue depth, batch sizes and flush latency of the notification writer."""
+    return {
+        "success": True,
+        "data": notification_writer.get_stats()
+    }
 
-        print(
-            f"🚑 Found {available_drivers} available drivers out of {total_drivers} total drivers")
+
+@app.get("/metrics/location-throttle")
+def get_location_throttle_metrics():
+    """Get accepted vs suppressed driver GPS update counts."""
+    return {
+        "success": True,
+        "data": location_throttle.get_stats()
+    }
+
+
+@app.get("/metrics/dispatch")
+def get_dispatch_metrics():
+    """Get staged trip dispatch counters and time to first bid."""
+    return {
+        "success": True,
+        "data": trip_dispatcher.get_stats()
+    }
+
+
+@app.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    """Get database pool checkouts, overflow and connection wait times."""
+    return {
+        "success": True,
+        "data": get_pool_stats()
+    }
+
+
+@app.get("/metrics/token-cache")
+def get_token_cache_metrics():
+    """Get JWT verification cache hits, misses and size."""
+    return {
+        "success": True,
+        "data": token_cache.get_stats()
+    }
+
+
+@app.get("/metrics/driver-counts")
+def get_driver_count_metrics():
+    """Get cached driver counts, update counters and reconciled drift."""
+    return {
+        "success": True,
+        "data": driver_counters.get_stats()
+    }
+
+
+@app.get("/metrics/connections")
+def get_connection_metrics():
+    """Get outbound WebSocket queue depth, lag and eviction counts."""
+    return {
+        "success": True,
+        "data": manager.get_stats()
+    }
+
+
+@app.get("/drivers/count")
+def get_driver_count():
+    """Get real-time count of available and total drivers."""
+    try:
+        counts = driver_counters.snapshot()
+        available_drivers = counts["available_count"]
+        total_drivers = counts["total_count"]
 
         return {
             "success": True,
@@ -220,24 +718,17 @@ def get_driver_count(session: Session = Depends(get_session)):
 
 
 @app.get("/drivers/available-count")
-def get_available_drivers_count(session: Session = Depends(get_session)):
+def get_available_drivers_count():
     """Get count of available drivers based on is_available column."""
     try:
-        from models import Driver
-
-        # Count available drivers (is_available = True)
-        available_count = session.query(Driver).filter(
-            Driver.is_available == True).count()
-
-        # Count total drivers for comparison
-        total_count = session.query(Driver).count()
-
-        # Count unavailable drivers
-        unavailable_count = total_count - available_count
+        # Served from the cached counters; see driver_counters.py
+        counts = driver_counters.snapshot()
+        available_count = counts["available_count"]
+        total_count = counts["total_count"]
 
         return {
             "available_drivers": available_count,
-            "unavailable_drivers": unavailable_count,
+            "unavailable_drivers": counts["unavailable_count"],
             "total_drivers": total_count,
             "message": f"Found {available_count} available drivers out of {total_count} total drivers"
         }
@@ -252,21 +743,23 @@ def get_available_drivers(session: Session = Depends(get_session)):
     try:
         from models import Driver
 
-        # Get all available drivers
-        available_drivers = session.query(Driver).filter(
-            Driver.is_available == True).all()
+        # Get all available drivers, without loading password hashes
+        available_drivers = session.query(
+            Driver.driver_id, Driver.name, Driver.email, Driver.mobile, Driver.ratings
+        ).filter(Driver.is_available == True).all()
 
         # Convert to list of dictionaries
-        drivers_list = []
-        for driver in available_drivers:
-            drivers_list.append({
+        drivers_list = [
+            {
                 "driver_id": driver.driver_id,
                 "name": driver.name,
                 "email": driver.email,
                 "mobile": driver.mobile,
                 "ratings": driver.ratings,
-                "is_available": driver.is_available
-            })
+                "is_available": True
+            }
+            for driver in available_drivers
+        ]
 
         return {
             "available_drivers": drivers_list,
@@ -282,7 +775,7 @@ def get_available_drivers(session: Session = Depends(get_session)):
 async def update_driver_availability(
     availability_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Update driver availability status."""
     try:
@@ -294,15 +787,17 @@ async def update_driver_availability(
         is_available = availability_data.get("is_available", False)
 
         # Update driver availability in database
-        driver = session.query(Driver).filter(
-            Driver.driver_id == current_user.sub
-        ).first()
+        result = await session.execute(
+            update(Driver).where(
+                Driver.driver_id == int(current_user.sub)
+            ).values(is_available=is_available)
+        )
 
-        if not driver:
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Driver not found")
 
-        driver.is_available = is_available
-        session.commit()
+        await session.commit()
+        driver_counters.set_available(current_user.sub, is_available)
 
         print(
             f"✅ Driver {current_user.sub} availability updated to: {is_available}")
@@ -315,7 +810,7 @@ async def update_driver_availability(
         }
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"❌ Error updating driver availability: {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Error updating driver availability: {str(e)}"
@@ -327,11 +822,11 @@ async def update_driver_availability(
     response_model=SignupResponse,
     status_code=201
 )
-async def signup(user: SignupRequest, session: Session = Depends(get_session)):
+async def signup(user: SignupRequest, session: AsyncSession = Depends(get_async_session)):
     """
     Handles user signup for drivers or riders.
     """
-    return create_user(session, user_data=user.dict())
+    return await create_user(session, user_data=user.dict())
 
 
 @app.post(
@@ -342,13 +837,13 @@ async def signup(user: SignupRequest, session: Session = Depends(get_session)):
 async def login(
     credentials: LoginRequest,
     response: Response,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Handles login for drivers or riders.
     Returns JWT token on successful authentication.
     """
-    return authenticate_user(
+    return await authenticate_user(
         session,
         credentials.phone_or_email,
         credentials.password,
@@ -375,23 +870,28 @@ async def validate_token(current_user: TokenData = Depends(get_current_user_flex
 
 @app.delete("/auth/logout")
 async def logout(
+    request: Request,
     response: Response,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Logout endpoint that clears the authentication cookie and sets driver as unavailable.
+    The token is revoked so cached verifications stop accepting it.
     """
+    revoke_token(get_token_from_header_or_cookie(request))
+
     try:
         # If it's a driver, set them as unavailable when they log out
         if current_user.role == "driver":
-            driver = session.query(Driver).filter(
-                Driver.driver_id == current_user.sub
-            ).first()
-
-            if driver and hasattr(driver, 'is_available'):
-                driver.is_available = False
-                session.commit()
+            result = await session.execute(
+                update(Driver).where(
+                    Driver.driver_id == int(current_user.sub)
+                ).values(is_available=False)
+            )
+            await session.commit()
+            if result.rowcount:
+                driver_counters.set_available(current_user.sub, False)
                 print(
                     f"✅ Driver {current_user.sub} set as unavailable on logout")
     except Exception as e:
@@ -415,36 +915,49 @@ async def logout(
 async def create_trip_request(
     request_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Create a new trip request."""
     try:
+        latitude = request_data.get("latitude")
+        longitude = request_data.get("longitude")
+        pickup_point = None
+        if latitude is not None and longitude is not None:
+            pickup_point = parse_coordinates(latitude, longitude)
+            if pickup_point is None:
+                raise HTTPException(
+                    status_code=400, detail="Invalid latitude/longitude")
+            latitude, longitude = pickup_point
+
         # Create trip request in database
         trip_request = TripRequest(
-            rider_id=current_user.sub,
+            rider_id=int(current_user.sub),
             pickup_location=request_data.get("pickup_location"),
             destination=request_data.get("destination"),
             fare=request_data.get("fare"),
-            latitude=request_data.get("latitude"),
-            longitude=request_data.get("longitude"),
+            latitude=latitude,
+            longitude=longitude,
+            location=(
+                f"SRID=4326;POINT({longitude} {latitude})"
+                if pickup_point else None
+            ),
             status="pending"
         )
 
         session.add(trip_request)
-        session.commit()
-        session.refresh(trip_request)
+        await session.commit()
 
-        # Fetch rider for display name
-        rider = session.query(Rider).filter(
-            Rider.rider_id == trip_request.rider_id).first()
+        # Fetch rider display name only
+        rider_name = (await session.execute(
+            select(Rider.name).where(Rider.rider_id == trip_request.rider_id)
+        )).scalar()
 
-        # Broadcast to all drivers via WebSocket
-        await manager.broadcast(json.dumps({
+        message = Frame({
             "type": "new-trip-request",
             "data": {
                 "req_id": trip_request.req_id,
                 "rider_id": trip_request.rider_id,
-                "rider_name": rider.name if rider else None,
+                "rider_name": rider_name,
                 "pickup_location": trip_request.pickup_location,
                 "destination": trip_request.destination,
                 "fare": trip_request.fare,
@@ -453,53 +966,162 @@ async def create_trip_request(
                 "timestamp": trip_request.timestamp.isoformat(),
                 "status": trip_request.status
             }
-        }))
+        })
+
+        # Ring the nearest available drivers via WebSocket
+        await manager.dispatch_trip_request(message, message.payload["data"])
 
         return {
             "success": True,
             "req_id": trip_request.req_id,
             "message": "Trip request created successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error creating trip request: {str(e)}")
 
 
+# Columns returned by the trip request feed
+TRIP_REQUEST_COLUMNS = (
+    TripRequest.req_id,
+    TripRequest.rider_id,
+    TripRequest.pickup_location,
+    TripRequest.destination,
+    TripRequest.fare,
+    TripRequest.latitude,
+    TripRequest.longitude,
+    TripRequest.timestamp,
+    TripRequest.status,
+)
+
+
+async def _driver_position(session: AsyncSession, driver_id: int):
+    """
+    Get a driver's last known (latitude, longitude), from memory first and
+    then from the stored location. Returns None if the driver never reported.
+    """
+    location = driver_location_service.get_driver_location(driver_id)
+    if location:
+        return location["latitude"], location["longitude"]
+    from models import DriverLocation
+    stored = (await session.execute(
+        select(DriverLocation.latitude, DriverLocation.longitude).where(
+            DriverLocation.driver_id == driver_id)
+    )).first()
+    return (stored.latitude, stored.longitude) if stored else None
+
+
+def _parse_trip_cursor(cursor: Optional[str]):
+    """
+    Decode a feed cursor: "<distance_m>:<req_id>" for the distance-ordered
+    feed, or "<req_id>" for the newest-first fallback.
+    """
+    if not cursor:
+        return None
+    try:
+        if ":" in cursor:
+            distance, req_id = cursor.split(":", 1)
+            return float(distance), int(req_id)
+        return int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @app.get("/trip-requests")
 async def get_trip_requests(
     request: Request,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_km: float = TRIP_FEED_RADIUS_KM,
+    limit: int = TRIP_FEED_PAGE_SIZE,
+    cursor: Optional[str] = None,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Get trip requests for the current user."""
+    """
+    Get trip requests for the current user.
+
+    Riders get their own requests. Drivers get pending requests within
+    `radius_km` of their last known position (or of latitude/longitude when
+    given), nearest first, one page at a time; pass `next_cursor` back as
+    `cursor` to get the next page.
+    """
     try:
+        # Single query: only the needed columns, rider name joined in
+        query = select(
+            *TRIP_REQUEST_COLUMNS,
+            Rider.name.label("rider_name")
+        ).outerjoin(
+            Rider, Rider.rider_id == TripRequest.rider_id
+        )
+
+        next_cursor = None
         if current_user.role == "rider":
             # Get rider's trip requests
-            requests = session.query(TripRequest).filter(
+            requests = (await session.execute(query.where(
                 TripRequest.rider_id == int(current_user.sub)
-            ).all()
+            ))).all()
         else:
-            # Get all pending trip requests for drivers (exclude those already responded to by this driver)
-            requests = session.query(TripRequest).filter(
+            driver_id = int(current_user.sub)
+            limit = max(1, min(limit, TRIP_FEED_MAX_PAGE_SIZE))
+            radius_km = max(0.0, min(radius_km, TRIP_FEED_MAX_RADIUS_KM))
+            after = _parse_trip_cursor(cursor)
+
+            # Pending trip requests this driver has not responded to yet
+            query = query.where(
                 TripRequest.status == "pending"
             ).outerjoin(
                 DriverResponse,
                 (TripRequest.req_id == DriverResponse.req_id) &
-                (DriverResponse.driver_id == int(current_user.sub))
-            ).filter(
-                # No response from this driver yet
+                (DriverResponse.driver_id == driver_id)
+            ).where(
                 DriverResponse.response_id.is_(None)
-            ).all()
+            )
+
+            if latitude is not None and longitude is not None:
+                position = parse_coordinates(latitude, longitude)
+                if position is None:
+                    raise HTTPException(
+                        status_code=400, detail="Invalid latitude/longitude")
+            else:
+                position = await _driver_position(session, driver_id)
+
+            if position:
+                # GIST-backed radius filter, keyset-paginated by (distance, req_id)
+                ref_point = ST_GeogFromText(
+                    f"SRID=4326;POINT({position[1]} {position[0]})")
+                distance = ST_Distance(TripRequest.location, ref_point)
+                query = query.add_columns(
+                    distance.label("distance")
+                ).where(
+                    ST_DWithin(TripRequest.location, ref_point, radius_km * 1000)
+                )
+                if isinstance(after, tuple):
+                    query = query.where(
+                        tuple_(distance, TripRequest.req_id) > tuple_(*after))
+                query = query.order_by(distance, TripRequest.req_id)
+            else:
+                # No known position: newest first
+                if isinstance(after, int):
+                    query = query.where(TripRequest.req_id < after)
+                query = query.order_by(TripRequest.req_id.desc())
+
+            requests = (await session.execute(query.limit(limit + 1))).all()
+            if len(requests) > limit:
+                requests = requests[:limit]
+                last = requests[-1]
+                next_cursor = (
+                    f"{last.distance!r}:{last.req_id}" if position
+                    else str(last.req_id)
+                )
 
-        # Get rider information for each request
         requests_with_rider_info = []
         for req in requests:
-            # Get rider name
-            rider = session.query(Rider).filter(
-                Rider.rider_id == req.rider_id).first()
-            rider_name = rider.name if rider else f"Rider {req.rider_id}"
+            rider_name = req.rider_name or f"Rider {req.rider_id}"
 
-            requests_with_rider_info.append({
+            item = {
                 "req_id": req.req_id,
                 "rider_id": req.rider_id,
                 "rider_name": rider_name,
@@ -510,12 +1132,18 @@ async def get_trip_requests(
                 "longitude": req.longitude,
                 "timestamp": req.timestamp.isoformat(),
                 "status": req.status
-            })
+            }
+            if "distance" in req._fields:
+                item["distance_km"] = round(req.distance / 1000, 2)
+            requests_with_rider_info.append(item)
 
         return {
             "success": True,
-            "requests": requests_with_rider_info
+            "requests": requests_with_rider_info,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error getting trip requests: {str(e)}")
@@ -526,7 +1154,7 @@ async def decline_trip_request(
     req_id: int,
     request: Request,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Permanently decline a trip request."""
     try:
@@ -538,28 +1166,30 @@ async def decline_trip_request(
             )
 
         # Find the trip request
-        trip_request = session.query(TripRequest).filter(
-            TripRequest.req_id == req_id
-        ).first()
+        trip_status = (await session.execute(
+            select(TripRequest.status).where(TripRequest.req_id == req_id)
+        )).scalar()
 
-        if not trip_request:
+        if trip_status is None:
             raise HTTPException(
                 status_code=404,
                 detail="Trip request not found"
             )
 
         # Check if request is still pending
-        if trip_request.status != "pending":
+        if trip_status != "pending":
             raise HTTPException(
                 status_code=400,
-                detail=f"Trip request is already {trip_request.status}"
+                detail=f"Trip request is already {trip_status}"
             )
 
         # Check if this driver has already responded to this request
-        existing_response = session.query(DriverResponse).filter(
-            DriverResponse.req_id == req_id,
-            DriverResponse.driver_id == int(current_user.sub)
-        ).first()
+        existing_response = (await session.execute(
+            select(DriverResponse.response_id).where(
+                DriverResponse.req_id == req_id,
+                DriverResponse.driver_id == int(current_user.sub)
+            )
+        )).first()
 
         if existing_response:
             raise HTTPException(
@@ -568,9 +1198,10 @@ async def decline_trip_request(
             )
 
         # Get driver information
-        driver = session.query(Driver).filter(
-            Driver.driver_id == int(current_user.sub)
-        ).first()
+        driver = (await session.execute(
+            select(Driver.name, Driver.mobile, Driver.ratings).where(
+                Driver.driver_id == int(current_user.sub))
+        )).first()
 
         if not driver:
             raise HTTPException(
@@ -592,10 +1223,11 @@ async def decline_trip_request(
             status="declined"  # Mark as declined
         )
         session.add(driver_response)
-        session.commit()
+        await session.commit()
 
         print(
             f"🚫 Driver {current_user.sub} declined trip request {req_id} (per-driver tracking)")
+        trip_dispatcher.declined(req_id, int(current_user.sub))
 
         return {
             "success": True,
@@ -607,7 +1239,7 @@ async def decline_trip_request(
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"❌ Error declining trip request: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -619,7 +1251,7 @@ async def decline_trip_request(
 async def create_driver_response(
     response_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Create a driver response to a trip request."""
     try:
@@ -630,7 +1262,7 @@ async def create_driver_response(
         # Create driver response in database
         driver_response = DriverResponse(
             req_id=response_data.get("req_id"),
-            driver_id=current_user.sub,
+            driver_id=int(current_user.sub),
             driver_name=response_data.get("driver_name"),
             driver_mobile=response_data.get("driver_mobile"),
             amount=response_data.get("amount"),
@@ -642,15 +1274,18 @@ async def create_driver_response(
         )
 
         session.add(driver_response)
-        session.commit()
-        session.refresh(driver_response)
+        await session.commit()
+
+        # A bid ends the staged dispatch of this request
+        trip_dispatcher.close(driver_response.req_id)
 
         # Get rider ID from trip request
-        trip_request = session.query(TripRequest).filter(
-            TripRequest.req_id == response_data.get("req_id")
-        ).first()
+        rider_id = (await session.execute(
+            select(TripRequest.rider_id).where(
+                TripRequest.req_id == driver_response.req_id)
+        )).scalar()
 
-        if trip_request:
+        if rider_id is not None:
             # Send response to rider via WebSocket
             await manager.send_to_user(json.dumps({
                 "type": "bid-from-driver",
@@ -668,7 +1303,7 @@ async def create_driver_response(
                     "status": driver_response.status,
                     "timestamp": driver_response.timestamp.isoformat()
                 }
-            }), trip_request.rider_id)
+            }), rider_id)
 
         return {
             "success": True,
@@ -684,13 +1319,13 @@ async def create_driver_response(
 async def get_driver_responses(
     req_id: int,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get driver responses for a specific trip request."""
     try:
-        responses = session.query(DriverResponse).filter(
-            DriverResponse.req_id == req_id
-        ).all()
+        responses = (await session.execute(
+            select(DriverResponse).where(DriverResponse.req_id == req_id)
+        )).scalars().all()
 
         return {
             "success": True,
@@ -721,7 +1356,7 @@ async def get_driver_responses(
 async def create_ongoing_trip(
     trip_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Create an ongoing trip."""
     try:
@@ -737,16 +1372,14 @@ async def create_ongoing_trip(
         )
 
         session.add(ongoing_trip)
-        session.commit()
-        session.refresh(ongoing_trip)
 
-        # Update trip request status
-        trip_request = session.query(TripRequest).filter(
-            TripRequest.req_id == trip_data.get("req_id")
-        ).first()
-        if trip_request:
-            trip_request.status = "accepted"
-            session.commit()
+        # Update trip request status in the same transaction
+        await session.execute(
+            update(TripRequest).where(
+                TripRequest.req_id == trip_data.get("req_id")
+            ).values(status="accepted")
+        )
+        await session.commit()
 
         # Notify both rider and driver
         await manager.send_to_user(json.dumps({
@@ -779,6 +1412,8 @@ async def create_ongoing_trip(
             }
         }), ongoing_trip.driver_id)
 
+        trip_dispatcher.close(ongoing_trip.req_id, answered=False)
+
         return {
             "success": True,
             "trip_id": ongoing_trip.trip_id,
@@ -792,20 +1427,20 @@ async def create_ongoing_trip(
 @app.get("/ongoing-trips")
 async def get_ongoing_trips(
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get ongoing trips for the current user."""
     try:
         if current_user.role == "rider":
-            trips = session.query(OngoingTrip).filter(
-                OngoingTrip.rider_id == current_user.sub,
-                OngoingTrip.status == "ongoing"
-            ).all()
+            owner = OngoingTrip.rider_id
         else:
-            trips = session.query(OngoingTrip).filter(
-                OngoingTrip.driver_id == current_user.sub,
+            owner = OngoingTrip.driver_id
+        trips = (await session.execute(
+            select(OngoingTrip).where(
+                owner == int(current_user.sub),
                 OngoingTrip.status == "ongoing"
-            ).all()
+            )
+        )).scalars().all()
 
         return {
             "success": True,
@@ -838,13 +1473,11 @@ async def get_ongoing_trips(
 async def end_ongoing_trip(
     trip_id: int,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """End an ongoing trip."""
     try:
-        trip = session.query(OngoingTrip).filter(
-            OngoingTrip.trip_id == trip_id
-        ).first()
+        trip = await session.get(OngoingTrip, trip_id)
 
         if not trip:
             raise HTTPException(status_code=404, detail="Trip not found")
@@ -852,7 +1485,7 @@ async def end_ongoing_trip(
         # Update trip status
         trip.status = "completed"
         trip.end_time = datetime.utcnow()
-        session.commit()
+        await session.commit()
 
         # Notify both rider and driver
         await manager.send_to_user(json.dumps({
@@ -944,6 +1577,11 @@ async def websocket_endpoint(websocket: WebSocket):
     connection_id = None
     user_id = None
 
+    async def reply(message: dict) -> bool:
+        # Replies go through the connection's writer so they never race
+        # queued frames on the socket; False once it is closed or evicted
+        return await manager.send_personal_message(Frame(message), connection_id)
+
     try:
         # Accept the WebSocket connection
         await websocket.accept()
@@ -958,22 +1596,21 @@ async def websocket_endpoint(websocket: WebSocket):
         # Authenticate user if token is provided
         if token:
             try:
-                from security import verify_token
-                payload = verify_token(token)
-                user_id = int(payload.get("sub"))
-                user_role = payload.get("role", "unknown")
+                token_data = resolve_token(token)
+                user_id = int(token_data.sub)
+                user_role = token_data.role or "unknown"
 
                 # Store connection with user info
                 await manager.connect(websocket, connection_id, user_id, user_role)
 
                 # Send welcome message
-                await websocket.send_text(json.dumps({
+                await reply({
                     "type": "connection_established",
                     "message": "WebSocket connected successfully",
                     "user_id": user_id,
                     "user_role": user_role,
                     "connection_id": connection_id
-                }))
+                })
 
                 # If it's a driver, add them to the location service
                 if user_role == "driver":
@@ -982,52 +1619,43 @@ async def websocket_endpoint(websocket: WebSocket):
                     # Driver will start sending location updates via WebSocket messages
 
                 # If it's a rider, send current driver locations
-                if user_role == "rider":
+                if user_role == "rider" and websocket.query_params.get("feed") == "delta":
+                    # Delta feed: one snapshot now, then drivers-delta frames
+                    await manager.send_driver_snapshot(
+                        user_id, driver_location_service.get_all_active_drivers())
+                elif user_role == "rider":
                     # Get drivers from database
-                    from sqlmodel import Session, select
-                    from models import Driver, DriverLocation
-
-                    with Session(engine) as db:
-                        # Get only available drivers with their locations
-                        statement = select(Driver, DriverLocation).join(
-                            DriverLocation, Driver.driver_id == DriverLocation.driver_id
-                        ).filter(Driver.is_available == True)
-                        results = db.exec(statement).all()
-
-                        drivers_data = []
-                        for driver, location in results:
-                            drivers_data.append({
-                                "id": driver.driver_id,
-                                "latitude": location.latitude,
-                                "longitude": location.longitude,
-                                "timestamp": datetime.now().isoformat(),
-                                "name": driver.name,
-                                "status": "available"
-                            })
+                    drivers_data = await run_db(_get_available_driver_locations)
 
-                        print(
-                            f"🚑 Found {len(drivers_data)} available drivers from database")
+                    print(
+                        f"🚑 Found {len(drivers_data)} available drivers from database")
 
-                        await websocket.send_text(json.dumps({
-                            "type": "nearby-drivers",
-                            "data": drivers_data
-                        }))
+                    await reply({
+                        "type": "nearby-drivers",
+                        "data": drivers_data
+                    })
 
             except Exception as e:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "message": "Invalid authentication token"
-                }))
-                await websocket.close()
+                # Stop the writer (if connect got that far) before writing
+                # to the socket directly
+                manager.disconnect(connection_id, user_id)
+                try:
+                    await websocket.send_text(json.dumps({
+                        "type": "error",
+                        "message": "Invalid authentication token"
+                    }))
+                    await websocket.close()
+                except Exception:
+                    pass
                 return
         else:
             # Anonymous connection
             await manager.connect(websocket, connection_id)
-            await websocket.send_text(json.dumps({
+            await reply({
                 "type": "connection_established",
                 "message": "WebSocket connected successfully (anonymous)",
                 "connection_id": connection_id
-            }))
+            })
 
         # Listen for messages
         while True:
@@ -1039,10 +1667,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 message_type = message_data.get("type", "unknown")
 
                 if message_type == "ping":
-                    await websocket.send_text(json.dumps({
+                    await reply({
                         "type": "pong",
                         "timestamp": message_data.get("timestamp")
-                    }))
+                    })
                 elif message_type == "new-client":
                     # Handle new client connection
                     client_data = message_data.get("data", {})
@@ -1050,29 +1678,83 @@ async def websocket_endpoint(websocket: WebSocket):
                     client_role = client_data.get("role")
                     client_token = client_data.get("token")
 
-                    await websocket.send_text(json.dumps({
+                    await reply({
                         "type": "client_registered",
                         "message": f"Client {client_id} ({client_role}) registered successfully",
                         "client_id": client_id,
                         "client_role": client_role
-                    }))
+                    })
+                elif message_type == "subscribe-driver-count":
+                    # Push counts on change instead of polling /drivers/count
+                    manager.driver_count_subscribers.add(connection_id)
+                    await manager.push_driver_counts([connection_id])
+                elif message_type == "unsubscribe-driver-count":
+                    manager.driver_count_subscribers.discard(connection_id)
+                elif message_type == "subscribe-area":
+                    # Rider registers the map area it wants driver updates for
+                    if user_id and manager.user_info.get(user_id, {}).get("role") == "rider":
+                        area = message_data.get("data")
+                        bounds = manager.update_rider_area(
+                            user_id, area if isinstance(area, dict) else {})
+                        if bounds is None:
+                            await reply({
+                                "type": "error",
+                                "message": "Invalid area"
+                            })
+                            continue
+                        south, west, north, east = bounds
+                        await reply({
+                            "type": "area_subscribed",
+                            "data": {
+                                "south": south,
+                                "west": west,
+                                "north": north,
+                                "east": east
+                            }
+                        })
+                    else:
+                        await reply({
+                            "type": "error",
+                            "message": "Only riders can subscribe to an area"
+                        })
+                elif message_type == "driver-resync":
+                    # Rider detected a sequence gap (or wants to join the delta feed)
+                    if user_id and manager.user_info.get(user_id, {}).get("role") == "rider":
+                        await manager.send_driver_snapshot(
+                            user_id, driver_location_service.get_all_active_drivers())
+                    else:
+                        await reply({
+                            "type": "error",
+                            "message": "Only riders can request a driver resync"
+                        })
                 elif message_type == "add-location":
                     # Handle initial location update
                     location_data = message_data.get("data", {})
-                    driver_id = location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
+                    location = _parse_driver_location(
+                        location_data.get("driver_id"),
+                        location_data.get("latitude"),
+                        location_data.get("longitude"))
+                    if location is None:
+                        await reply({
+                            "type": "error",
+                            "message": "Invalid driver location"
+                        })
+                        continue
+                    driver_id, latitude, longitude = location
 
                     # Update driver location using service
                     print(
                         f"🔄 Updating driver {driver_id} location: {latitude}, {longitude}")
-                    success = driver_location_service.update_driver_location(
-                        driver_id, latitude, longitude)
+                    # Drop updates that arrive too soon or moved too little
+                    success = False
+                    if location_throttle.accept(driver_id, latitude, longitude):
+                        success = driver_location_service.update_driver_location(
+                            driver_id, latitude, longitude)
                     print(f"📊 Update result: {success}")
 
                     if success:
                         # Acknowledge to driver
-                        await websocket.send_text(json.dumps({
+                        await reply({
                             "type": "location_updated",
                             "message": f"Location updated for driver {driver_id}",
                             "data": {
@@ -1081,10 +1763,10 @@ async def websocket_endpoint(websocket: WebSocket):
                                 "longitude": longitude,
                                 "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
                             }
-                        }))
+                        })
 
                         # Broadcast to all riders
-                        driver_location_message = json.dumps({
+                        driver_location_message = Frame({
                             "type": "driver-location",
                             "data": {
                                 "driver_id": driver_id,
@@ -1093,25 +1775,30 @@ async def websocket_endpoint(websocket: WebSocket):
                                 "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
                             }
                         })
-                        await manager.broadcast_to_riders(driver_location_message)
+                        await manager.broadcast_driver_location(
+                            driver_location_message, driver_id, latitude, longitude)
                 elif message_type == "driver-location":
                     # Handle driver location update from frontend
                     location_data = message_data.get("data", {})
-                    driver_id = location_data.get(
-                        "id") or location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
+                    location = _parse_driver_location(
+                        location_data.get("id") or location_data.get("driver_id"),
+                        location_data.get("latitude"),
+                        location_data.get("longitude"))
 
-                    if driver_id and latitude and longitude:
+                    if location is not None:
+                        driver_id, latitude, longitude = location
                         print(
                             f"🔄 Driver {driver_id} location update: {latitude}, {longitude}")
-                        success = driver_location_service.update_driver_location(
-                            driver_id, latitude, longitude)
+                        # Drop updates that arrive too soon or moved too little
+                        success = False
+                        if location_throttle.accept(driver_id, latitude, longitude):
+                            success = driver_location_service.update_driver_location(
+                                driver_id, latitude, longitude)
                         print(f"📊 Update result: {success}")
 
                         if success:
                             # Broadcast to all riders
-                            driver_location_message = json.dumps({
+                            driver_location_message = Frame({
                                 "type": "driver-location",
                                 "data": {
                                     "driver_id": driver_id,
@@ -1120,24 +1807,36 @@ async def websocket_endpoint(websocket: WebSocket):
                                     "timestamp": datetime.now().isoformat()
                                 }
                             })
-                            await manager.broadcast_to_riders(driver_location_message)
+                            await manager.broadcast_driver_location(
+                                driver_location_message, driver_id, latitude, longitude)
                 elif message_type == "update-location":
                     # Handle location update
                     location_data = message_data.get("data", {})
-                    driver_id = location_data.get("driver_id")
-                    latitude = location_data.get("latitude")
-                    longitude = location_data.get("longitude")
+                    location = _parse_driver_location(
+                        location_data.get("driver_id"),
+                        location_data.get("latitude"),
+                        location_data.get("longitude"))
+                    if location is None:
+                        await reply({
+                            "type": "error",
+                            "message": "Invalid driver location"
+                        })
+                        continue
+                    driver_id, latitude, longitude = location
 
                     # Update driver location using service
                     print(
                         f"🔄 Updating driver {driver_id} location: {latitude}, {longitude}")
-                    success = driver_location_service.update_driver_location(
-                        driver_id, latitude, longitude)
+                    # Drop updates that arrive too soon or moved too little
+                    success = False
+                    if location_throttle.accept(driver_id, latitude, longitude):
+                        success = driver_location_service.update_driver_location(
+                            driver_id, latitude, longitude)
                     print(f"📊 Update result: {success}")
 
                     if success:
                         # Acknowledge to driver
-                        await websocket.send_text(json.dumps({
+                        await reply({
                             "type": "location_updated",
                             "message": f"Location updated for driver {driver_id}",
                             "data": {
@@ -1146,10 +1845,10 @@ async def websocket_endpoint(websocket: WebSocket):
                                 "longitude": longitude,
                                 "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
                             }
-                        }))
+                        })
 
                         # Broadcast to all riders
-                        driver_location_message = json.dumps({
+                        driver_location_message = Frame({
                             "type": "driver-location",
                             "data": {
                                 "driver_id": driver_id,
@@ -1158,33 +1857,19 @@ async def websocket_endpoint(websocket: WebSocket):
                                 "timestamp": message_data.get("timestamp") or datetime.now().isoformat()
                             }
                         })
-                        await manager.broadcast_to_riders(driver_location_message)
-
-                        # Broadcast updated driver list to all riders
-                        driver_locations = driver_location_service.get_all_active_drivers()
-                        await manager.broadcast_to_riders(json.dumps({
-                            "type": "nearby-drivers",
-                            "data": [
-                                {
-                                    "id": driver_id,
-                                    "latitude": info["latitude"],
-                                    "longitude": info["longitude"],
-                                    "timestamp": info["timestamp"]
-                                }
-                                for driver_id, info in driver_locations.items()
-                            ]
-                        }))
+                        await manager.broadcast_driver_location(
+                            driver_location_message, driver_id, latitude, longitude)
                 elif message_type == "new-trip-request":
                     # Handle new trip request from rider
                     trip_data = message_data.get("data", {})
                     print(
                         f"🚨 New trip request received: {trip_data.get('req_id')}")
 
-                    # Broadcast to all drivers
-                    await manager.broadcast(json.dumps({
+                    # Ring the nearest available drivers
+                    await manager.dispatch_trip_request(Frame({
                         "type": "new-trip-request",
                         "data": trip_data
-                    }))
+                    }), trip_data)
 
                 elif message_type == "bid-from-driver":
                     # Handle driver bid/response
@@ -1193,7 +1878,6 @@ async def websocket_endpoint(websocket: WebSocket):
                         f"🚑 Driver bid received from driver: {bid_data.get('driver_id')}")
                     print(f"🚑 Bid data: {bid_data}")
                     print(f"🚑 Target rider ID: {bid_data.get('rider_id')}")
-
                     # Send to specific rider
                     if bid_data.get("rider_id"):
                         message_to_send = json.dumps({
@@ -1206,33 +1890,16 @@ async def websocket_endpoint(websocket: WebSocket):
                         print(f"🚑 Message sent successfully: {success}")
                     else:
                         print("❌ No rider_id in bid data, cannot send message")
+                    _close_dispatch(bid_data.get("req_id"))
 
                 elif message_type == "driver-bid-offer":
                     # Handle driver bid offer
                     bid_data = message_data.get("data", {})
                     print(
                         f"🚑 Driver bid offer: {bid_data.get('driver_id')} -> {bid_data.get('rider_id')}")
-
                     # Get rider name from trip request
-                    rider_name = "Rider"  # Default fallback
-                    try:
-                        from db import SessionLocal
-                        from models import TripRequest, Rider
-                        session = SessionLocal()
-                        trip_request = session.query(TripRequest).filter(
-                            TripRequest.req_id == bid_data.get("req_id")
-                        ).first()
-                        if trip_request:
-                            # Get rider name from the rider_id
-                            rider = session.query(Rider).filter(
-                                Rider.rider_id == trip_request.rider_id
-                            ).first()
-                            if rider:
-                                rider_name = rider.name or rider.email or "Rider"
-                        session.close()
-                    except Exception as e:
-                        print(f"⚠️ Could not fetch rider name: {e}")
-                        rider_name = "Rider"
+                    rider_name = await run_db(
+                        _get_trip_rider_name, bid_data.get("req_id"))
 
                     # Save notification to database
                     notification_data = {
@@ -1266,6 +1933,7 @@ async def websocket_endpoint(websocket: WebSocket):
                             "type": "driver-bid-offer",
                             "data": bid_data
                         }), bid_data["rider_id"])
+                    _close_dispatch(bid_data.get("req_id"))
 
                 elif message_type == "rider-counter-offer":
                     # Handle rider counter offer
@@ -1274,30 +1942,11 @@ async def websocket_endpoint(websocket: WebSocket):
                         f"🚗 Rider counter offer: {bid_data.get('rider_id')} -> {bid_data.get('driver_id')}")
 
                     # Get rider name and driver name
-                    rider_name = "Rider"  # Default fallback
-                    driver_name = "Driver"  # Default fallback
-                    try:
-                        from db import SessionLocal
-                        from models import Rider, Driver
-                        session = SessionLocal()
-
-                        # Get rider name
-                        rider = session.query(Rider).filter(
-                            Rider.rider_id == bid_data.get("rider_id")
-                        ).first()
-                        if rider:
-                            rider_name = rider.name or rider.email or "Rider"
-
-                        # Get driver name
-                        driver = session.query(Driver).filter(
-                            Driver.driver_id == bid_data.get("driver_id")
-                        ).first()
-                        if driver:
-                            driver_name = driver.name or driver.email or "Driver"
-
-                        session.close()
-                    except Exception as e:
-                        print(f"⚠️ Could not fetch names: {e}")
+                    rider_name, driver_name = await run_db(
+                        _get_rider_and_driver_names,
+                        bid_data.get("rider_id"),
+                        bid_data.get("driver_id")
+                    )
 
                     # Save notification to database
                     notification_data = {
@@ -1488,30 +2137,34 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 elif message_type == "broadcast":
                     # Broadcast message to all connected clients
-                    await manager.broadcast(json.dumps({
+                    await manager.broadcast(Frame({
                         "type": "broadcast_message",
                         "message": message_data.get("message", ""),
                         "from_user": user_id
                     }))
                 else:
                     # Echo back unknown messages
-                    await websocket.send_text(json.dumps({
+                    await reply({
                         "type": "echo",
                         "original_message": message_data
-                    }))
+                    })
 
             except WebSocketDisconnect:
                 break
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                if not await reply({
                     "type": "error",
                     "message": "Invalid JSON format"
-                }))
+                }):
+                    break
             except Exception as e:
-                await websocket.send_text(json.dumps({
+                # The writer may have closed or evicted the connection, in
+                # which case there is nobody left to reply to
+                if not await reply({
                     "type": "error",
                     "message": f"Error processing message: {str(e)}"
-                }))
+                }):
+                    break
 
     except WebSocketDisconnect:
         pass
@@ -1566,22 +2219,14 @@ def update_driver_profile(
         if "name" in profile_data:
             driver.name = profile_data["name"]
         if "email" in profile_data:
-            # Check if email is unique (excluding current driver)
-            existing_driver = session.query(Driver).filter(
-                Driver.email == profile_data["email"],
-                Driver.driver_id != driver_id
-            ).first()
-            if existing_driver:
+            # Email must be unique across drivers and riders
+            if not replace_identifier(session, "driver", driver_id, "email", driver.email, profile_data["email"]):
                 raise HTTPException(
                     status_code=400, detail="Email already exists")
             driver.email = profile_data["email"]
         if "mobile" in profile_data:
-            # Check if mobile is unique (excluding current driver)
-            existing_driver = session.query(Driver).filter(
-                Driver.mobile == profile_data["mobile"],
-                Driver.driver_id != driver_id
-            ).first()
-            if existing_driver:
+            # Mobile must be unique across drivers and riders
+            if not replace_identifier(session, "driver", driver_id, "mobile", driver.mobile, profile_data["mobile"]):
                 raise HTTPException(
                     status_code=400, detail="Mobile number already exists")
             driver.mobile = profile_data["mobile"]
@@ -1592,6 +2237,7 @@ def update_driver_profile(
 
         session.commit()
         session.refresh(driver)
+        driver_counters.set_available(driver_id, driver.is_available)
 
         return {
             "driver_id": driver.driver_id,
@@ -1604,6 +2250,10 @@ def update_driver_profile(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        # Email or mobile that normalizes to nothing
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         session.rollback()
         raise HTTPException(
@@ -1650,22 +2300,14 @@ def update_rider_profile(
         if "name" in profile_data:
             rider.name = profile_data["name"]
         if "email" in profile_data:
-            # Check if email is unique (excluding current rider)
-            existing_rider = session.query(Rider).filter(
-                Rider.email == profile_data["email"],
-                Rider.rider_id != rider_id
-            ).first()
-            if existing_rider:
+            # Email must be unique across drivers and riders
+            if not replace_identifier(session, "rider", rider_id, "email", rider.email, profile_data["email"]):
                 raise HTTPException(
                     status_code=400, detail="Email already exists")
             rider.email = profile_data["email"]
         if "mobile" in profile_data:
-            # Check if mobile is unique (excluding current rider)
-            existing_rider = session.query(Rider).filter(
-                Rider.mobile == profile_data["mobile"],
-                Rider.rider_id != rider_id
-            ).first()
-            if existing_rider:
+            # Mobile must be unique across drivers and riders
+            if not replace_identifier(session, "rider", rider_id, "mobile", rider.mobile, profile_data["mobile"]):
                 raise HTTPException(
                     status_code=400, detail="Mobile number already exists")
             rider.mobile = profile_data["mobile"]
@@ -1682,6 +2324,10 @@ def update_rider_profile(
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        # Email or mobile that normalizes to nothing
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         session.rollback()
         raise HTTPException(
@@ -1693,7 +2339,7 @@ def update_rider_profile(
 async def create_notification(
     notification_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Create a new notification."""
     try:
@@ -1705,7 +2351,7 @@ async def create_notification(
         notification = Notification(
             recipient_id=notification_data.get("recipient_id"),
             recipient_type=notification_data.get("recipient_type", "rider"),
-            sender_id=current_user.sub,
+            sender_id=int(current_user.sub),
             sender_type=current_user.role,
             notification_type=notification_data.get(
                 "notification_type", "bid"),
@@ -1723,8 +2369,7 @@ async def create_notification(
         )
 
         session.add(notification)
-        session.commit()
-        session.refresh(notification)
+        await session.commit()
 
         print(
             f"✅ Notification created successfully: ID={notification.notification_id}")
@@ -1738,30 +2383,112 @@ async def create_notification(
             "message": "Notification created successfully"
         }
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(
             status_code=500, detail=f"Error creating notification: {str(e)}")
 
 
+def _to_naive_utc(value: datetime) -> datetime:
+    """
+    Notification timestamps are stored as naive UTC (datetime.utcnow());
+    convert a client-supplied time with an offset (e.g. "...Z") to match.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_notification_cursor(cursor: Optional[str]):
+    """
+    Decode an inbox cursor: "<timestamp ISO 8601>:<notification_id>".
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, notification_id = cursor.rsplit(":", 1)
+        return _to_naive_utc(datetime.fromisoformat(timestamp)), int(notification_id)
+    except (AttributeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_notification_ids(notification_ids) -> List[int]:
+    """
+    Validate the notification_ids of a bulk status update.
+    """
+    if not isinstance(notification_ids, list):
+        raise HTTPException(
+            status_code=400, detail="notification_ids must be a list")
+    if len(notification_ids) > NOTIFICATIONS_MAX_BULK_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {NOTIFICATIONS_MAX_BULK_IDS} notification ids per request")
+    parsed = []
+    for notification_id in notification_ids:
+        try:
+            if isinstance(notification_id, bool) or not isinstance(notification_id, (int, str)):
+                raise ValueError(notification_id)
+            parsed.append(int(notification_id))
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="notification_ids must be integers")
+    return parsed
+
+
+async def _count_unread_notifications(session: AsyncSession, recipient_id: int, recipient_type: str) -> int:
+    """
+    Count a recipient's unread notifications.
+    Reads only the (recipient, "unread") range of ix_notification_inbox.
+    """
+    return (await session.execute(
+        select(func.count()).select_from(Notification).where(
+            Notification.recipient_id == recipient_id,
+            Notification.recipient_type == recipient_type,
+            Notification.status == "unread"
+        )
+    )).scalar_one()
+
+
 @app.get("/notifications")
 async def get_notifications(
+    limit: int = NOTIFICATIONS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Get notifications for the current user."""
+    """
+    Get notifications for the current user, newest first, one page at a time.
+
+    Pass `next_cursor` back as `cursor` to get the next page. Pass `since`
+    (e.g. the newest timestamp already held) to only get notifications
+    created after it.
+    """
     try:
-        print(
-            f"🔍 Getting notifications for user: {current_user.sub}, role: {current_user.role}")
-        notifications = session.query(Notification).filter(
-            Notification.recipient_id == current_user.sub,
+        limit = max(1, min(limit, NOTIFICATIONS_MAX_PAGE_SIZE))
+        after = _parse_notification_cursor(cursor)
+
+        # Served from ix_notification_inbox, keyset-paginated by (timestamp, id)
+        query = select(Notification).where(
+            Notification.recipient_id == int(current_user.sub),
             Notification.recipient_type == current_user.role,
             Notification.status.in_(["unread", "read"])
-        ).order_by(Notification.timestamp.desc()).all()
-
-        print(f"📊 Found {len(notifications)} notifications")
-        for notif in notifications:
-            print(
-                f"📋 Notification: ID={notif.notification_id}, Type={notif.notification_type}, Bid={notif.bid_amount}, Recipient={notif.recipient_id}")
+        )
+        if since is not None:
+            query = query.where(Notification.timestamp > _to_naive_utc(since))
+        if after is not None:
+            query = query.where(
+                tuple_(Notification.timestamp, Notification.notification_id) < tuple_(*after))
+        query = query.order_by(
+            Notification.timestamp.desc(), Notification.notification_id.desc()
+        ).limit(limit + 1)
+
+        notifications = (await session.execute(query)).scalars().all()
+
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            last = notifications[-1]
+            next_cursor = f"{last.timestamp.isoformat()}:{last.notification_id}"
 
         return {
             "success": True,
@@ -1787,33 +2514,110 @@ async def get_notifications(
                     "rider_name": notif.rider_name,
                 }
                 for notif in notifications
-            ]
+            ],
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error getting notifications: {str(e)}")
 
 
+@app.put("/notifications/status")
+async def update_notification_statuses(
+    status_data: dict,
+    current_user: TokenData = Depends(get_current_user_flexible),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Update the status of many notifications in one statement.
+
+    Body: {"status": "read", "notification_ids": [...]} to update the given
+    notifications, or {"status": "read", "up_to_cursor": "<cursor>"} to mark
+    every unread notification at or before an inbox cursor (e.g. the last
+    one on screen); notifications can only be marked unread again by id.
+    The new unread count is returned and pushed over the
+    WebSocket as "notification-unread-count".
+    """
+    try:
+        new_status = status_data.get("status", "read")
+        if new_status not in NOTIFICATION_STATUSES:
+            raise HTTPException(status_code=400, detail="Invalid status")
+
+        recipient_id = int(current_user.sub)
+        statement = update(Notification).where(
+            Notification.recipient_id == recipient_id,
+            Notification.recipient_type == current_user.role,
+            Notification.status != new_status
+        )
+
+        notification_ids = status_data.get("notification_ids")
+        if notification_ids is not None:
+            statement = statement.where(Notification.notification_id.in_(
+                _parse_notification_ids(notification_ids)))
+        elif status_data.get("up_to_cursor"):
+            if new_status == "unread":
+                # The cursor form only moves unread notifications on
+                raise HTTPException(
+                    status_code=400,
+                    detail="up_to_cursor cannot mark notifications unread; use notification_ids")
+            up_to = _parse_notification_cursor(status_data["up_to_cursor"])
+            statement = statement.where(
+                Notification.status == "unread",
+                tuple_(Notification.timestamp, Notification.notification_id) <= tuple_(*up_to)
+            )
+        else:
+            raise HTTPException(
+                status_code=400, detail="Provide notification_ids or up_to_cursor")
+
+        result = await session.execute(statement.values(status=new_status))
+        unread_count = await _count_unread_notifications(
+            session, recipient_id, current_user.role)
+        await session.commit()
+
+        # Keep badges on the user's open sockets in sync
+        if manager.user_info.get(recipient_id, {}).get("role") == current_user.role:
+            await manager.send_to_user(Frame({
+                "type": "notification-unread-count",
+                "data": {"unread": unread_count}
+            }), recipient_id, coalesce_key="notification-unread-count")
+
+        return {
+            "success": True,
+            "updated": result.rowcount,
+            "unread": unread_count,
+            "message": f"{result.rowcount} notifications updated"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=500, detail=f"Error updating notification statuses: {str(e)}")
+
+
 @app.put("/notifications/{notification_id}/status")
 async def update_notification_status(
     notification_id: int,
     status_data: dict,
     current_user: TokenData = Depends(get_current_user_flexible),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Update notification status."""
     try:
-        notification = session.query(Notification).filter(
-            Notification.notification_id == notification_id,
-            Notification.recipient_id == current_user.sub
-        ).first()
+        result = await session.execute(
+            update(Notification).where(
+                Notification.notification_id == notification_id,
+                Notification.recipient_id == int(current_user.sub)
+            ).values(status=status_data.get("status", "read"))
+        )
 
-        if not notification:
+        if result.rowcount == 0:
             raise HTTPException(
                 status_code=404, detail="Notification not found")
 
-        notification.status = status_data.get("status", "read")
-        session.commit()
+        await session.commit()
 
         return {
             "success": True,
@@ -1822,7 +2626,7 @@ async def update_notification_status(
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(
             status_code=500, detail=f"Error updating notification status: {str(e)}")
 
@@ -1831,30 +2635,47 @@ async def update_notification_status(
 async def get_notification_count():
     """Get total count of notifications in database"""
     try:
-        from db import SessionLocal
-        session = SessionLocal()
-
-        total_count = session.query(Notification).count()
-
-        # Get count by status
-        unread_count = session.query(Notification).filter(
-            Notification.status == "unread").count()
-        read_count = session.query(Notification).filter(
-            Notification.status == "read").count()
-        accepted_count = session.query(Notification).filter(
-            Notification.status == "accepted").count()
-
-        session.close()
-
+        async with async_session_scope() as session:
+            # One pass over the table, counting every status at once
+            counts = (await session.execute(
+                select(
+                    func.count(),
+                    *[
+                        func.count().filter(Notification.status == status)
+                        for status in NOTIFICATION_STATUSES
+                    ]
+                ).select_from(Notification)
+            )).one()
+
+        by_status = dict(zip(NOTIFICATION_STATUSES, counts[1:]))
         return {
             "success": True,
             "data": {
-                "total": total_count,
-                "unread": unread_count,
-                "read": read_count,
-                "accepted": accepted_count
+                "total": counts[0],
+                "unread": by_status["unread"],
+                "read": by_status["read"],
+                "accepted": by_status["accepted"],
+                "by_status": by_status
             }
         }
 
     except Exception as e:
         return {"success": False, "message": str(e)}
+
+
+@app.get("/notifications/unread-count")
+async def get_unread_notification_count(
+    current_user: TokenData = Depends(get_current_user_flexible),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get the current user's unread notification count (badge number)."""
+    try:
+        unread_count = await _count_unread_notifications(
+            session, int(current_user.sub), current_user.role)
+        return {
+            "success": True,
+            "unread": unread_count
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error counting unread notifications: {str(e)}")
@@ -5,12 +5,16 @@ This module handles user authentication and registration for drivers and riders.
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, Response, Request, HTTPException
 from jose import JWTError
+import time
 from datetime import timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import Driver, Rider
-from security import hash_password, verify_password, create_access_token, verify_token
+from security import hash_password_async, verify_password_async, create_access_token, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from schema import TokenData
+from token_cache import token_cache
+from driver_counters import driver_counters
+from user_identity import find_taken_kinds, find_user_by_identifier, identity_rows
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -57,59 +61,22 @@ def get_token_from_header_or_cookie(request: Request) -> str:
 
 
 # User existence check functions
-def check_email_exists(session: Session, email: str):
+def raise_taken(field: str):
     """
-    Check if the email is already registered.
+    Raise the 409 for an email or mobile that is already registered.
     """
-    return (
-        session.query(Driver).filter(Driver.email == email).first() or
-        session.query(Rider).filter(Rider.email == email).first()
-    )
-
-
-def check_mobile_exists(session: Session, mobile: str):
-    """
-    Check if the mobile number is already registered.
-    """
-    return (
-        session.query(Driver).filter(Driver.mobile == mobile).first() or
-        session.query(Rider).filter(Rider.mobile == mobile).first()
-    )
-
-
-def is_email_or_mobile_taken(session: Session, email: str, mobile: str):
-    """
-    Checks if the given email or mobile is already registered
-    for either a driver or a rider.
-    """
-    email_exists = check_email_exists(session, email)
-    mobile_exists = check_mobile_exists(session, mobile)
-
-    return email_exists, mobile_exists
-
-
-# User creation functions
-def validate_unique_user_data(session: Session, email: str, mobile: str):
-    """
-    Validates that email and mobile are not already taken.
-    Raises appropriate exceptions if they are.
-    """
-    email_exists, mobile_exists = is_email_or_mobile_taken(
-        session, email, mobile)
-
-    if email_exists:
+    if field == "email":
         raise HTTPException(
             status_code=409,
             detail="This email is already registered. Use a different email."
         )
-
-    if mobile_exists:
-        raise HTTPException(
-            status_code=409,
-            detail="This mobile number is already registered. Use a different mobile."
-        )
+    raise HTTPException(
+        status_code=409,
+        detail="This mobile number is already registered. Use a different mobile."
+    )
 
 
+# User creation functions
 def create_user_instance(user_type: str, user_data: dict, hashed_password: str):
     """
     Creates a new user instance based on user type.
@@ -132,28 +99,46 @@ def create_user_instance(user_type: str, user_data: dict, hashed_password: str):
         raise HTTPException(status_code=400, detail="Invalid user type")
 
 
-def create_user(session: Session, user_data: dict):
+async def create_user(session: AsyncSession, user_data: dict):
     """
     Registers a new driver or rider.
     Ensures that an email and mobile number cannot be used for both 
     driver and rider roles.
     """
     try:
-        # Validate uniqueness of email and mobile
-        validate_unique_user_data(
+        # Email and mobile must not be registered under either role; the
+        # identity primary key catches races with a concurrent signup
+        taken = await find_taken_kinds(
             session, user_data["email"], user_data["mobile"])
+        for field in ("email", "mobile"):
+            if field in taken:
+                raise_taken(field)
 
         # Hash the password
-        hashed_password = hash_password(user_data["password"])
+        hashed_password = await hash_password_async(user_data["password"])
 
         # Create new user instance
         new_user = create_user_instance(
             user_data["user_type"], user_data, hashed_password)
 
-        # Add to database
+        # Add to database together with its identity rows
         session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
+        try:
+            await session.flush()
+            session.add_all(identity_rows(
+                user_data["user_type"], get_user_id(new_user, user_data["user_type"]),
+                user_data["email"], user_data["mobile"]))
+            await session.commit()
+        except IntegrityError as exc:
+            await session.rollback()
+            taken = await find_taken_kinds(
+                session, user_data["email"], user_data["mobile"])
+            if not taken:
+                taken = {"mobile" if "mobile" in str(exc.orig) else "email"}
+            raise_taken("email" if "email" in taken else "mobile")
+
+        if user_data["user_type"] == "driver":
+            driver_counters.driver_added()
 
         return {
             "success": True,
@@ -162,35 +147,18 @@ def create_user(session: Session, user_data: dict):
 
     except Exception as exc:
         print(exc)
-        session.rollback()
+        await session.rollback()
         raise
 
 
 # User authentication functions
-def find_user_by_credential(session: Session, phone_or_email: str, user_type: str):
+async def find_user_by_credential(session: AsyncSession, phone_or_email: str, user_type: str):
     """
     Find a user by phone or email based on user type.
     """
-    if user_type == "driver":
-        return (
-            session.query(Driver)
-            .filter(
-                (Driver.email == phone_or_email) |
-                (Driver.mobile == phone_or_email)
-            )
-            .first()
-        )
-    elif user_type == "rider":
-        return (
-            session.query(Rider)
-            .filter(
-                (Rider.email == phone_or_email) |
-                (Rider.mobile == phone_or_email)
-            )
-            .first()
-        )
-    else:
+    if user_type not in ("driver", "rider"):
         raise HTTPException(status_code=400, detail="Invalid user type")
+    return await find_user_by_identifier(session, phone_or_email, user_type)
 
 
 def get_user_id(user, user_type: str):
@@ -203,28 +171,23 @@ def get_user_id(user, user_type: str):
         return user.rider_id
 
 
-def set_auth_cookie(response: Response, user, user_type: str):
+def build_token_data(user, user_type: str) -> dict:
     """
-    Set the authentication cookie with JWT token.
+    Build the JWT claims for a user.
     """
-    # Get appropriate user ID
-    user_id = get_user_id(user, user_type)
-
-    # Create token data
-    token_data = {
-        "sub": str(user_id),
+    return {
+        "sub": str(get_user_id(user, user_type)),
         "email": user.email,
         "mobile": user.mobile,
         "name": user.name,
         "role": user_type
     }
 
-    # Generate JWT token
-    access_token = create_access_token(
-        data=token_data,
-        expires_delta=timedelta(minutes=7200)
-    )
 
+def set_auth_cookie(response: Response, access_token: str):
+    """
+    Set the authentication cookie with JWT token.
+    """
     # Set JWT as HTTP-only cookie
     response.set_cookie(
         key="auth_token",
@@ -237,8 +200,8 @@ def set_auth_cookie(response: Response, user, user_type: str):
     )
 
 
-def authenticate_user(
-    session: Session,
+async def authenticate_user(
+    session: AsyncSession,
     phone_or_email: str,
     password: str,
     user_type: str,
@@ -250,35 +213,32 @@ def authenticate_user(
     """
     try:
         # Find user by credential
-        user = find_user_by_credential(session, phone_or_email, user_type)
+        user = await find_user_by_credential(session, phone_or_email, user_type)
 
         # Verify user credentials
-        if not user or not verify_password(password, user.password):
+        if not user or not await verify_password_async(password, user.password):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         # If it's a driver, set them as available when they log in
         if user_type == "driver" and hasattr(user, 'is_available'):
             user.is_available = True
-            session.commit()
+            await session.commit()
+            driver_counters.set_available(user.driver_id, True)
             print(f"✅ Driver {user.driver_id} set as available on login")
 
-        # Set auth cookie
-        set_auth_cookie(response, user, user_type)
+        # One token for both the cookie and the response body
+        token_data = build_token_data(user, user_type)
+        expires_at = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        access_token = create_access_token(
+            data=token_data,
+            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        set_auth_cookie(response, access_token)
 
-        # Get user ID
-        user_id = get_user_id(user, user_type)
+        # The token is known-good; spare the first request a verification
+        token_cache.put(access_token, TokenData(**token_data), expires_at)
 
-        # Create token data for response
-        token_data = {
-            "sub": str(user_id),
-            "email": user.email,
-            "mobile": user.mobile,
-            "name": user.name,
-            "role": user_type
-        }
-
-        # Generate JWT token for response body
-        access_token = create_access_token(data=token_data)
+        user_id = get_user_id(user, user_type)
 
         # Return user information with token
         return {
@@ -293,62 +253,71 @@ def authenticate_user(
 
     except Exception as exc:
         print(exc)
-        session.rollback()
+        await session.rollback()
         raise
 
 
-def get_current_user(token: str = Depends(get_token_from_cookie)):
+def resolve_token(token: str) -> TokenData:
     """
-    Get current user from JWT token (cookie only).
+    Verify a JWT and return its TokenData.
+    Tokens verified before are served from the token cache until they expire.
+    Raises credentials_exception for invalid, expired or revoked tokens.
     """
+    # Revoked tokens are never cached, so only a miss needs the revocation check
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
+
+    if token_cache.is_revoked(token):
+        raise credentials_exception
+
     try:
         # Verify the token
         payload = verify_token(token)
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-
-        # Create token data
-        token_data = TokenData(
-            sub=payload.get("sub"),
-            email=payload.get("email"),
-            mobile=payload.get("mobile"),
-            name=payload.get("name"),
-            role=payload.get("role")
-        )
-
-        return token_data
-
     except JWTError as exc:
         print(f"JWT Error: {exc}")
         raise credentials_exception
 
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise credentials_exception
 
-def get_current_user_flexible(request: Request):
+    # Create token data
+    token_data = TokenData(
+        sub=payload.get("sub"),
+        email=payload.get("email"),
+        mobile=payload.get("mobile"),
+        name=payload.get("name"),
+        role=payload.get("role")
+    )
+
+    token_cache.put(token, token_data, payload.get("exp"))
+    return token_data
+
+
+def revoke_token(token: str):
     """
-    Get current user from JWT token (supports both Bearer token and cookie).
+    Reject a token from now on, e.g. after logout.
     """
     try:
-        # Get token from header or cookie
-        token = get_token_from_header_or_cookie(request)
+        exp = verify_token(token).get("exp")
+    except JWTError:
+        # Already invalid or expired
+        return
+    token_cache.revoke(token, exp)
 
-        # Verify the token
-        payload = verify_token(token)
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-
-        # Create token data
-        token_data = TokenData(
-            sub=payload.get("sub"),
-            email=payload.get("email"),
-            mobile=payload.get("mobile"),
-            name=payload.get("name"),
-            role=payload.get("role")
-        )
 
-        return token_data
+def get_current_user(token: str = Depends(get_token_from_cookie)):
+    """
+    Get current user from JWT token (cookie only).
+    """
+    return resolve_token(token)
 
-    except JWTError as exc:
-        print(f"JWT Error: {exc}")
-        raise credentials_exception
+
+def get_current_user_flexible(request: Request):
+    """
+    Get current user from JWT token (supports both Bearer token and cookie).
+    """
+    # Get token from header or cookie
+    token = get_token_from_header_or_cookie(request)
+    return resolve_token(token)
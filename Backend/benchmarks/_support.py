@@ -0,0 +1,66 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Run the scripts from the Backend directory, e.g.
+`python benchmarks/bench_nearby_drivers.py`. None of them needs
+PostgreSQL; database benchmarks use SQLite through the same SQLAlchemy
+code paths.
+"""
+import builtins
+import os
+import sys
+import time
+import warnings
+from contextlib import contextmanager
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Backend modules are imported as top-level modules (see api.py)
+sys.path.insert(0, BACKEND_DIR)
+# SQLModel's session.execute() and SQLAlchemy 2.0 deprecation notices
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+@contextmanager
+def quiet():
+    """
+    Silence the emoji logging of the code under test.
+    """
+    original = builtins.print
+    builtins.print = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        builtins.print = original
+
+
+def import_api():
+    """
+    Import api.py without a database: it creates its tables on import.
+    """
+    from sqlmodel import SQLModel
+    with mock.patch.object(SQLModel.metadata, "create_all"), quiet():
+        import api
+    return api
+
+
+def mean_ms(func, *args, repeat: int = 30) -> float:
+    """
+    Mean wall time of func(*args) in milliseconds, after one warm-up call.
+    """
+    func(*args)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def mean_ms_async(func, *args, repeat: int = 30) -> float:
+    """
+    Mean wall time of `await func(*args)` in milliseconds, after one warm-up call.
+    """
+    await func(*args)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func(*args)
+    return (time.perf_counter() - started) / repeat * 1000
@@ -0,0 +1,111 @@
+"""
+Endpoint throughput: sync Session vs. AsyncSession in async def (user-015).
+
+Serves the same one-query endpoint from a sync Session (how the async
+endpoints used the database before) and from an AsyncSession, with
+engines built by db.create_db_engine / db.create_db_async_engine against
+a SQLite file. Each query sleeps --query-ms inside the database to stand
+in for a server round-trip. Load goes through httpx's ASGI transport.
+
+With --concurrency above the pool size the sync variant deadlocks: the
+event loop blocks on a pool checkout while holding connections that only
+it could return, until DB_POOL_TIMEOUT expires and the request fails.
+Lower DB_POOL_TIMEOUT to see this quickly:
+
+    python benchmarks/bench_async_session.py --requests 400 --concurrency 16
+    DB_POOL_TIMEOUT=1 python benchmarks/bench_async_session.py --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event, text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import _support  # noqa: F401  (puts Backend on sys.path)
+from db import (
+    DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    create_db_async_engine, create_db_engine, to_async_url,
+)
+
+
+def build_app(url: str, query_ms: float):
+    def slow_query():
+        time.sleep(query_ms / 1000)
+        return 1
+
+    def register(dbapi_connection, _):
+        dbapi_connection.create_function("slow_query", 0, slow_query)
+
+    engine = create_db_engine(url)
+    async_engine = create_db_async_engine(to_async_url(url))
+    event.listen(engine, "connect", register)
+    event.listen(async_engine.sync_engine, "connect", register)
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    async def get_async_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_endpoint(session: Session = Depends(get_session)):
+        return {"value": session.execute(text("SELECT slow_query()")).scalar()}
+
+    @app.get("/async")
+    async def async_endpoint(session: AsyncSession = Depends(get_async_session)):
+        return {"value": (await session.execute(text("SELECT slow_query()"))).scalar()}
+
+    return app, async_engine
+
+
+async def load(app, path: str, requests: int, concurrency: int):
+    """
+    Returns:
+        tuple: (requests per second, number of failed requests)
+    """
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                return (await client.get(path)).status_code == 200
+
+        started = time.perf_counter()
+        succeeded = await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - started), succeeded.count(False)
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app, async_engine = build_app(f"sqlite:///{path}", args.query_ms)
+    print(f"pool {DB_POOL_SIZE}+{DB_MAX_OVERFLOW} (timeout {DB_POOL_TIMEOUT:g} s), "
+          f"{args.requests} requests at concurrency {args.concurrency}, "
+          f"{args.query_ms:g} ms per query")
+    for name in ("sync", "async"):
+        rate, failed = await load(app, f"/{name}", args.requests, args.concurrency)
+        print(f"{name:>6} Session: {rate:8.0f} req/s, {failed} failed")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--query-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
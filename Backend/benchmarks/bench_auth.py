@@ -0,0 +1,84 @@
+"""
+Signup and login cost: statements, JWTs minted and time (user-018).
+
+Signs up and logs in --users riders and drivers through
+authservice.create_user and authservice.authenticate_user against an
+in-memory SQLite database. bcrypt runs at BCRYPT_ROUNDS=4 unless set,
+so the database and JWT work is not buried under hashing.
+
+    python benchmarks/bench_auth.py --users 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from _support import quiet
+import authservice
+import models
+
+TABLES = ("Driver", "Rider", "UserIdentity")
+
+
+async def run(users: int):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all, tables=[
+            getattr(models, name).__table__ for name in TABLES if hasattr(models, name)])
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    statements = [0]
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda *args: statements.__setitem__(0, statements[0] + 1))
+    tokens = [0]
+    create_access_token = authservice.create_access_token
+
+    def counted_create_access_token(*args, **kwargs):
+        tokens[0] += 1
+        return create_access_token(*args, **kwargs)
+    authservice.create_access_token = counted_create_access_token
+
+    totals = {"signup": [0.0, 0, 0], "login": [0.0, 0, 0]}
+    with quiet():
+        for i in range(users):
+            user_type = "driver" if i % 2 else "rider"
+            email = f"user{i}@example.com"
+            for step in ("signup", "login"):
+                statements[0] = tokens[0] = 0
+                started = time.perf_counter()
+                async with sessions() as session:
+                    if step == "signup":
+                        await authservice.create_user(session, {
+                            "name": f"User {i}", "mobile": f"0171{i:07d}", "email": email,
+                            "password": "secret1", "user_type": user_type})
+                    else:
+                        await authservice.authenticate_user(
+                            session, email, "secret1", user_type, Response())
+                total = totals[step]
+                total[0] += time.perf_counter() - started
+                total[1] = max(total[1], statements[0])
+                total[2] = max(total[2], tokens[0])
+    await engine.dispose()
+
+    print(f"{users} users, bcrypt rounds {os.environ['BCRYPT_ROUNDS']}")
+    for step, (seconds, most_statements, most_tokens) in totals.items():
+        print(f"{step:>7}: {seconds / users * 1000:6.2f} ms, "
+              f"up to {most_statements} statements, {most_tokens} JWTs minted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    asyncio.run(run(parser.parse_args().users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Available-driver queries: whole entities vs. projected columns (user-021).
+
+Fills a SQLite file with --drivers drivers (--available-pct of them
+available, each with a bcrypt-sized password hash) and stored locations
+for half of them plus every available driver. It then times
+GET /drivers/available and the rider map query
+(api._get_available_driver_locations) against the entity-loading
+queries they replaced, with the tracemalloc peak of one call.
+
+SQLite gets its own partial index on the available drivers, which stands
+in for PostgreSQL's ix_driver_available.
+
+    python benchmarks/bench_available_drivers.py --drivers 50000
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, insert
+from sqlmodel import Session, select
+
+from _support import import_api, mean_ms
+import db
+from models import Driver, DriverLocation
+
+DRIVERLOCATION_DDL = (
+    "CREATE TABLE driverlocation (driver_id INTEGER PRIMARY KEY, "
+    "latitude FLOAT NOT NULL, longitude FLOAT NOT NULL, location TEXT)"
+)
+
+
+def build_database(path: str, drivers: int, available_pct: float):
+    engine = create_engine(f"sqlite:///{path}")
+    # GeoAlchemy2 wraps geography columns in AsBinary() when loading entities
+    event.listen(engine, "connect",
+                 lambda connection, _: connection.create_function("AsBinary", 1, lambda value: value))
+    every = max(1, round(100 / available_pct))
+    Driver.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(DRIVERLOCATION_DDL)
+        conn.execute(insert(Driver), [
+            {"name": f"Driver {i}", "mobile": f"0171{i:07d}", "email": f"driver{i}@example.com",
+             "password": "$2b$12$" + "x" * 53, "ratings": 4.5, "is_available": i % every == 0}
+            for i in range(drivers)
+        ])
+        conn.exec_driver_sql(
+            "INSERT INTO driverlocation SELECT driver_id, 23.7 + (driver_id % 1000) / 1e4, 90.4, NULL "
+            "FROM driver WHERE driver_id % 2 = 1 OR is_available")
+        conn.exec_driver_sql(
+            "CREATE INDEX ix_driver_available_sqlite ON driver (driver_id, name) WHERE is_available = 1")
+        conn.exec_driver_sql("ANALYZE")
+    return engine
+
+
+def entity_available_drivers(session: Session):
+    # GET /drivers/available before: whole Driver rows
+    drivers = session.query(Driver).filter(Driver.is_available == True).all()
+    result = [
+        {"driver_id": d.driver_id, "name": d.name, "email": d.email, "mobile": d.mobile,
+         "ratings": d.ratings, "is_available": d.is_available}
+        for d in drivers
+    ]
+    session.expunge_all()
+    return result
+
+
+def entity_driver_locations():
+    # The rider map query before: whole Driver and DriverLocation rows
+    with db.session_scope() as session:
+        results = session.exec(
+            select(Driver, DriverLocation).join(
+                DriverLocation, Driver.driver_id == DriverLocation.driver_id
+            ).filter(Driver.is_available == True)
+        ).all()
+        return [
+            {"id": d.driver_id, "latitude": loc.latitude, "longitude": loc.longitude,
+             "timestamp": datetime.now().isoformat(), "name": d.name, "status": "available"}
+            for d, loc in results
+        ]
+
+
+def measure(func, *args, repeat: int):
+    elapsed_ms = mean_ms(func, *args, repeat=repeat)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return f"{elapsed_ms:8.2f} ms, peak {peak / 2 ** 20:5.2f} MiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drivers", type=int, default=50000)
+    parser.add_argument("--available-pct", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = build_database(path, args.drivers, args.available_pct)
+    # session_scope() uses the shared engine
+    db.engine = engine
+    api = import_api()
+
+    print(f"{args.drivers} drivers, {args.available_pct:g}% available, mean of {args.repeat} calls")
+    with Session(engine) as session:
+        print("/drivers/available  entities: ", measure(entity_available_drivers, session, repeat=args.repeat))
+        print("/drivers/available  projected:", measure(api.get_available_drivers, session, repeat=args.repeat))
+    print("rider map query     entities: ", measure(entity_driver_locations, repeat=args.repeat))
+    print("rider map query     projected:", measure(api._get_available_driver_locations, repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
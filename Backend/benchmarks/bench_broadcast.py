@@ -0,0 +1,70 @@
+"""
+Broadcast encoding: one shared Frame vs. json.dumps per recipient (user-008).
+
+Connects N riders with no-op sockets and queues one driver-location
+message for all of them, the way a driver move fans out: once through
+ConnectionManager.send_to_users with a Frame, and once encoding the
+payload per recipient as the manager did before frames.
+
+    python benchmarks/bench_broadcast.py --riders 1000 10000
+"""
+import argparse
+import asyncio
+import json
+
+from _support import import_api, mean_ms_async, quiet
+from frames import Frame, orjson
+
+PAYLOAD = {
+    "type": "driver-location",
+    "data": {"driver_id": 7, "latitude": 23.7801, "longitude": 90.4072,
+             "name": "Driver 7", "timestamp": "2024-01-01T00:00:00"},
+}
+COALESCE_KEY = ("driver-location", 7)
+
+
+class NullWebSocket:
+    async def send_text(self, text):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+async def run(api, riders: int, repeat: int):
+    manager = api.ConnectionManager()
+    with quiet():
+        for user_id in range(1, riders + 1):
+            await manager.connect(NullWebSocket(), f"rider-{user_id}", user_id, "rider")
+    rider_ids = list(manager.rider_ids)
+
+    async def shared_frame():
+        await manager.send_to_users(Frame(PAYLOAD), rider_ids, COALESCE_KEY)
+
+    async def per_recipient():
+        for user_id in rider_ids:
+            writer = manager.writers.get(manager.user_connections.get(user_id))
+            writer.enqueue(json.dumps(PAYLOAD), COALESCE_KEY)
+
+    frame_ms = await mean_ms_async(shared_frame, repeat=repeat)
+    dumps_ms = await mean_ms_async(per_recipient, repeat=repeat)
+    for writer in list(manager.writers.values()):
+        writer.stop()
+    print(f"{riders:>7} {frame_ms:>10.2f} {dumps_ms:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--riders", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    api = import_api()
+    print(f"encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'riders':>7} {'frame ms':>10} {'per-rider ms':>12}")
+    for riders in args.riders:
+        asyncio.run(run(api, riders, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
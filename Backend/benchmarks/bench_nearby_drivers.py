@@ -0,0 +1,75 @@
+"""
+Nearby-driver search: grid index vs. a full haversine scan (user-001).
+
+Drivers are spread uniformly over a 1 x 1 degree box around Dhaka. Each
+query searches from a random point in the box; the scan is the per-driver
+loop find_nearby_drivers ran before the grid index. Results of both are
+compared, so the script also checks that the grid misses nobody.
+
+    python benchmarks/bench_nearby_drivers.py --drivers 1000 10000 100000
+"""
+import argparse
+import math
+import random
+import time
+
+import _support  # noqa: F401  (puts Backend on sys.path)
+from driver_location_service import DriverLocationService
+from driver_location_store import EARTH_RADIUS_KM
+
+
+def scan(drivers, latitude, longitude, radius_km):
+    # The pre-index search: haversine against every driver
+    lat1 = math.radians(latitude)
+    found = set()
+    for driver_id, (lat, lon) in drivers.items():
+        lat2 = math.radians(lat)
+        h = (math.sin((lat2 - lat1) / 2) ** 2 +
+             math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(lon - longitude) / 2) ** 2)
+        if 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h)) <= radius_km:
+            found.add(driver_id)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--drivers", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--radius", type=float, nargs="+", default=[2.0, 5.0, 30.0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latitude", type=float, default=23.8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'drivers':>8} {'radius':>7} {'found':>7} {'grid ms':>9} {'scan ms':>9} {'mismatches':>10}")
+    for count in args.drivers:
+        service = DriverLocationService()
+        drivers = {}
+        for driver_id in range(count):
+            position = (args.latitude + rng.uniform(-0.5, 0.5), 90.4 + rng.uniform(-0.5, 0.5))
+            service.update_driver_location(driver_id, *position)
+            drivers[driver_id] = position
+
+        for radius_km in args.radius:
+            centers = [(args.latitude + rng.uniform(-0.5, 0.5), 90.4 + rng.uniform(-0.5, 0.5))
+                       for _ in range(args.queries)]
+            grid_s = scan_s = 0.0
+            found = mismatches = 0
+            for latitude, longitude in centers:
+                started = time.perf_counter()
+                nearby = service.find_nearby_drivers(latitude, longitude, radius_km)
+                grid_s += time.perf_counter() - started
+
+                started = time.perf_counter()
+                expected = scan(drivers, latitude, longitude, radius_km)
+                scan_s += time.perf_counter() - started
+
+                found += len(expected)
+                mismatches += {d["driver_id"] for d in nearby} != expected
+            print(f"{count:>8} {radius_km:>7g} {found / args.queries:>7.0f} "
+                  f"{grid_s / args.queries * 1000:>9.3f} {scan_s / args.queries * 1000:>9.3f} "
+                  f"{mismatches:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Login password checks: inline bcrypt vs. the hashing executor (user-017).
+
+Runs --logins concurrent password verifications on the event loop, once
+calling security.verify_password inline (as login did before) and once
+through security.verify_password_async. A 5 ms ticker task measures how
+long the loop is stalled, i.e. how late every other connection would be.
+
+    BCRYPT_ROUNDS=12 python benchmarks/bench_password_hashing.py --logins 32
+"""
+import argparse
+import asyncio
+import time
+
+import _support  # noqa: F401  (puts Backend on sys.path)
+import security
+
+TICK_SECONDS = 0.005
+
+
+async def ticker(stalls: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        stalls.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+
+async def run(name: str, verify, logins: int, hashed: str):
+    stalls, stop = [], asyncio.Event()
+    tick_task = asyncio.create_task(ticker(stalls, stop))
+    await asyncio.sleep(TICK_SECONDS * 4)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify("secret1", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick_task
+
+    assert all(results)
+    print(f"{name:>9}: {logins / elapsed:6.1f} logins/s, max loop stall {max(stalls):7.0f} ms")
+
+
+async def verify_inline(password: str, hashed: str) -> bool:
+    return security.verify_password(password, hashed)
+
+
+async def compare(logins: int):
+    hashed = security.hash_password("secret1")
+    print(f"bcrypt rounds {security.BCRYPT_ROUNDS}, "
+          f"{security.PASSWORD_HASH_WORKERS} hashing threads, {logins} concurrent logins")
+    await run("inline", verify_inline, logins, hashed)
+    await run("executor", security.verify_password_async, logins, hashed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=32)
+    asyncio.run(compare(parser.parse_args().logins))
+
+
+if __name__ == "__main__":
+    main()
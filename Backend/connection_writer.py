@@ -0,0 +1,167 @@
+"""
+Per-connection outbound queues so one slow WebSocket cannot stall a broadcast.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from fastapi import WebSocket
+
+# Maximum frames waiting to be sent on one connection
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "256"))
+# Evict a connection whose oldest pending frame has waited this long (seconds)
+WS_MAX_LAG_SECONDS = float(os.getenv("WS_MAX_LAG_SECONDS", "10"))
+# Evict a connection if a single send takes longer than this (seconds)
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+
+class ConnectionWriter:
+    """
+    Owns all outbound traffic for one WebSocket.
+
+    Callers enqueue frames without awaiting the network; a dedicated task
+    drains the queue in order. Frames enqueued with a coalesce key (e.g. a
+    driver's position) replace any still-pending frame with the same key.
+    When the queue is full the oldest coalescable frame is dropped; if
+    nothing can be dropped, or the consumer falls more than `max_lag`
+    seconds behind, the connection is evicted.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        connection_id: str,
+        on_evict: Optional[Callable[[str], Any]] = None,
+        max_queue: int = WS_OUTBOUND_QUEUE_SIZE,
+        max_lag: float = WS_MAX_LAG_SECONDS,
+        send_timeout: float = WS_SEND_TIMEOUT
+    ):
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.on_evict = on_evict
+        self.max_queue = max_queue
+        self.max_lag = max_lag
+        self.send_timeout = send_timeout
+        # Each entry is [coalesce_key, frame, enqueued_at]
+        self._queue: Deque[List[Any]] = deque()
+        self._keyed: Dict[Hashable, List[Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.stats = {"sent": 0, "coalesced": 0, "dropped": 0}
+
+    def start(self):
+        """
+        Start the writer task on the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """
+        Stop the writer task and discard pending frames.
+        """
+        self.closed = True
+        self._queue.clear()
+        self._keyed.clear()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def lag(self) -> float:
+        """
+        Seconds the oldest pending frame has been waiting.
+        """
+        if not self._queue:
+            return 0.0
+        return time.monotonic() - self._queue[0][2]
+
+    def enqueue(self, frame, coalesce_key: Optional[Hashable] = None) -> bool:
+        """
+        Queue a frame for sending.
+
+        Args:
+            frame: Text to send
+            coalesce_key: Frames with the same key replace each other while pending
+
+        Returns:
+            bool: False if the connection is closed or was evicted
+        """
+        if self.closed:
+            return False
+
+        if coalesce_key is not None:
+            pending = self._keyed.get(coalesce_key)
+            if pending is not None:
+                pending[1] = frame
+                self.stats["coalesced"] += 1
+                return True
+
+        if self.lag() > self.max_lag:
+            self._evict("lagging")
+            return False
+
+        if len(self._queue) >= self.max_queue and not self._drop_oldest_coalescable():
+            self._evict("queue full")
+            return False
+
+        entry = [coalesce_key, frame, time.monotonic()]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._keyed[coalesce_key] = entry
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest_coalescable(self) -> bool:
+        for entry in self._queue:
+            if entry[0] is not None:
+                self._queue.remove(entry)
+                del self._keyed[entry[0]]
+                self.stats["dropped"] += 1
+                return True
+        return False
+
+    def _evict(self, reason: str):
+        if self.closed:
+            return
+        print(f"⚠️ Evicting slow WebSocket {self.connection_id}: {reason}")
+        self.stop()
+        asyncio.ensure_future(self._close())
+        if self.on_evict:
+            self.on_evict(self.connection_id)
+
+    async def _close(self):
+        try:
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def _run(self):
+        while not self.closed:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            key, frame, _ = self._queue.popleft()
+            if key is not None:
+                self._keyed.pop(key, None)
+
+            try:
+                if isinstance(frame, bytes):
+                    send = self.websocket.send_bytes(frame)
+                else:
+                    send = self.websocket.send_text(frame)
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+                self.stats["sent"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._evict(f"send failed: {e!r}")
+                return
@@ -0,0 +1,137 @@
+"""
+In-memory driver availability counters for the rider dashboard.
+"""
+import os
+import threading
+from typing import Set, Tuple
+
+from sqlalchemy import func, select
+
+from db import session_scope
+from models import Driver
+
+# Seconds between full recounts that correct any drift from missed updates
+DRIVER_COUNT_RECONCILE_INTERVAL = float(
+    os.getenv("DRIVER_COUNT_RECONCILE_INTERVAL", "60"))
+# Seconds between pushes of changed counts to "subscribe-driver-count" clients
+DRIVER_COUNT_PUSH_INTERVAL = float(os.getenv("DRIVER_COUNT_PUSH_INTERVAL", "1"))
+# Recounts to try per reconcile when updates keep landing during the read
+DRIVER_COUNT_RECONCILE_ATTEMPTS = 3
+
+
+class DriverCounters:
+    """
+    Counts of available and registered drivers, seeded once from the
+    database and then kept current by the code paths that change
+    `Driver.is_available`.
+
+    The ids of available drivers are kept, so repeated updates to the same
+    state do not skew the count. `version` increases on every change, which
+    lets the push loop skip ticks where nothing changed. Safe to use from
+    the threadpool that runs sync endpoints.
+    """
+
+    def __init__(self):
+        self._available: Set[int] = set()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.version = 0
+        self.loaded = False
+        self.stats = {"updates": 0, "reconciles": 0,
+                      "reconciles_skipped": 0, "drift": 0}
+
+    def set_available(self, driver_id: int, is_available: bool):
+        """
+        Record a committed change of a driver's availability.
+        """
+        driver_id = int(driver_id)
+        with self._lock:
+            if is_available == (driver_id in self._available):
+                return
+            if is_available:
+                self._available.add(driver_id)
+            else:
+                self._available.discard(driver_id)
+            self.version += 1
+            self.stats["updates"] += 1
+
+    def driver_added(self):
+        """
+        Record a newly registered driver (registered as unavailable).
+        """
+        with self._lock:
+            self._total += 1
+            self.version += 1
+            self.stats["updates"] += 1
+
+    def reconcile(self) -> int:
+        """
+        Recount from the database and replace the in-memory state (blocking).
+
+        The recount is only applied if no update arrived while it was being
+        read; otherwise it is read again, and after a few attempts the
+        reconcile is skipped until the next interval.
+
+        Returns:
+            int: How far the available count had drifted
+        """
+        for _ in range(DRIVER_COUNT_RECONCILE_ATTEMPTS):
+            with self._lock:
+                version = self.version
+            available, total = self._read_counts()
+
+            with self._lock:
+                if self.version != version:
+                    # An update landed during the read; the recount may be older
+                    continue
+                drift = len(available ^ self._available) + abs(total - self._total)
+                if self.loaded and drift:
+                    self.stats["drift"] += drift
+                if drift:
+                    self.version += 1
+                self._available = available
+                self._total = total
+                self.loaded = True
+                self.stats["reconciles"] += 1
+            return drift
+
+        with self._lock:
+            self.stats["reconciles_skipped"] += 1
+        return 0
+
+    @staticmethod
+    def _read_counts() -> Tuple[Set[int], int]:
+        with session_scope() as session:
+            available = set(session.execute(
+                select(Driver.driver_id).where(Driver.is_available == True)
+            ).scalars().all())
+            total = session.execute(
+                select(func.count(Driver.driver_id))).scalar_one()
+        return available, total
+
+    def snapshot(self) -> dict:
+        """
+        Get the current counts.
+        """
+        with self._lock:
+            available = len(self._available)
+            return {
+                "available_count": available,
+                "unavailable_count": self._total - available,
+                "total_count": self._total,
+            }
+
+    def get_stats(self) -> dict:
+        """
+        Get update/reconcile counters and the drift corrected so far.
+        """
+        return {
+            **self.stats,
+            **self.snapshot(),
+            "version": self.version,
+            "reconcile_interval": DRIVER_COUNT_RECONCILE_INTERVAL,
+        }
+
+
+# Global instance
+driver_counters = DriverCounters()
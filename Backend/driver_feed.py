@@ -0,0 +1,86 @@
+"""
+Versioned snapshot + delta stream of driver positions for riders.
+"""
+from typing import Dict, List
+
+from frames import encode_message
+
+
+class DriverFeed:
+    """
+    Tracks which riders use the delta protocol and the sequence number
+    each of them has seen.
+
+    Riders receive one "drivers-snapshot" and then "drivers-delta" frames
+    whose `seq` increases by exactly one per frame. Each delta frame
+    carries a list of ops. A rider that sees a gap sends "driver-resync"
+    and gets a fresh snapshot. Ops are encoded once and shared; only the
+    sequence number and the op list differ per rider.
+    Clients should apply both "add" and "move" as upserts.
+    """
+
+    def __init__(self):
+        # Maps rider id -> last sequence number sent to that rider
+        self.sequences: Dict[int, int] = {}
+
+    def __contains__(self, rider_id: int) -> bool:
+        return rider_id in self.sequences
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    def subscribe(self, rider_id: int):
+        """
+        Start sending deltas to a rider.
+        """
+        self.sequences.setdefault(rider_id, 0)
+
+    def unsubscribe(self, rider_id: int):
+        """
+        Stop sending deltas to a rider.
+        """
+        self.sequences.pop(rider_id, None)
+
+    def _next_seq(self, rider_id: int) -> int:
+        seq = self.sequences.get(rider_id, 0) + 1
+        self.sequences[rider_id] = seq
+        return seq
+
+    def snapshot_text(self, rider_id: int, drivers: List[dict]) -> str:
+        """
+        Build a full snapshot frame for one rider.
+
+        Args:
+            rider_id: ID of the rider
+            drivers: Driver entries (id, latitude, longitude, timestamp)
+
+        Returns:
+            str: Encoded "drivers-snapshot" frame
+        """
+        self.subscribe(rider_id)
+        return encode_message({
+            "type": "drivers-snapshot",
+            "seq": self._next_seq(rider_id),
+            "data": drivers
+        })
+
+    @staticmethod
+    def encode_op(op: dict) -> str:
+        """
+        Encode a single {"op": "add" | "move" | "remove", "id": ..., ...} entry.
+        """
+        return encode_message(op)
+
+    def delta_text(self, rider_id: int, op_texts: List[str]) -> str:
+        """
+        Build a delta frame for one rider from pre-encoded ops.
+
+        Args:
+            rider_id: ID of the rider
+            op_texts: Ops produced by encode_op
+
+        Returns:
+            str: Encoded "drivers-delta" frame
+        """
+        seq = self._next_seq(rider_id)
+        return '{"type":"drivers-delta","seq":%d,"data":[%s]}' % (seq, ",".join(op_texts))
@@ -1,28 +1,190 @@
 """
 Driver Location Service for managing driver positions and nearby driver queries.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 import math
-from sqlalchemy.orm import Session
-from models import DriverLocation, Driver
-from db import engine
+from driver_location_store import DriverLocationStore, EARTH_RADIUS_KM
+from location_writer import location_writer
 from fastapi import WebSocket
 
+# Length of one degree of latitude on the sphere used for distances, so the
+# grid search box never cuts into the haversine radius
+KM_PER_DEGREE = math.radians(1) * EARTH_RADIUS_KM
+# Drivers not seen within this window are treated as offline
+DRIVER_TIMEOUT = timedelta(minutes=5)
+# Scan every driver instead of the grid once the grid would hand back more
+# than this share of them; gathering candidates per cell costs far more
+# per driver than the vectorized scan
+GRID_MAX_CANDIDATE_SHARE = 0.05
+
+
+def parse_coordinates(latitude, longitude) -> Optional[Tuple[float, float]]:
+    """
+    Convert client-supplied coordinates to floats.
+
+    Returns:
+        tuple: (latitude, longitude), or None unless both are finite
+        numbers within latitude/longitude range
+    """
+    if isinstance(latitude, bool) or isinstance(longitude, bool):
+        return None
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
 
 class DriverLocationService:
     """
     Service for managing driver locations and finding nearby drivers.
-    
+
+    Drivers are bucketed into a uniform lat/lon grid so that radius
+    queries only visit the cells overlapping the search area. Positions
+    are mirrored into a columnar store so distances are computed in batch.
     """
     
-    def __init__(self):
+    def __init__(self, cell_size_deg: float = 0.01):
         self.active_drivers: Dict[int, dict] = {}
         self.connected_riders: set = set()  # Store WebSocket connections for riders
+        # Grid cell size in degrees (~1.1 km of latitude at 0.01)
+        self.cell_size_deg = cell_size_deg
+        # Maps grid cell -> driver ids currently inside it
+        self._grid: Dict[Tuple[int, int], Set[int]] = {}
+        # Maps driver id -> grid cell it is stored under
+        self._driver_cells: Dict[int, Tuple[int, int]] = {}
+        # Columnar copy of positions for vectorized distance queries
+        self.store = DriverLocationStore()
+
+    def _cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """
+        Get the grid cell containing the given coordinates.
+        """
+        return (
+            math.floor(latitude / self.cell_size_deg),
+            math.floor(longitude / self.cell_size_deg)
+        )
+
+    def _index_driver(self, driver_id: int, latitude: float, longitude: float):
+        """
+        Move a driver into the grid cell for its new position.
+        """
+        cell = self._cell_for(latitude, longitude)
+        previous = self._driver_cells.get(driver_id)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._unindex_cell(driver_id, previous)
+        self._grid.setdefault(cell, set()).add(driver_id)
+        self._driver_cells[driver_id] = cell
+
+    def _unindex_driver(self, driver_id: int):
+        """
+        Remove a driver from the grid index.
+        """
+        cell = self._driver_cells.pop(driver_id, None)
+        if cell is not None:
+            self._unindex_cell(driver_id, cell)
+
+    def _unindex_cell(self, driver_id: int, cell: Tuple[int, int]):
+        members = self._grid.get(cell)
+        if members is None:
+            return
+        members.discard(driver_id)
+        if not members:
+            del self._grid[cell]
+
+    def _search_box(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Get the grid rows and column ranges covering a search circle.
+
+        Rows are clamped at the poles. A box crossing the antimeridian is
+        split into two column ranges.
+
+        Returns:
+            tuple: ((min_row, max_row), [(min_col, max_col), ...])
+        """
+        lat_span = radius_km / KM_PER_DEGREE
+        # Widest longitude offset of a spherical cap: asin(sin(r) / cos(lat))
+        cos_lat = math.cos(math.radians(latitude))
+        sin_radius = math.sin(min(math.pi / 2, radius_km / EARTH_RADIUS_KM))
+        if cos_lat < 1e-6 or sin_radius >= cos_lat:
+            # The circle covers a pole: every longitude is in range
+            lon_span = 180.0
+        else:
+            lon_span = math.degrees(math.asin(sin_radius / cos_lat))
+
+        def index(degrees: float) -> int:
+            return math.floor(degrees / self.cell_size_deg)
+
+        rows = (index(max(-90.0, latitude - lat_span)), index(min(90.0, latitude + lat_span)))
+        west, east = longitude - lon_span, longitude + lon_span
+        if lon_span >= 180.0:
+            cols = [(index(-180.0), index(180.0))]
+        elif west < -180.0:
+            cols = [(index(west + 360.0), index(180.0)), (index(-180.0), index(east))]
+        elif east > 180.0:
+            cols = [(index(west), index(180.0)), (index(-180.0), index(east - 360.0))]
+        else:
+            cols = [(index(west), index(east))]
+        return rows, cols
+
+    @staticmethod
+    def _box_cell_count(box) -> int:
+        (min_row, max_row), cols = box
+        return (max_row - min_row + 1) * sum(max_col - min_col + 1 for min_col, max_col in cols)
+
+    def _cells_in_radius(self, latitude: float, longitude: float, radius_km: float, box=None):
+        """
+        Yield the occupied grid cells overlapping the bounding box of a search circle.
+        """
+        if box is None:
+            box = self._search_box(latitude, longitude, radius_km)
+        (min_row, max_row), cols = box
+
+        # For very wide searches it is cheaper to scan the occupied cells
+        if self._box_cell_count(box) > len(self._grid):
+            for row, col in self._grid:
+                if min_row <= row <= max_row and any(
+                        min_col <= col <= max_col for min_col, max_col in cols):
+                    yield (row, col)
+            return
+
+        for row in range(min_row, max_row + 1):
+            for min_col, max_col in cols:
+                for col in range(min_col, max_col + 1):
+                    cell = (row, col)
+                    if cell in self._grid:
+                        yield cell
+
+    def _candidate_slots(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Get the store rows of drivers in the grid cells around a search circle.
+
+        Returns:
+            Store rows, or None when scanning every driver is cheaper
+        """
+        driver_count = len(self.store)
+        box = self._search_box(latitude, longitude, radius_km)
+        if self._box_cell_count(box) > driver_count:
+            return None
+
+        cells = list(self._cells_in_radius(latitude, longitude, radius_km, box))
+        candidates = sum(len(self._grid[cell]) for cell in cells)
+        if candidates > driver_count * GRID_MAX_CANDIDATE_SHARE:
+            return None
+
+        return self.store.slots_for(
+            driver_id for cell in cells for driver_id in self._grid[cell])
     
     def update_driver_location(self, driver_id: int, latitude: float, longitude: float) -> bool:
         """
-        Update driver location in memory and database.
+        Update driver location in memory and queue it for the database.
         
         Args:
             driver_id: ID of the driver
@@ -32,56 +194,42 @@ class DriverLocationService:
         Returns:
             bool: True if update was successful
         """
+        if parse_coordinates(latitude, longitude) is None:
+            print(f"⚠️ Ignoring invalid location for driver {driver_id}: {latitude}, {longitude}")
+            return False
         try:
             # Update in-memory cache
+            now = datetime.now()
             self.active_drivers[driver_id] = {
                 "latitude": latitude,
                 "longitude": longitude,
-                "timestamp": datetime.now().isoformat(),
-                "last_seen": datetime.now()
+                "timestamp": now.isoformat(),
+                "last_seen": now
             }
+            self._index_driver(driver_id, latitude, longitude)
+            self.store.upsert(driver_id, latitude, longitude, now.timestamp())
+            
+            # Persist through the write-behind buffer
+            location_writer.enqueue(driver_id, latitude, longitude)
+
+            # Broadcast to all riders
+            for ws in self.connected_riders:
+                # Assuming ws.send_json is an async method
+                # You might need to use an async loop or similar mechanism here
+                ws.send_json({
+                    "type": "location_updated",
+                    "data": {
+                        "driver_id": driver_id,
+                        "latitude": latitude,
+                        "longitude": longitude,
+                    }
+                })
+            
+            return True
             
-            # Update database
-            with Session(bind=engine) as db:
-                # Check if driver location exists
-                existing_location = db.query(DriverLocation).filter(
-                    DriverLocation.driver_id == driver_id
-                ).first()
-                
-                if existing_location:
-                    # Update existing location
-                    existing_location.latitude = latitude
-                    existing_location.longitude = longitude
-                else:
-                    # Create new location record
-                    new_location = DriverLocation(
-                        driver_id=driver_id,
-                        latitude=latitude,
-                        longitude=longitude
-                    )
-                    db.add(new_location)
-                
-                db.commit()
-                print(f"✅ Successfully updated driver {driver_id} location: {latitude}, {longitude}")
-                
-                # Broadcast to all riders
-                for ws in self.connected_riders:
-                    # Assuming ws.send_json is an async method
-                    # You might need to use an async loop or similar mechanism here
-                    ws.send_json({
-                        "type": "location_updated",
-                        "data": {
-                            "driver_id": driver_id,
-                            "latitude": latitude,
-                            "longitude": longitude,
-                        }
-                    })
-                
-                return True
-                
         except Exception as e:
             print(f"❌ Error updating driver location: {e}")
-            # Still return True for in-memory update even if DB fails
+            # Still return True for in-memory update even if buffering fails
             return True
     
     def get_driver_location(self, driver_id: int) -> Optional[dict]:
@@ -98,24 +246,39 @@ class DriverLocationService:
     
     def get_all_active_drivers(self) -> Dict[int, dict]:
         """
-        Get all currently active drivers.
+        Get all currently active drivers. Drivers not seen within the
+        timeout are left out but stay cached until sweep_inactive() removes
+        them, so the sweep still reports them.
         
         Returns:
             dict: Dictionary of active drivers with their locations
         """
-        # Filter out drivers that haven't been seen in the last 5 minutes
-        cutoff_time = datetime.now() - timedelta(minutes=5)
-        active_drivers = {
+        cutoff_time = datetime.now() - DRIVER_TIMEOUT
+        return {
             driver_id: data for driver_id, data in self.active_drivers.items()
             if data.get("last_seen", datetime.min) > cutoff_time
         }
-        
+
+    def sweep_inactive(self) -> List[int]:
+        """
+        Remove drivers that haven't been seen in the last 5 minutes.
+
+        Returns:
+            list: IDs of the drivers that were removed
+        """
+        cutoff_time = datetime.now() - DRIVER_TIMEOUT
+        inactive_drivers = [
+            driver_id for driver_id, data in self.active_drivers.items()
+            if data.get("last_seen", datetime.min) <= cutoff_time
+        ]
+
         # Remove inactive drivers from cache
-        inactive_drivers = set(self.active_drivers.keys()) - set(active_drivers.keys())
         for driver_id in inactive_drivers:
             del self.active_drivers[driver_id]
-        
-        return active_drivers
+            self._unindex_driver(driver_id)
+            self.store.remove(driver_id)
+
+        return inactive_drivers
     
     def find_nearby_drivers(self, latitude: float, longitude: float, radius_km: float = 5.0) -> List[dict]:
         """
@@ -129,27 +292,55 @@ class DriverLocationService:
         Returns:
             list: List of nearby drivers with their details
         """
-        nearby_drivers = []
-        active_drivers = self.get_all_active_drivers()
-        
-        for driver_id, location_data in active_drivers.items():
-            distance = self._calculate_distance(
-                latitude, longitude,
-                location_data["latitude"], location_data["longitude"]
-            )
-            
-            if distance <= radius_km:
-                nearby_drivers.append({
-                    "driver_id": driver_id,
-                    "latitude": location_data["latitude"],
-                    "longitude": location_data["longitude"],
-                    "timestamp": location_data["timestamp"],
-                    "distance_km": round(distance, 2)
-                })
-        
-        # Sort by distance
-        nearby_drivers.sort(key=lambda x: x["distance_km"])
-        return nearby_drivers
+        cutoff = (datetime.now() - DRIVER_TIMEOUT).timestamp()
+
+        # Candidate rows come from the grid cells overlapping the search
+        # area; wide searches scan every driver instead
+        slots = self._candidate_slots(latitude, longitude, radius_km)
+        driver_ids, distances = self.store.within_radius(
+            latitude, longitude, radius_km, min_last_seen=cutoff, slots=slots
+        )
+
+        # Results are already sorted by distance
+        return self._to_driver_list(driver_ids, distances)
+
+    def find_nearest_drivers(
+        self,
+        latitude: float,
+        longitude: float,
+        limit: int = 10,
+        exclude: Optional[Set[int]] = None
+    ) -> List[dict]:
+        """
+        Find the closest active drivers regardless of radius.
+
+        Args:
+            latitude: Center latitude
+            longitude: Center longitude
+            limit: Maximum number of drivers to return
+            exclude: Driver ids to leave out
+
+        Returns:
+            list: Up to `limit` drivers, nearest first
+        """
+        cutoff = (datetime.now() - DRIVER_TIMEOUT).timestamp()
+        driver_ids, distances = self.store.nearest(
+            latitude, longitude, limit, min_last_seen=cutoff, exclude=exclude
+        )
+        return self._to_driver_list(driver_ids, distances)
+
+    def _to_driver_list(self, driver_ids, distances) -> List[dict]:
+        drivers = []
+        for driver_id, distance in zip(driver_ids.tolist(), distances.tolist()):
+            location_data = self.active_drivers[driver_id]
+            drivers.append({
+                "driver_id": driver_id,
+                "latitude": location_data["latitude"],
+                "longitude": location_data["longitude"],
+                "timestamp": location_data["timestamp"],
+                "distance_km": round(distance, 2)
+            })
+        return drivers
     
     def remove_driver(self, driver_id: int) -> bool:
         """
@@ -161,6 +352,8 @@ class DriverLocationService:
         Returns:
             bool: True if driver was removed
         """
+        self._unindex_driver(driver_id)
+        self.store.remove(driver_id)
         if driver_id in self.active_drivers:
             del self.active_drivers[driver_id]
             return True
@@ -174,30 +367,6 @@ class DriverLocationService:
             int: Number of active drivers
         """
         return len(self.get_all_active_drivers())
-    
-    def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """
-        Calculate distance between two coordinates using Haversine formula.
-        
-        Args:
-            lat1, lon1: First coordinate
-            lat2, lon2: Second coordinate
-            
-        Returns:
-            float: Distance in kilometers
-        """
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Radius of earth in kilometers
-        r = 6371
-        return c * r
 
 
 # Global instance
@@ -0,0 +1,188 @@
+"""
+Columnar in-memory store of driver positions with vectorized distance queries.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+
+# Radius of earth in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Calculate distances from one point to many points using the Haversine formula.
+
+    Args:
+        latitude, longitude: Origin coordinate
+        latitudes, longitudes: Arrays of target coordinates
+
+    Returns:
+        np.ndarray: Distances in kilometers
+    """
+    lat1 = np.radians(latitude)
+    lon1 = np.radians(longitude)
+    lat2 = np.radians(latitudes)
+    lon2 = np.radians(longitudes)
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class DriverLocationStore:
+    """
+    Keeps driver ids, latitudes, longitudes and last-seen times in
+    contiguous NumPy arrays so distance queries run in a single call.
+
+    Rows are packed: removing a driver moves the last row into its slot.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._size = 0
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._lats = np.zeros(initial_capacity, dtype=np.float64)
+        self._lons = np.zeros(initial_capacity, dtype=np.float64)
+        self._last_seen = np.zeros(initial_capacity, dtype=np.float64)
+        # Maps driver_id to its row in the arrays
+        self._slots: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, driver_id: int) -> bool:
+        return driver_id in self._slots
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        self._ids = np.resize(self._ids, capacity)
+        self._lats = np.resize(self._lats, capacity)
+        self._lons = np.resize(self._lons, capacity)
+        self._last_seen = np.resize(self._last_seen, capacity)
+
+    def upsert(self, driver_id: int, latitude: float, longitude: float, last_seen: float):
+        """
+        Insert or update a driver's position.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+            last_seen: POSIX timestamp of the update
+        """
+        slot = self._slots.get(driver_id)
+        if slot is None:
+            if self._size == len(self._ids):
+                self._grow()
+            slot = self._size
+            self._size += 1
+            self._slots[driver_id] = slot
+            self._ids[slot] = driver_id
+        self._lats[slot] = latitude
+        self._lons[slot] = longitude
+        self._last_seen[slot] = last_seen
+
+    def remove(self, driver_id: int) -> bool:
+        """
+        Remove a driver from the store.
+
+        Returns:
+            bool: True if the driver was present
+        """
+        slot = self._slots.pop(driver_id, None)
+        if slot is None:
+            return False
+
+        last = self._size - 1
+        if slot != last:
+            moved_id = int(self._ids[last])
+            self._ids[slot] = moved_id
+            self._lats[slot] = self._lats[last]
+            self._lons[slot] = self._lons[last]
+            self._last_seen[slot] = self._last_seen[last]
+            self._slots[moved_id] = slot
+        self._size = last
+        return True
+
+    def slots_for(self, driver_ids: Iterable[int]) -> np.ndarray:
+        """
+        Get the array rows for the given driver ids, skipping unknown ids.
+        """
+        slots = self._slots
+        return np.fromiter(
+            (slots[driver_id] for driver_id in driver_ids if driver_id in slots),
+            dtype=np.int64
+        )
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        min_last_seen: float = 0.0,
+        slots: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find drivers within a radius, sorted by distance.
+
+        Args:
+            latitude: Center latitude
+            longitude: Center longitude
+            radius_km: Search radius in kilometers
+            min_last_seen: Ignore drivers last seen at or before this timestamp
+            slots: Optional candidate rows (e.g. from a spatial index)
+
+        Returns:
+            tuple: (driver ids, distances in kilometers)
+        """
+        if slots is None:
+            slots = np.arange(self._size)
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        distances = haversine_km(latitude, longitude, self._lats[slots], self._lons[slots])
+        mask = (distances <= radius_km) & (self._last_seen[slots] > min_last_seen)
+        slots = slots[mask]
+        distances = distances[mask]
+
+        order = np.argsort(distances, kind="stable")
+        return self._ids[slots[order]], distances[order]
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        min_last_seen: float = 0.0,
+        exclude: Optional[Iterable[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest drivers using a partial sort.
+
+        Args:
+            latitude: Center latitude
+            longitude: Center longitude
+            k: Maximum number of drivers to return
+            min_last_seen: Ignore drivers last seen at or before this timestamp
+            exclude: Driver ids to leave out of the result
+
+        Returns:
+            tuple: (driver ids, distances in kilometers), nearest first
+        """
+        size = self._size
+        if size == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        distances = haversine_km(latitude, longitude, self._lats[:size], self._lons[:size])
+        valid = self._last_seen[:size] > min_last_seen
+        if exclude:
+            valid &= ~np.isin(self._ids[:size], np.fromiter(exclude, dtype=np.int64))
+        distances = np.where(valid, distances, np.inf)
+
+        k = min(k, int(valid.sum()))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return self._ids[candidates], distances[candidates]
@@ -0,0 +1,49 @@
+"""
+Pre-encoded WebSocket frames shared across recipients.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def encode_message(payload: Any) -> str:
+    """
+    Encode a payload as JSON text, using orjson when it is installed.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass
+    return json.dumps(payload)
+
+
+class Frame:
+    """
+    A message that is encoded at most once, on first use, and then shared
+    by every recipient. Frames that reach nobody are never encoded.
+    """
+    __slots__ = ("payload", "_text")
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = encode_message(self.payload)
+        return self._text
+
+
+def frame_text(message: Union[Frame, str]) -> str:
+    """
+    Get the wire text of a Frame or an already-encoded string.
+    """
+    if isinstance(message, Frame):
+        return message.text
+    return message
@@ -0,0 +1,98 @@
+"""
+Per-driver ingestion throttle for GPS updates arriving over the WebSocket.
+"""
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+# Minimum seconds between accepted updates from one driver
+LOCATION_MIN_INTERVAL = float(os.getenv("LOCATION_MIN_INTERVAL", "1.0"))
+# Minimum movement in meters for an update to be accepted
+LOCATION_MIN_DISTANCE_M = float(os.getenv("LOCATION_MIN_DISTANCE_M", "10"))
+# Accept an update after this many seconds even without movement,
+# so a parked driver still counts as active
+LOCATION_MAX_SILENCE = float(os.getenv("LOCATION_MAX_SILENCE", "30"))
+
+
+class LocationThrottle:
+    """
+    Decides whether a driver's GPS update is worth processing.
+
+    An update is accepted when it is the driver's first, when at least
+    `min_interval` seconds have passed and the driver moved at least
+    `min_distance_m` meters, or when `max_silence` seconds have passed
+    since the last accepted update.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = LOCATION_MIN_INTERVAL,
+        min_distance_m: float = LOCATION_MIN_DISTANCE_M,
+        max_silence: float = LOCATION_MAX_SILENCE
+    ):
+        self.min_interval = min_interval
+        self.min_distance_m = min_distance_m
+        self.max_silence = max_silence
+        # Maps driver_id -> (latitude, longitude, accepted_at)
+        self._last: Dict[int, Tuple[float, float, float]] = {}
+        self.stats = {"accepted": 0, "suppressed": 0}
+
+    def accept(self, driver_id: int, latitude: float, longitude: float, now: Optional[float] = None) -> bool:
+        """
+        Check an update against the thresholds and record it if accepted.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+            now: Monotonic time of the update (defaults to the current time)
+
+        Returns:
+            bool: True if the update should be processed
+        """
+        if now is None:
+            now = time.monotonic()
+
+        last = self._last.get(driver_id)
+        if last is not None:
+            last_lat, last_lon, accepted_at = last
+            elapsed = now - accepted_at
+            if elapsed < self.max_silence:
+                moved = self._distance_m(last_lat, last_lon, latitude, longitude)
+                if elapsed < self.min_interval or moved < self.min_distance_m:
+                    self.stats["suppressed"] += 1
+                    return False
+
+        self._last[driver_id] = (latitude, longitude, now)
+        self.stats["accepted"] += 1
+        return True
+
+    def forget(self, driver_id: int):
+        """
+        Drop the throttle state for a driver.
+        """
+        self._last.pop(driver_id, None)
+
+    def get_stats(self) -> dict:
+        """
+        Get accepted vs suppressed counters and the active thresholds.
+        """
+        return {
+            **self.stats,
+            "tracked_drivers": len(self._last),
+            "min_interval": self.min_interval,
+            "min_distance_m": self.min_distance_m,
+            "max_silence": self.max_silence,
+        }
+
+    @staticmethod
+    def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        # Equirectangular approximation; accurate enough at throttle distances
+        x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+        y = math.radians(lat2 - lat1)
+        return math.hypot(x, y) * 6371000.0
+
+
+# Global instance
+location_throttle = LocationThrottle()
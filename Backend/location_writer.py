@@ -0,0 +1,202 @@
+"""
+Write-behind buffer for persisting driver locations in bulk.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from geoalchemy2.functions import ST_GeomFromText
+from models import DriverLocation
+from db import is_row_error, run_db, session_scope
+
+# Seconds between flushes of the buffered locations
+LOCATION_FLUSH_INTERVAL = float(os.getenv("LOCATION_FLUSH_INTERVAL", "1.0"))
+# Flush early once this many drivers are waiting to be written
+LOCATION_FLUSH_MAX_BATCH = int(os.getenv("LOCATION_FLUSH_MAX_BATCH", "500"))
+
+
+class DriverLocationWriter:
+    """
+    Coalesces the latest position per driver and writes them to the
+    database in a single INSERT ... ON CONFLICT (driver_id) DO UPDATE.
+
+    enqueue() only touches memory; a background task flushes the buffer
+    every `flush_interval` seconds or as soon as `max_batch` drivers are
+    pending. stop() flushes whatever is left before returning.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = LOCATION_FLUSH_INTERVAL,
+        max_batch: int = LOCATION_FLUSH_MAX_BATCH
+    ):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # Maps driver_id -> (latitude, longitude); newer updates overwrite older ones
+        self._buffer: Dict[int, Tuple[float, float]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_dropped": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def enqueue(self, driver_id: int, latitude: float, longitude: float):
+        """
+        Buffer a driver location for the next flush.
+
+        Args:
+            driver_id: ID of the driver
+            latitude: Latitude coordinate
+            longitude: Longitude coordinate
+        """
+        if driver_id in self._buffer:
+            self.stats["coalesced"] += 1
+        self._buffer[driver_id] = (latitude, longitude)
+        self.stats["enqueued"] += 1
+
+        if self._wakeup and len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    def get_stats(self) -> dict:
+        """
+        Get buffer depth and flush metrics.
+        """
+        return {
+            **self.stats,
+            "buffer_depth": len(self._buffer),
+            "running": self._running,
+        }
+
+    async def start(self):
+        """
+        Start the background flush task on the running event loop.
+        """
+        if self._task:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and flush any buffered locations.
+        """
+        self._running = False
+        if self._task:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write all buffered locations to the database.
+
+        Returns:
+            int: Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+
+            batch, self._buffer = self._buffer, {}
+            started = time.perf_counter()
+            try:
+                written = await run_db(self._write_batch, batch)
+            except Exception as e:
+                print(f"❌ Error flushing driver locations: {e}")
+                self.stats["failed_flushes"] += 1
+                # Put the batch back without clobbering newer positions
+                for driver_id, position in batch.items():
+                    self._buffer.setdefault(driver_id, position)
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += written
+            self.stats["rows_dropped"] += len(batch) - written
+            self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self.stats["max_flush_ms"] = max(
+                self.stats["max_flush_ms"], round(elapsed_ms, 2))
+            return written
+
+    def _write_batch(self, batch: Dict[int, Tuple[float, float]]) -> int:
+        rows = self._to_rows(batch)
+        with session_scope() as db:
+            try:
+                db.execute(self._upsert_statement(rows))
+                db.commit()
+                return len(rows)
+            except DBAPIError as e:
+                # A bad row (e.g. a driver that no longer exists); write the
+                # rest one by one. Connection failures requeue the batch.
+                db.rollback()
+                if not is_row_error(e):
+                    raise
+
+            written = 0
+            for row in rows:
+                try:
+                    db.execute(self._upsert_statement([row]))
+                    db.commit()
+                    written += 1
+                except DBAPIError as e:
+                    db.rollback()
+                    if not is_row_error(e):
+                        raise
+                    print(f"⚠️ Dropping location for driver {row['driver_id']}: {e.orig}")
+            return written
+
+    @staticmethod
+    def _to_rows(batch: Dict[int, Tuple[float, float]]) -> List[dict]:
+        return [
+            {
+                "driver_id": driver_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "location": ST_GeomFromText(f'POINT({longitude} {latitude})', 4326),
+            }
+            for driver_id, (latitude, longitude) in batch.items()
+        ]
+
+    @staticmethod
+    def _upsert_statement(rows: List[dict]):
+        table = DriverLocation.__table__
+        statement = insert(table).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.driver_id],
+            set_={
+                "latitude": statement.excluded.latitude,
+                "longitude": statement.excluded.longitude,
+                "location": statement.excluded.location,
+            }
+        )
+
+
+# Global instance
+location_writer = DriverLocationWriter()
@@ -0,0 +1,9 @@
+-- Adds ix_driver_available (see Driver in models.py) to a driver table created before it existed.
+-- create_all does not add indexes to existing tables; run this once, e.g.
+--   psql "$DATABASE_URL" -f migrations/driver_available_index.sql
+-- Safe to re-run. CONCURRENTLY cannot run inside a transaction block.
+
+-- Built without blocking writes to the driver table
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_driver_available
+    ON driver (driver_id) INCLUDE (name)
+    WHERE is_available;
@@ -0,0 +1,20 @@
+-- Adds DriverLocation.location to a driverlocation table created before it existed.
+-- create_all does not alter existing tables; run this once, e.g.
+--   psql "$DATABASE_URL" -f migrations/driverlocation_location.sql
+-- Safe to re-run.
+BEGIN;
+
+-- Nullable first, so the statement succeeds on a populated table
+ALTER TABLE driverlocation ADD COLUMN IF NOT EXISTS location geography(POINT, 4326);
+
+UPDATE driverlocation
+SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+WHERE location IS NULL;
+
+ALTER TABLE driverlocation ALTER COLUMN location SET NOT NULL;
+
+COMMIT;
+
+-- Outside the transaction so writers are not blocked while it builds
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_driverlocation_location
+    ON driverlocation USING GIST (location);
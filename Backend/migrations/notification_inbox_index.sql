@@ -0,0 +1,8 @@
+-- Adds ix_notification_inbox (see Notification in models.py) to a notification table created before it existed.
+-- create_all does not add indexes to existing tables; run this once, e.g.
+--   psql "$DATABASE_URL" -f migrations/notification_inbox_index.sql
+-- Safe to re-run. CONCURRENTLY cannot run inside a transaction block.
+
+-- Built without blocking notification inserts
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notification_inbox
+    ON notification (recipient_id, recipient_type, status, "timestamp", notification_id);
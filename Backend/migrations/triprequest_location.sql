@@ -0,0 +1,21 @@
+-- Adds TripRequest.location to a triprequest table created before it existed.
+-- create_all does not alter existing tables; run this once, e.g.
+--   psql "$DATABASE_URL" -f migrations/triprequest_location.sql
+-- Safe to re-run.
+BEGIN;
+
+-- Stays nullable: requests created without a pickup point have no location
+ALTER TABLE triprequest ADD COLUMN IF NOT EXISTS location geography(POINT, 4326);
+
+-- Legacy rows would otherwise be missing from the distance-filtered driver feed
+UPDATE triprequest
+SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+WHERE location IS NULL
+  AND latitude BETWEEN -90 AND 90
+  AND longitude BETWEEN -180 AND 180;
+
+COMMIT;
+
+-- Outside the transaction so writers are not blocked while it builds
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_triprequest_location
+    ON triprequest USING GIST (location);
@@ -7,7 +7,7 @@ from decimal import Decimal
 from typing import Optional
 from sqlmodel import SQLModel, Field, Column, Integer, ForeignKey, Float
 from geoalchemy2 import Geography
-from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy import Index, PrimaryKeyConstraint, text
 Base = declarative_base()
 
 DRIVER_ID_FK = "driver.driver_id"
@@ -19,6 +19,16 @@ class Driver(SQLModel, table=True):
         SQLModel (_type_): _description_
         table (bool, optional): _description_. Defaults to True.
     """
+    __table_args__ = (
+        # Partial index over the few available drivers; includes the name so
+        # the rider map can be served from the index alone
+        Index(
+            "ix_driver_available", "driver_id",
+            postgresql_where=text("is_available"),
+            postgresql_include=["name"]
+        ),
+    )
+
     driver_id: Optional[int] = Field(
         default=None, primary_key=True, index=True)
     name: str
@@ -44,6 +54,18 @@ class Rider(SQLModel, table=True):
     password: str
 
 
+class UserIdentity(SQLModel, table=True):
+    """
+    UserIdentity model mapping a normalized email or mobile to the
+    driver or rider that registered it, shared by both roles.
+    """
+    # Normalized email or mobile (see user_identity.normalize_identifier)
+    identifier: str = Field(primary_key=True)
+    kind: str  # "email" or "mobile"
+    role: str  # "driver" or "rider"
+    user_id: int = Field(index=True)
+
+
 class DriverLocation(SQLModel, table=True):
     """
     DriverLocation model for storing driver location information.
@@ -67,8 +89,10 @@ class DriverLocation(SQLModel, table=True):
     longitude: float = Field(
         sa_column=Column(Float, nullable=False)
     )
-    # location: Geography = Field(sa_column=Column(
-    #     Geography(geometry_type="POINT", srid=4326), nullable=False))
+    # Kept in sync with latitude/longitude; GIST-indexed for radius/KNN queries
+    location: Geography = Field(sa_column=Column(
+        Geography(geometry_type="POINT", srid=4326, spatial_index=True),
+        nullable=False))
 
     model_config = {
         "arbitrary_types_allowed": True
@@ -119,6 +143,14 @@ class TripRequest(SQLModel, table=True):
     longitude: float
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: str = Field(default="pending")  # pending, accepted, cancelled
+    # Pickup point kept in sync with latitude/longitude; GIST-indexed for the driver feed
+    location: Optional[Geography] = Field(default=None, sa_column=Column(
+        Geography(geometry_type="POINT", srid=4326, spatial_index=True),
+        nullable=True))
+
+    model_config = {
+        "arbitrary_types_allowed": True
+    }
 
 
 class DriverResponse(SQLModel, table=True):
@@ -218,6 +250,14 @@ class Notification(SQLModel, table=True):
     """
     Notification model for storing notifications sent to riders and drivers.
     """
+    __table_args__ = (
+        # Inbox lookups: one recipient's notifications by status, newest first
+        Index(
+            "ix_notification_inbox",
+            "recipient_id", "recipient_type", "status", "timestamp", "notification_id"
+        ),
+    )
+
     notification_id: Optional[int] = Field(
         default=None, primary_key=True, index=True)
     recipient_id: int = Field(
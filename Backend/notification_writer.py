@@ -0,0 +1,256 @@
+"""
+Micro-batching writer for notifications raised on the WebSocket.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from models import Notification
+from db import is_row_error, run_db, session_scope
+
+# Seconds a batch stays open for more notifications after the first arrives
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "0.02"))
+# Flush early once this many notifications are waiting
+NOTIFICATION_MAX_BATCH = int(os.getenv("NOTIFICATION_MAX_BATCH", "200"))
+# Callers wait for room once this many notifications are queued or in flight
+NOTIFICATION_MAX_PENDING = int(os.getenv("NOTIFICATION_MAX_PENDING", "2000"))
+
+# Notification columns copied from the caller's dict
+_FIELDS = (
+    "recipient_id", "sender_id", "title", "message", "req_id",
+    "bid_amount", "original_amount", "pickup_location", "destination",
+    "driver_name", "driver_mobile", "rider_name",
+)
+
+
+class NotificationWriter:
+    """
+    Queues notifications and inserts them in micro-batches with one
+    multi-row INSERT ... RETURNING per batch.
+
+    save() resolves to the new notification_id (None if the row could
+    not be written), so callers keep the ids they used to get from a
+    per-row commit. A batch is written `flush_interval` seconds after its
+    first notification arrives, or as soon as `max_batch` are waiting.
+    At most `max_pending` notifications are queued or being written;
+    further callers wait for room. stop() writes whatever is queued.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = NOTIFICATION_FLUSH_INTERVAL,
+        max_batch: int = NOTIFICATION_MAX_BATCH,
+        max_pending: int = NOTIFICATION_MAX_PENDING
+    ):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        # Rows waiting for the next flush with the futures of their callers
+        self._buffer: List[Tuple[dict, asyncio.Future]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._has_items: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.stats = {
+            "enqueued": 0,
+            "waited_for_room": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_failed": 0,
+            "largest_batch": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    async def save(self, notification_data: dict) -> Optional[int]:
+        """
+        Queue a notification and wait until it is written.
+
+        Args:
+            notification_data: Notification fields as sent by the handlers
+
+        Returns:
+            Optional[int]: ID of the new notification, or None on failure
+        """
+        row = self._to_row(notification_data)
+        if not self._running:
+            # Not started (or shutting down): write it on its own
+            return await self._save_now(row)
+
+        if self._slots.locked():
+            self.stats["waited_for_room"] += 1
+        await self._slots.acquire()
+        if not self._running:
+            # stop() ran while we waited for room; its final flush is
+            # over (or under way), so nothing would write this row
+            self._slots.release()
+            return await self._save_now(row)
+
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((row, future))
+        self.stats["enqueued"] += 1
+        self._has_items.set()
+        if len(self._buffer) >= self.max_batch:
+            self._batch_full.set()
+        return await future
+
+    async def _save_now(self, row: dict) -> Optional[int]:
+        try:
+            ids = await run_db(self._write_batch, [row])
+        except Exception as e:
+            print(f"❌ Error saving notification: {e}")
+            return None
+        return ids[0]
+
+    def get_stats(self) -> dict:
+        """
+        Get queue depth and flush metrics.
+        """
+        return {
+            **self.stats,
+            "buffer_depth": len(self._buffer),
+            "max_batch": self.max_batch,
+            "max_pending": self.max_pending,
+            "running": self._running,
+        }
+
+    async def start(self):
+        """
+        Start the background flush task on the running event loop.
+        """
+        if self._task:
+            return
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write any queued notifications.
+        Callers still waiting for room write their rows on their own.
+        """
+        self._running = False
+        if self._task:
+            self._has_items.set()
+            self._batch_full.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            # Nobody flushes after this point; don't leave callers hanging
+            buffer, self._buffer = self._buffer, []
+            for _, future in buffer:
+                if not future.done():
+                    future.set_result(None)
+                self._slots.release()
+
+    async def _run(self):
+        while self._running:
+            await self._has_items.wait()
+            if self._running and len(self._buffer) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_items.clear()
+            self._batch_full.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write all queued notifications to the database.
+
+        Returns:
+            int: Number of rows written
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                batch = self._buffer[:self.max_batch]
+                del self._buffer[:self.max_batch]
+                written += await self._flush_batch(batch)
+            return written
+
+    async def _flush_batch(self, batch: List[Tuple[dict, asyncio.Future]]) -> int:
+        started = time.perf_counter()
+        try:
+            ids = await run_db(self._write_batch, [row for row, _ in batch])
+        except Exception as e:
+            print(f"❌ Error saving {len(batch)} notifications: {e}")
+            ids = [None] * len(batch)
+
+        for (_, future), notification_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(notification_id)
+            self._slots.release()
+
+        written = sum(1 for notification_id in ids if notification_id is not None)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += written
+        self.stats["rows_failed"] += len(batch) - written
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+        self.stats["max_flush_ms"] = max(
+            self.stats["max_flush_ms"], round(elapsed_ms, 2))
+        return written
+
+    def _write_batch(self, rows: List[dict]) -> List[Optional[int]]:
+        table = Notification.__table__
+        # Ids come back in the order of `rows`
+        statement = insert(table).returning(
+            table.c.notification_id, sort_by_parameter_order=True)
+        with session_scope() as db:
+            try:
+                ids = list(db.execute(statement, rows).scalars())
+                db.commit()
+                return ids
+            except DBAPIError as e:
+                # A bad row (usually a trip request that no longer exists);
+                # write the rest one by one. Connection failures fail the batch.
+                db.rollback()
+                if not is_row_error(e):
+                    raise
+
+            ids = []
+            for row in rows:
+                try:
+                    ids.append(db.execute(statement, [row]).scalar_one())
+                    db.commit()
+                except DBAPIError as e:
+                    db.rollback()
+                    if not is_row_error(e):
+                        raise
+                    print(f"⚠️ Dropping notification for request {row['req_id']}: {e.orig}")
+                    ids.append(None)
+            return ids
+
+    @staticmethod
+    def _to_row(notification_data: dict) -> dict:
+        row = {field: notification_data.get(field) for field in _FIELDS}
+        row.update({
+            "recipient_type": notification_data.get("recipient_type", "rider"),
+            "sender_type": notification_data.get("sender_type", "driver"),
+            "notification_type": notification_data.get("notification_type", "bid"),
+            "status": "unread",
+            # Core inserts skip the model's default_factory
+            "timestamp": datetime.utcnow(),
+        })
+        return row
+
+
+# Global instance
+notification_writer = NotificationWriter()
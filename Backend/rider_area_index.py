@@ -0,0 +1,167 @@
+"""
+Spatial index of rider areas of interest for targeted driver updates.
+"""
+from typing import Dict, Iterable, Optional, Set, Tuple
+import math
+
+from driver_location_service import parse_coordinates
+from driver_location_store import EARTH_RADIUS_KM
+
+# Length of one degree of latitude on the sphere used for distances
+KM_PER_DEGREE = math.radians(1) * EARTH_RADIUS_KM
+
+# (south, west, north, east) in degrees
+Bounds = Tuple[float, float, float, float]
+
+
+def bounds_around(latitude: float, longitude: float, radius_km: float) -> Bounds:
+    """
+    Get the bounding box of a circle around a point. The box is wide enough
+    for every point within radius_km haversine distance of the center.
+
+    Args:
+        latitude: Center latitude
+        longitude: Center longitude
+        radius_km: Radius in kilometers
+
+    Returns:
+        tuple: (south, west, north, east)
+    """
+    lat_span = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    # Widest longitude offset of a spherical cap: asin(sin(r) / cos(lat))
+    sin_radius = math.sin(min(math.pi / 2, radius_km / EARTH_RADIUS_KM))
+    if cos_lat < 1e-6 or sin_radius >= cos_lat:
+        lon_span = 180.0
+    else:
+        lon_span = math.degrees(math.asin(sin_radius / cos_lat))
+    return (
+        max(-90.0, latitude - lat_span),
+        max(-180.0, longitude - lon_span),
+        min(90.0, latitude + lat_span),
+        min(180.0, longitude + lon_span)
+    )
+
+
+def parse_bounds(south, west, north, east) -> Optional[Bounds]:
+    """
+    Convert client-supplied area bounds to floats.
+
+    Returns:
+        tuple: (south, west, north, east), or None unless all are finite,
+        within latitude/longitude range, and south <= north, west <= east
+    """
+    south_west = parse_coordinates(south, west)
+    north_east = parse_coordinates(north, east)
+    if south_west is None or north_east is None:
+        return None
+    if south_west[0] > north_east[0] or south_west[1] > north_east[1]:
+        return None
+    return (*south_west, *north_east)
+
+
+class RiderAreaIndex:
+    """
+    Maps grid cells to the riders whose area of interest overlaps them,
+    so a driver update only has to look at a single cell.
+
+    Areas spanning more than `max_cells` cells are kept in a small
+    overflow set and checked directly instead of being rasterized.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.05, max_cells: int = 400):
+        self.cell_size_deg = cell_size_deg
+        self.max_cells = max_cells
+        # Maps grid cell -> rider ids whose area overlaps it
+        self._grid: Dict[Tuple[int, int], Set[int]] = {}
+        # Maps rider id -> registered bounds
+        self._areas: Dict[int, Bounds] = {}
+        # Maps rider id -> cells it was indexed under
+        self._rider_cells: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        # Riders whose area is too large to index by cell
+        self._oversized: Set[int] = set()
+
+    def __contains__(self, rider_id: int) -> bool:
+        return rider_id in self._areas
+
+    def __len__(self) -> int:
+        return len(self._areas)
+
+    def _cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            math.floor(latitude / self.cell_size_deg),
+            math.floor(longitude / self.cell_size_deg)
+        )
+
+    def subscribe(self, rider_id: int, bounds: Bounds):
+        """
+        Register or replace a rider's area of interest.
+        Invalid bounds leave the previous area in place.
+
+        Args:
+            rider_id: ID of the rider
+            bounds: (south, west, north, east) in degrees
+
+        Raises:
+            ValueError: If the bounds are not a valid area (see parse_bounds)
+        """
+        parsed = parse_bounds(*bounds)
+        if parsed is None:
+            raise ValueError(f"Invalid area bounds: {bounds!r}")
+        south, west, north, east = parsed
+
+        min_row, min_col = self._cell_for(south, west)
+        max_row, max_col = self._cell_for(north, east)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > self.max_cells:
+            cells = None
+        else:
+            cells = tuple(
+                (row, col)
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+            )
+
+        self.unsubscribe(rider_id)
+        self._areas[rider_id] = parsed
+        if cells is None:
+            self._oversized.add(rider_id)
+            return
+        for cell in cells:
+            self._grid.setdefault(cell, set()).add(rider_id)
+        self._rider_cells[rider_id] = cells
+
+    def unsubscribe(self, rider_id: int):
+        """
+        Remove a rider's area of interest.
+        """
+        self._areas.pop(rider_id, None)
+        self._oversized.discard(rider_id)
+        for cell in self._rider_cells.pop(rider_id, ()):
+            members = self._grid.get(cell)
+            if members is None:
+                continue
+            members.discard(rider_id)
+            if not members:
+                del self._grid[cell]
+
+    def riders_for(self, latitude: float, longitude: float) -> Set[int]:
+        """
+        Get riders whose area of interest contains a point.
+        """
+        candidates: Iterable[int] = self._grid.get(self._cell_for(latitude, longitude), ())
+        riders = set()
+        for rider_id in list(candidates) + list(self._oversized):
+            south, west, north, east = self._areas[rider_id]
+            if south <= latitude <= north and west <= longitude <= east:
+                riders.add(rider_id)
+        return riders
+
+    def contains(self, rider_id: int, latitude: float, longitude: float) -> bool:
+        """
+        Check whether a point lies inside a rider's registered area.
+        """
+        bounds = self._areas.get(rider_id)
+        if bounds is None:
+            return False
+        south, west, north, east = bounds
+        return south <= latitude <= north and west <= longitude <= east
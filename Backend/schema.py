@@ -129,6 +129,7 @@ class DriverLocationResponse(BaseModel):
     driver_id: int
     name: str
     mobile: str
+    distance_km: Optional[float] = None
 
 
 class NearbyDriversRequest(BaseModel):
@@ -139,6 +140,7 @@ class NearbyDriversRequest(BaseModel):
     lat: float = Field(..., ge=-90, le=90)
     lon: float = Field(..., ge=-180, le=180)
     radius: float = Field(..., gt=0)  # radius in kilometers
+    limit: int = Field(20, gt=0, le=100)  # maximum number of drivers returned
 
 
 class Coordinates(BaseModel):
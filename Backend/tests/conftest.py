@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+# Backend modules are imported as top-level modules (see api.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def api():
+    """
+    The api module, imported without a database: api.py creates its
+    tables on import, which needs PostgreSQL/PostGIS.
+    """
+    from sqlmodel import SQLModel
+    with mock.patch.object(SQLModel.metadata, "create_all"):
+        import api
+    return api
+
+
+class ASGIWebSocket:
+    """
+    A WebSocket client that drives the ASGI app directly on the current
+    event loop, so several clients share one loop like they do in uvicorn.
+    """
+
+    def __init__(self, app, path: str, query_string: bytes = b""):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "path": path, "raw_path": path.encode(),
+            "query_string": query_string, "headers": [], "scheme": "ws",
+            "server": ("testserver", 80), "client": ("testclient", 50000),
+            "root_path": "", "subprotocols": [],
+        }
+        self._incoming = asyncio.Queue()
+        self._outgoing = asyncio.Queue()
+        self._task = None
+
+    async def connect(self):
+        await self._incoming.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(
+            self.app(self.scope, self._incoming.get, self._outgoing.put))
+        message = await self._outgoing.get()
+        assert message["type"] == "websocket.accept", message
+        return await self.receive_json()
+
+    async def send_json(self, payload):
+        await self._incoming.put({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    async def receive_json(self):
+        message = await self._outgoing.get()
+        assert message["type"] == "websocket.send", message
+        return json.loads(message["text"])
+
+    async def close(self):
+        await self._incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, timeout=5)
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def _connect_rider(manager, user_id):
+    websocket = RecordingWebSocket()
+    await manager.connect(websocket, f"rider-{user_id}", user_id, "rider")
+    return websocket
+
+
+@pytest.mark.parametrize("area", [
+    {"south": "nan", "west": 90.0, "north": 24.0, "east": 91.0},
+    {"south": 23.0, "west": 90.0, "north": 24.0},
+    {"latitude": 23.5, "longitude": "inf"},
+    {"latitude": 23.5, "longitude": 90.5, "radius_km": -1},
+    {},
+])
+def test_invalid_area_keeps_the_previous_subscription(api, area):
+    async def scenario():
+        manager = api.ConnectionManager()
+        await _connect_rider(manager, 1)
+        assert manager.update_rider_area(1, {"latitude": 23.5, "longitude": 90.5}) is not None
+
+        assert manager.update_rider_area(1, area) is None
+        assert manager.get_nearby_riders(7, 23.5, 90.5) == {1}
+        manager.disconnect("rider-1")
+
+    asyncio.run(scenario())
+
+
+def test_rider_is_told_when_a_driver_leaves_its_area(api, monkeypatch):
+    monkeypatch.setattr(api, "RIDER_TICK_INTERVAL", 0)
+
+    async def scenario():
+        manager = api.ConnectionManager()
+        delta_rider = await _connect_rider(manager, 1)
+        legacy_rider = await _connect_rider(manager, 2)
+        for user_id in (1, 2):
+            manager.update_rider_area(user_id, {"south": 23.0, "west": 90.0, "north": 24.0, "east": 91.0})
+        await manager.send_driver_snapshot(1, {})
+
+        for latitude in (23.5, 23.6, 25.0, 25.1):
+            await manager.broadcast_driver_location(api.Frame({
+                "type": "driver-location",
+                "data": {"driver_id": 7, "latitude": latitude, "longitude": 90.5}
+            }), 7, latitude, 90.5)
+            await asyncio.sleep(0.01)
+        manager.disconnect("rider-1")
+        manager.disconnect("rider-2")
+        return delta_rider.frames, legacy_rider.frames
+
+    delta_frames, legacy_frames = asyncio.run(scenario())
+
+    ops = [[op["op"] for op in frame["data"]] for frame in delta_frames[1:]]
+    assert ops == [["add"], ["move"], ["remove"]]
+    assert [frame["data"]["latitude"] for frame in legacy_frames] == [23.5, 23.6, 25.0]
@@ -0,0 +1,47 @@
+from driver_counters import DRIVER_COUNT_RECONCILE_ATTEMPTS, DriverCounters
+
+
+def _counters_reading(reads):
+    counters = DriverCounters()
+    results = iter(reads)
+
+    def read_counts():
+        update, counts = next(results)
+        if update:
+            # A driver changes availability while the recount is read
+            counters.set_available(*update)
+        return counts
+
+    counters._read_counts = read_counts
+    return counters
+
+
+def test_reconcile_replaces_counts_when_nothing_changed_meanwhile():
+    counters = _counters_reading([(None, ({1, 2}, 5))])
+
+    assert counters.reconcile() == 7
+    assert counters.snapshot() == {
+        "available_count": 2, "unavailable_count": 3, "total_count": 5}
+
+
+def test_reconcile_rereads_after_a_concurrent_update():
+    counters = _counters_reading([
+        ((3, True), ({1, 2}, 5)),
+        (None, ({1, 2, 3}, 5)),
+    ])
+
+    counters.reconcile()
+    assert counters.snapshot()["available_count"] == 3
+    assert counters.stats["reconciles"] == 1
+
+
+def test_reconcile_keeps_live_updates_when_every_read_races():
+    counters = _counters_reading([
+        ((driver_id, True), (set(), 0))
+        for driver_id in range(DRIVER_COUNT_RECONCILE_ATTEMPTS)
+    ])
+
+    assert counters.reconcile() == 0
+    assert counters.snapshot()["available_count"] == DRIVER_COUNT_RECONCILE_ATTEMPTS
+    assert counters.stats["reconciles_skipped"] == 1
+    assert not counters.loaded
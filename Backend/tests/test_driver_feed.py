@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+from driver_feed import DriverFeed
+
+AREA = {"south": 23.0, "west": 90.0, "north": 24.0, "east": 91.0}
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+def test_snapshot_comes_before_deltas_with_consecutive_seqs():
+    feed = DriverFeed()
+    add = feed.encode_op({"op": "add", "id": 7, "latitude": 23.5, "longitude": 90.5})
+    move = feed.encode_op({"op": "move", "id": 7, "latitude": 23.6, "longitude": 90.5})
+
+    frames = [
+        json.loads(feed.snapshot_text(1, [])),
+        json.loads(feed.delta_text(1, [add])),
+        json.loads(feed.delta_text(1, [move, move])),
+    ]
+
+    assert [frame["type"] for frame in frames] == ["drivers-snapshot", "drivers-delta", "drivers-delta"]
+    assert [frame["seq"] for frame in frames] == [1, 2, 3]
+    assert frames[2]["data"] == [json.loads(move), json.loads(move)]
+
+
+def test_riders_have_independent_seqs():
+    feed = DriverFeed()
+    feed.snapshot_text(1, [])
+    feed.delta_text(1, [])
+    feed.snapshot_text(2, [])
+
+    assert feed.sequences == {1: 2, 2: 1}
+
+
+def test_resync_snapshot_continues_the_sequence():
+    feed = DriverFeed()
+    feed.snapshot_text(1, [])
+    feed.delta_text(1, [])
+
+    snapshot = json.loads(feed.snapshot_text(1, [{"id": 7}]))
+    delta = json.loads(feed.delta_text(1, []))
+
+    assert (snapshot["seq"], delta["seq"]) == (3, 4)
+    assert snapshot["data"] == [{"id": 7}]
+
+
+def test_unsubscribed_rider_starts_over():
+    feed = DriverFeed()
+    feed.snapshot_text(1, [])
+    feed.unsubscribe(1)
+
+    assert 1 not in feed
+    assert json.loads(feed.snapshot_text(1, []))["seq"] == 1
+
+
+def test_rider_recovers_from_a_gap_with_a_resync(api, monkeypatch):
+    monkeypatch.setattr(api, "RIDER_TICK_INTERVAL", 0)
+
+    async def move(manager, driver_id, latitude):
+        await manager.broadcast_driver_location(api.Frame({
+            "type": "driver-location",
+            "data": {"driver_id": driver_id, "latitude": latitude, "longitude": 90.5}
+        }), driver_id, latitude, 90.5)
+        await asyncio.sleep(0.01)
+
+    async def scenario():
+        manager = api.ConnectionManager()
+        rider = RecordingWebSocket()
+        await manager.connect(rider, "rider-1", 1, "rider")
+        manager.update_rider_area(1, AREA)
+        await manager.send_driver_snapshot(1, {})
+
+        await move(manager, 7, 23.5)
+        await move(manager, 8, 23.7)
+        await move(manager, 7, 23.6)
+        # The rider missed the last delta and asks for a snapshot
+        lost = rider.frames.pop()
+        await manager.send_driver_snapshot(1, manager.get_all_driver_locations())
+        await move(manager, 8, 23.8)
+        manager.disconnect("rider-1")
+        return lost, rider.frames
+
+    lost, frames = asyncio.run(scenario())
+
+    assert [(frame["type"], frame["seq"]) for frame in frames] == [
+        ("drivers-snapshot", 1),
+        ("drivers-delta", 2),
+        ("drivers-delta", 3),
+        ("drivers-snapshot", 5),
+        ("drivers-delta", 6),
+    ]
+    assert lost["seq"] == 4
+    # The resync snapshot holds the position the rider missed
+    snapshot = {driver["id"]: driver["latitude"] for driver in frames[3]["data"]}
+    assert snapshot == {7: 23.6, 8: 23.7}
+    assert [(op["op"], op["id"], op["latitude"]) for op in frames[4]["data"]] == [("move", 8, 23.8)]
@@ -0,0 +1,81 @@
+import math
+from datetime import datetime
+
+import pytest
+
+from driver_location_service import DRIVER_TIMEOUT, DriverLocationService
+
+
+def _destination(latitude, longitude, distance_km, bearing_deg):
+    # Point reached by travelling distance_km along a great circle
+    r = distance_km / 6371.0
+    lat1, lon1, bearing = map(math.radians, (latitude, longitude, bearing_deg))
+    lat2 = math.asin(math.sin(lat1) * math.cos(r) +
+                     math.cos(lat1) * math.sin(r) * math.cos(bearing))
+    lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(r) * math.cos(lat1),
+                             math.cos(r) - math.sin(lat1) * math.sin(lat2))
+    return math.degrees(lat2), math.degrees(lon2)
+
+
+@pytest.mark.parametrize("bearing", [0, 90, 180, 270])
+def test_driver_just_inside_radius_is_found(bearing):
+    for step in range(200):
+        latitude = 23.0 + step * 0.001037
+        service = DriverLocationService()
+        service.update_driver_location(
+            1, *_destination(latitude, 90.0, 29.98, bearing))
+        assert service.find_nearby_drivers(latitude, 90.0, 30), (latitude, bearing)
+
+
+def test_reading_active_drivers_leaves_stale_ones_for_the_sweep():
+    service = DriverLocationService()
+    service.update_driver_location(1, 23.8, 90.4)
+    service.update_driver_location(2, 23.9, 90.5)
+    service.active_drivers[1]["last_seen"] = datetime.now() - DRIVER_TIMEOUT
+
+    assert list(service.get_all_active_drivers()) == [2]
+    assert service.get_driver_count() == 1
+    assert service.sweep_inactive() == [1]
+    assert list(service.active_drivers) == [2]
+
+
+@pytest.mark.parametrize("center, driver", [
+    ((10.0, -179.99), (10.0, 179.99)),
+    ((10.0, 179.99), (10.0, -179.99)),
+    ((10.0, 180.0), (10.0, -179.99)),
+    # Across the pole
+    ((89.99, 0.0), (89.99, 180.0)),
+    ((-89.99, 90.0), (-89.99, -90.0)),
+])
+def test_search_wraps_the_antimeridian_and_the_poles(center, driver):
+    service = DriverLocationService()
+    # Enough drivers elsewhere that the search goes through the grid
+    for driver_id in range(2, 200):
+        service.update_driver_location(driver_id, 23.8, 90.4)
+    service.update_driver_location(1, *driver)
+
+    assert [d["driver_id"] for d in service.find_nearby_drivers(*center, 5)] == [1]
+
+
+def test_wide_search_scans_instead_of_using_the_grid(monkeypatch):
+    service = DriverLocationService()
+    for driver_id in range(20):
+        service.update_driver_location(driver_id, 23.8 + driver_id * 0.01, 90.4)
+
+    def fail(driver_ids):
+        raise AssertionError("grid used")
+    monkeypatch.setattr(service.store, "slots_for", fail)
+
+    assert len(service.find_nearby_drivers(23.8, 90.4, 30)) == 20
+
+
+def test_grid_cells_near_the_pole_are_clamped_and_wrapped():
+    service = DriverLocationService()
+    service.update_driver_location(1, 89.999, 180.0)
+    service.update_driver_location(2, 89.999, -179.0)
+
+    (min_row, max_row), cols = service._search_box(89.99, 0.0, 5)
+
+    assert max_row == service._cell_for(90.0, 0.0)[0]
+    assert cols == [(service._cell_for(0.0, -180.0)[1], service._cell_for(0.0, 180.0)[1])]
+    assert set(service._cells_in_radius(89.99, 0.0, 5)) == set(service._grid)
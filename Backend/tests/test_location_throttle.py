@@ -0,0 +1,68 @@
+from location_throttle import LocationThrottle
+
+# About 11 m and 5.5 m of latitude
+STEP_11_M = 0.0001
+STEP_5_M = 0.00005
+
+
+def _throttle():
+    return LocationThrottle(min_interval=1.0, min_distance_m=10, max_silence=30)
+
+
+def test_first_update_is_always_accepted():
+    throttle = _throttle()
+
+    assert throttle.accept(1, 23.8, 90.4, now=0.0)
+    assert throttle.get_stats()["tracked_drivers"] == 1
+
+
+def test_small_movement_is_suppressed():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+
+    assert not throttle.accept(1, 23.8 + STEP_5_M, 90.4, now=5.0)
+    assert throttle.accept(1, 23.8 + STEP_11_M, 90.4, now=6.0)
+    assert throttle.stats == {"accepted": 2, "suppressed": 1}
+
+
+def test_suppressed_updates_are_measured_from_the_last_accepted_one():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+
+    # Two small steps add up to enough movement
+    assert not throttle.accept(1, 23.8 + STEP_5_M, 90.4, now=2.0)
+    assert throttle.accept(1, 23.8 + 2 * STEP_5_M + STEP_5_M / 10, 90.4, now=4.0)
+
+
+def test_updates_closer_than_the_interval_are_suppressed():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+
+    assert not throttle.accept(1, 23.9, 90.4, now=0.5)
+    assert throttle.accept(1, 23.9, 90.4, now=1.0)
+
+
+def test_stationary_driver_is_accepted_after_max_silence():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+
+    assert not throttle.accept(1, 23.8, 90.4, now=29.9)
+    assert throttle.accept(1, 23.8, 90.4, now=30.0)
+    assert not throttle.accept(1, 23.8, 90.4, now=31.0)
+
+
+def test_drivers_are_throttled_independently():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+
+    assert throttle.accept(2, 23.8, 90.4, now=0.1)
+    assert not throttle.accept(1, 23.8, 90.4, now=0.2)
+    assert not throttle.accept(2, 23.8, 90.4, now=0.3)
+
+
+def test_forgotten_driver_starts_over():
+    throttle = _throttle()
+    throttle.accept(1, 23.8, 90.4, now=0.0)
+    throttle.forget(1)
+
+    assert throttle.accept(1, 23.8, 90.4, now=0.1)
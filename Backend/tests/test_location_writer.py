@@ -0,0 +1,79 @@
+import asyncio
+import math
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+import location_writer as location_writer_module
+from driver_location_service import parse_coordinates
+from location_writer import DriverLocationWriter
+
+
+class FakeSession:
+    """Records upserted driver ids; rows listed in `bad` fail like PostgreSQL would."""
+
+    def __init__(self, bad=(), down=False):
+        self.bad = set(bad)
+        self.down = down
+        self.written = []
+        self._pending = []
+
+    def execute(self, statement):
+        if self.down:
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        ids = [row["driver_id"] for row in statement._multi_values[0]]
+        if self.bad & set(ids):
+            raise DataError("INSERT", {}, Exception("invalid input syntax"))
+        self._pending.extend(ids)
+
+    def commit(self):
+        self.written.extend(self._pending)
+        self._pending = []
+
+    def rollback(self):
+        self._pending = []
+
+
+def _use_session(monkeypatch, session):
+    @contextmanager
+    def scope():
+        yield session
+    monkeypatch.setattr(location_writer_module, "session_scope", scope)
+
+
+def test_bad_row_is_dropped_and_the_rest_written(monkeypatch):
+    session = FakeSession(bad={2})
+    _use_session(monkeypatch, session)
+    writer = DriverLocationWriter()
+    for driver_id in (1, 2, 3):
+        writer.enqueue(driver_id, 23.8, 90.4)
+
+    written = asyncio.run(writer.flush())
+
+    assert written == 2
+    assert sorted(session.written) == [1, 3]
+    assert writer.get_stats()["buffer_depth"] == 0
+    assert writer.stats["rows_dropped"] == 1
+
+
+def test_connection_failure_requeues_the_batch(monkeypatch):
+    _use_session(monkeypatch, FakeSession(down=True))
+    writer = DriverLocationWriter()
+    writer.enqueue(1, 23.8, 90.4)
+
+    assert asyncio.run(writer.flush()) == 0
+    assert writer.get_stats()["buffer_depth"] == 1
+    assert writer.stats["failed_flushes"] == 1
+
+
+@pytest.mark.parametrize("latitude, longitude", [
+    (math.nan, 90.4), (23.8, math.inf), (None, 90.4), (91.0, 90.4),
+    (23.8, -180.5), ("north", 90.4), (True, 90.4),
+])
+def test_invalid_coordinates_are_rejected(latitude, longitude):
+    assert parse_coordinates(latitude, longitude) is None
+
+
+def test_valid_coordinates_are_converted():
+    assert parse_coordinates("23.8", 0) == (23.8, 0.0)
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+from schema import TokenData
+
+
+async def _put_status(api, body):
+    async def no_session():
+        # Invalid bodies are rejected before the database is touched
+        yield None
+
+    api.app.dependency_overrides[api.get_async_session] = no_session
+    api.app.dependency_overrides[api.get_current_user_flexible] = lambda: TokenData(
+        sub="2", email="r@example.com", mobile="0170", role="rider", name="Rider")
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.put("/notifications/status", json=body)
+    finally:
+        api.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("body", [
+    {"status": "unread", "up_to_cursor": "2024-01-01T00:00:00:5"},
+    {"status": "read", "notification_ids": 5},
+    {"status": "read", "notification_ids": "5"},
+    {"status": "read", "notification_ids": [1, "two"]},
+    {"status": "read", "notification_ids": [1, None]},
+    {"status": "read", "notification_ids": [1, 2.5]},
+    {"status": "read", "notification_ids": [True]},
+    {"status": "read", "up_to_cursor": 5},
+])
+def test_invalid_bulk_status_update_is_rejected(api, body):
+    response = asyncio.run(_put_status(api, body))
+
+    assert response.status_code == 400, response.text
+
+
+class RecordingSession:
+    """Captures the inbox query and returns no rows."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+async def _get_notifications(api, params):
+    session = RecordingSession()
+
+    async def recording_session():
+        yield session
+
+    api.app.dependency_overrides[api.get_async_session] = recording_session
+    api.app.dependency_overrides[api.get_current_user_flexible] = lambda: TokenData(
+        sub="2", email="r@example.com", mobile="0170", role="rider", name="Rider")
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/notifications", params=params)
+    finally:
+        api.app.dependency_overrides.clear()
+    return response, session.statements
+
+
+@pytest.mark.parametrize("params", [
+    {"since": "2024-01-01T06:00:00+06:00"},
+    {"since": "2024-01-01T00:00:00Z"},
+    {"cursor": "2024-01-01T00:00:00Z:5"},
+])
+def test_times_with_an_offset_are_compared_as_naive_utc(api, params):
+    response, statements = asyncio.run(_get_notifications(api, params))
+
+    assert response.status_code == 200, response.text
+    times = [value for value in statements[0].compile().params.values() if isinstance(value, datetime)]
+    assert times == [datetime(2024, 1, 1)]
@@ -0,0 +1,82 @@
+import asyncio
+from contextlib import contextmanager
+from itertools import count
+
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+import notification_writer as notification_writer_module
+from notification_writer import NotificationWriter
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return iter(self.ids)
+
+    def scalar_one(self):
+        (notification_id,) = self.ids
+        return notification_id
+
+
+class FakeSession:
+    """Inserts notifications; rows for requests in `bad` fail like PostgreSQL would."""
+
+    def __init__(self, bad=(), down=False):
+        self.bad = set(bad)
+        self.down = down
+        self._ids = count(100)
+
+    def execute(self, statement, rows):
+        if self.down:
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        if self.bad & {row["req_id"] for row in rows}:
+            raise DataError("INSERT", {}, Exception("value too long"))
+        return FakeResult([next(self._ids) for _ in rows])
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _write(monkeypatch, session, req_ids):
+    @contextmanager
+    def scope():
+        yield session
+    monkeypatch.setattr(notification_writer_module, "session_scope", scope)
+    rows = [NotificationWriter._to_row({"req_id": req_id}) for req_id in req_ids]
+    return NotificationWriter()._write_batch(rows)
+
+
+def test_bad_row_is_dropped_and_the_rest_written(monkeypatch):
+    ids = _write(monkeypatch, FakeSession(bad={2}), [1, 2, 3])
+
+    assert ids[1] is None
+    assert None not in (ids[0], ids[2])
+
+
+def test_connection_failure_fails_the_batch(monkeypatch):
+    with pytest.raises(OperationalError):
+        _write(monkeypatch, FakeSession(down=True), [1, 2, 3])
+
+
+def test_caller_waiting_for_room_is_written_after_stop(monkeypatch):
+    ids = count(1)
+    monkeypatch.setattr(NotificationWriter, "_write_batch",
+                        lambda self, rows: [next(ids) for _ in rows])
+
+    async def scenario():
+        writer = NotificationWriter(flush_interval=60, max_pending=1)
+        await writer.start()
+        saves = [asyncio.create_task(writer.save({"req_id": req_id})) for req_id in range(3)]
+        await asyncio.sleep(0.01)
+        assert writer.stats["waited_for_room"] == 2
+
+        await writer.stop()
+        return await asyncio.wait_for(asyncio.gather(*saves), timeout=2)
+
+    assert sorted(asyncio.run(scenario())) == [1, 2, 3]
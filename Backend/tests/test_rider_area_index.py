@@ -0,0 +1,33 @@
+import math
+
+import pytest
+
+from rider_area_index import RiderAreaIndex, bounds_around
+from test_driver_location_service import _destination
+
+
+@pytest.mark.parametrize("latitude", [0.0, 23.8, 60.0, 80.0])
+def test_bounds_contain_the_whole_circle(latitude):
+    south, west, north, east = bounds_around(latitude, 90.0, 50)
+    for bearing in range(0, 360, 5):
+        point_lat, point_lon = _destination(latitude, 90.0, 49.99, bearing)
+        assert south <= point_lat <= north, bearing
+        assert west <= point_lon <= east, bearing
+
+
+@pytest.mark.parametrize("bounds", [
+    (math.nan, 90.0, 24.0, 91.0),
+    (23.0, 90.0, math.inf, 91.0),
+    (23.0, 90.0, 95.0, 91.0),
+    (24.0, 90.0, 23.0, 91.0),
+    (23.0, None, 24.0, 91.0),
+])
+def test_invalid_area_is_rejected_and_previous_area_kept(bounds):
+    index = RiderAreaIndex()
+    index.subscribe(1, (23.0, 90.0, 24.0, 91.0))
+
+    with pytest.raises(ValueError):
+        index.subscribe(1, bounds)
+
+    assert index.riders_for(23.5, 90.5) == {1}
+    assert index.contains(1, 23.5, 90.5)
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import authservice
+from security import create_access_token
+from token_cache import TokenCache
+
+NOW = 1_700_000_000.0
+
+
+def test_revoked_token_is_rejected_while_cached(monkeypatch):
+    monkeypatch.setattr(authservice, "token_cache", TokenCache())
+    token = create_access_token(
+        {"sub": "1", "email": "r@gmail.com", "mobile": "01712345678", "name": "R", "role": "rider"},
+        expires_delta=timedelta(minutes=5))
+    assert authservice.resolve_token(token).sub == "1"
+    assert authservice.token_cache.get(token) is not None
+
+    authservice.revoke_token(token)
+
+    with pytest.raises(HTTPException) as raised:
+        authservice.resolve_token(token)
+    assert raised.value.status_code == 401
+
+
+def test_revoked_token_is_not_cached_again():
+    cache = TokenCache()
+    cache.put("token", "claims", exp=NOW + 60, now=NOW)
+    cache.revoke("token", exp=NOW + 60, now=NOW)
+
+    cache.put("token", "claims", exp=NOW + 60, now=NOW + 1)
+
+    assert cache.get("token", now=NOW + 1) is None
+    assert cache.is_revoked("token", now=NOW + 1)
+    # Forgotten once the token would have expired anyway
+    assert not cache.is_revoked("token", now=NOW + 61)
+
+
+def test_expired_token_is_evicted_not_served():
+    cache = TokenCache(ttl=300)
+    cache.put("token", "claims", exp=NOW + 10, now=NOW)
+    assert cache.get("token", now=NOW + 9) == "claims"
+
+    assert cache.get("token", now=NOW + 10) is None
+    assert cache.get_stats()["size"] == 0
+    assert cache.stats["expired"] == 1
+
+
+def test_entry_is_reverified_after_ttl_even_before_exp():
+    cache = TokenCache(ttl=30)
+    cache.put("token", "claims", exp=NOW + 3600, now=NOW)
+
+    assert cache.get("token", now=NOW + 31) is None
+
+
+def test_already_expired_token_is_not_cached():
+    cache = TokenCache()
+    cache.put("token", "claims", exp=NOW - 1, now=NOW)
+
+    assert cache.get_stats()["size"] == 0
+
+
+def test_cache_stays_bounded_under_churn():
+    cache = TokenCache(max_size=100)
+    cache.put("hot", "claims", exp=NOW + 60, now=NOW)
+    for i in range(10_000):
+        cache.put(f"token-{i}", i, exp=NOW + 60, now=NOW)
+        # A token in use stays cached while others churn through
+        assert cache.get("hot", now=NOW) == "claims"
+
+    assert cache.get_stats()["size"] == 100
+    assert cache.get("token-9999", now=NOW) == 9999
+    assert cache.get("token-0", now=NOW) is None
+
+
+def test_revocations_of_expired_tokens_are_pruned():
+    cache = TokenCache()
+    for i in range(1000):
+        cache.revoke(f"token-{i}", exp=NOW + i, now=NOW + i)
+
+    assert cache.get_stats()["revoked_tokens"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import trip_dispatcher as dispatcher_module
+from driver_location_service import DriverLocationService
+from trip_dispatcher import TripDispatcher
+
+PICKUP = (23.8, 90.4)
+
+
+@pytest.fixture
+def drivers(monkeypatch):
+    """
+    Drivers 1..4, each further from the pickup point than the last,
+    all available and unengaged.
+    """
+    service = DriverLocationService()
+    for driver_id in range(1, 5):
+        service.update_driver_location(driver_id, PICKUP[0] + driver_id * 0.01, PICKUP[1])
+    monkeypatch.setattr(dispatcher_module, "driver_location_service", service)
+    monkeypatch.setattr(dispatcher_module, "_filter_dispatchable", set)
+    return service
+
+
+def _run(dispatcher, connected, scenario):
+    rings = []
+
+    async def send(message, driver_ids):
+        rings.append(set(driver_ids))
+
+    async def main():
+        dispatcher.dispatch(1, *PICKUP, "trip", send, connected)
+        task = dispatcher._active[1].task
+        await scenario(rings)
+        await asyncio.wait_for(task, timeout=2)
+
+    asyncio.run(main())
+    return rings
+
+
+async def _until(predicate):
+    while not predicate():
+        await asyncio.sleep(0.001)
+
+
+def test_decline_moves_to_the_next_ring_without_waiting(drivers):
+    dispatcher = TripDispatcher(batch_size=1, ring_timeout=5, max_rounds=2)
+
+    async def scenario(rings):
+        await asyncio.wait_for(_until(lambda: len(rings) == 1), timeout=1)
+        dispatcher.declined(1, 1)
+        await asyncio.wait_for(_until(lambda: len(rings) == 2), timeout=1)
+        dispatcher.close(1)
+
+    rings = _run(dispatcher, {1, 2, 3, 4}, scenario)
+
+    assert rings == [{1}, {2, 3}]
+    assert dispatcher.stats["answered"] == 1
+
+
+def test_timeout_moves_to_the_next_ring(drivers):
+    dispatcher = TripDispatcher(batch_size=1, ring_timeout=0.01, max_rounds=2)
+
+    async def scenario(rings):
+        pass
+
+    rings = _run(dispatcher, {1, 2, 3, 4}, scenario)
+
+    assert rings == [{1}, {2, 3}]
+    assert dispatcher.stats["exhausted"] == 1
+
+
+def test_ring_skips_disconnected_drivers(drivers):
+    dispatcher = TripDispatcher(batch_size=1, ring_timeout=0.01, max_rounds=2)
+
+    async def scenario(rings):
+        pass
+
+    rings = _run(dispatcher, {2, 4}, scenario)
+
+    assert rings == [{2}, {4}]
+
+
+def test_dispatch_ends_when_no_drivers_remain(drivers):
+    dispatcher = TripDispatcher(batch_size=2, ring_timeout=0.01, max_rounds=4)
+
+    async def scenario(rings):
+        pass
+
+    rings = _run(dispatcher, {1, 2, 3}, scenario)
+
+    assert rings == [{1, 2}, {3}]
+    assert dispatcher.stats["rounds"] == 4
+    assert dispatcher.stats["exhausted"] == 1
+    assert dispatcher.get_stats()["active"] == 0
+
+
+def test_nobody_connected_rings_nobody(drivers):
+    dispatcher = TripDispatcher(batch_size=1, ring_timeout=0.01, max_rounds=2)
+
+    async def scenario(rings):
+        pass
+
+    rings = _run(dispatcher, set(), scenario)
+
+    assert rings == []
+    assert dispatcher.stats["exhausted"] == 1
@@ -0,0 +1,124 @@
+import asyncio
+import math
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from schema import TokenData
+
+pytest.importorskip("aiosqlite")
+
+# Geography columns cannot be created on SQLite; these tables keep the
+# columns the feed reads and store points as "POINT(lon lat)" text
+SCHEMA = (
+    "CREATE TABLE rider (rider_id INTEGER PRIMARY KEY, name TEXT, mobile TEXT, email TEXT, password TEXT)",
+    "CREATE TABLE driverlocation (driver_id INTEGER PRIMARY KEY, latitude FLOAT, longitude FLOAT, location TEXT)",
+    "CREATE TABLE triprequest (req_id INTEGER PRIMARY KEY, rider_id INTEGER, pickup_location TEXT,"
+    " destination TEXT, fare FLOAT, latitude FLOAT, longitude FLOAT, timestamp DATETIME,"
+    " status TEXT, location TEXT)",
+    "CREATE TABLE driverresponse (response_id INTEGER PRIMARY KEY, req_id INTEGER, driver_id INTEGER,"
+    " driver_name TEXT, driver_mobile TEXT, amount FLOAT, rating FLOAT, vehicle TEXT, eta TEXT)",
+)
+
+RIDER_ID = 1
+DRIVER_ID = 7
+
+
+def _point(wkt):
+    lon, lat = wkt.split("(", 1)[1].rstrip(")").split()
+    return float(lat), float(lon)
+
+
+def _distance_m(a, b):
+    (lat1, lon1), (lat2, lon2) = _point(a), _point(b)
+    h = (math.sin(math.radians(lat2 - lat1) / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371008.8 * math.asin(math.sqrt(h))
+
+
+def _register_geo_functions(dbapi_connection, _):
+    dbapi_connection.create_function(
+        "ST_GeogFromText", 1, lambda ewkt: ewkt.split(";", 1)[-1])
+    dbapi_connection.create_function("ST_Distance", 2, _distance_m)
+    dbapi_connection.create_function(
+        "ST_DWithin", 3, lambda a, b, meters: _distance_m(a, b) <= meters)
+
+
+async def _count_feed_statements(api, role, user_id, pending, **params):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    event.listen(engine.sync_engine, "connect", _register_geo_functions)
+    async with engine.begin() as conn:
+        for ddl in SCHEMA:
+            await conn.execute(text(ddl))
+        await conn.execute(text(
+            "INSERT INTO rider VALUES (:id, 'Rider', '0170', 'r@example.com', 'x')"), {"id": RIDER_ID})
+        await conn.execute(text(
+            "INSERT INTO triprequest VALUES (:id, :rider, 'A', 'B', 300, 23.8, 90.4, :ts, 'pending',"
+            " 'POINT(90.4 23.8)')"),
+            [{"id": i, "rider": RIDER_ID, "ts": datetime(2024, 1, 1)} for i in range(1, pending + 1)])
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda *args: statements.append(args[2]))
+
+    async def session_override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    api.app.dependency_overrides[api.get_async_session] = session_override
+    api.app.dependency_overrides[api.get_current_user_flexible] = lambda: TokenData(
+        sub=str(user_id), email="u@example.com", mobile="0170", role=role, name="User")
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/trip-requests", params=params)
+    finally:
+        api.app.dependency_overrides.clear()
+        await engine.dispose()
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["requests"]) == min(pending, params.get("limit", pending))
+    assert all(r["rider_name"] == "Rider" for r in body["requests"])
+    return len(statements)
+
+
+@pytest.mark.parametrize("role, user_id, params, expected", [
+    ("rider", RIDER_ID, {}, 1),
+    # No known position: the stored-location lookup, then the newest-first feed
+    ("driver", DRIVER_ID, {"limit": 100}, 2),
+    ("driver", DRIVER_ID, {"latitude": 23.81, "longitude": 90.41, "limit": 100}, 1),
+])
+def test_trip_request_feed_statement_count_is_constant(api, role, user_id, params, expected):
+    one = asyncio.run(_count_feed_statements(api, role, user_id, 1, **params))
+    many = asyncio.run(_count_feed_statements(api, role, user_id, 50, **params))
+
+    assert one == many == expected
+
+
+@pytest.mark.parametrize("latitude, longitude", [
+    ("nan", "90.4"), ("23.8", "inf"), ("91", "90.4"), ("23.8", "-181"),
+])
+def test_feed_rejects_invalid_position(api, latitude, longitude):
+    async def request():
+        async def no_session():
+            # Rejected before the database is touched
+            yield None
+
+        api.app.dependency_overrides[api.get_async_session] = no_session
+        api.app.dependency_overrides[api.get_current_user_flexible] = lambda: TokenData(
+            sub=str(DRIVER_ID), email="d@example.com", mobile="0170", role="driver", name="Driver")
+        try:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get("/trip-requests", params={
+                    "latitude": latitude, "longitude": longitude})
+        finally:
+            api.app.dependency_overrides.clear()
+
+    assert asyncio.run(request()).status_code == 400
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import user_identity
+from models import Driver, Rider, UserIdentity
+from user_identity import (
+    backfill_user_identities, find_user_by_identifier, identity_rows,
+    normalize_identifier, normalize_mobile,
+)
+
+pytest.importorskip("aiosqlite")
+
+TABLES = [Driver.__table__, Rider.__table__, UserIdentity.__table__]
+
+
+@pytest.mark.parametrize("mobile", [
+    "+8801712345678", "01712345678", "008801712345678", "8801712345678",
+    "+880 1712-345678", "(017) 1234 5678",
+])
+def test_mobile_forms_share_one_canonical_key(mobile):
+    assert normalize_mobile(mobile) == "+8801712345678"
+
+
+@pytest.mark.parametrize("identifier", ["", "abc", "+", "--", "n/a"])
+def test_identifier_without_digits_is_rejected(identifier):
+    assert normalize_mobile(identifier) is None
+    assert normalize_identifier(identifier) is None
+
+
+def test_email_is_trimmed_and_lower_cased():
+    assert normalize_identifier("  Rider@Gmail.com ") == "rider@gmail.com"
+
+
+def _rider(rider_id, email, mobile):
+    return Rider(rider_id=rider_id, name=f"Rider {rider_id}", email=email,
+                 mobile=mobile, password="x")
+
+
+async def _login_lookups(users, indexed, identifiers):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all, tables=TABLES)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add_all(users)
+        for user in users:
+            if user.rider_id in indexed:
+                session.add_all(identity_rows("rider", user.rider_id, user.email, user.mobile))
+        await session.commit()
+
+        found = []
+        for identifier in identifiers:
+            user = await find_user_by_identifier(session, identifier, "rider")
+            found.append(user.rider_id if user else None)
+        identities = (await session.execute(
+            select(UserIdentity.identifier, UserIdentity.user_id))).all()
+    await engine.dispose()
+    return found, dict(identities)
+
+
+def test_login_accepts_any_form_of_an_indexed_mobile():
+    found, _ = asyncio.run(_login_lookups(
+        [_rider(1, "one@gmail.com", "01712345678")], {1},
+        ["+8801712345678", "01712-345678", "ONE@gmail.com", "01812345678"]))
+
+    assert found == [1, 1, 1, None]
+
+
+def test_garbage_identifier_matches_nobody():
+    found, _ = asyncio.run(_login_lookups(
+        [_rider(1, "one@gmail.com", "n/a")], set(), ["xyz", "--", "n/a"]))
+
+    assert found == [None, None, None]
+
+
+def test_user_missing_from_the_index_logs_in_and_is_indexed():
+    found, identities = asyncio.run(_login_lookups(
+        [_rider(1, "One@gmail.com", "+8801712345678")], set(), ["01712345678"]))
+
+    assert found == [1]
+    assert identities == {"one@gmail.com": 1, "+8801712345678": 1}
+
+
+def test_backfill_indexes_users_and_reports_collisions(monkeypatch, capsys):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=TABLES)
+    with Session(engine) as session:
+        session.add_all([
+            _rider(1, "one@gmail.com", "01712345678"),
+            # Same number as rider 1 in international form
+            _rider(2, "two@gmail.com", "+8801712345678"),
+            _rider(3, "three@gmail.com", "01812345678"),
+        ])
+        # Rider 3's mobile row in the pre-canonical format
+        session.add(UserIdentity(identifier="01812345678", kind="mobile", role="rider", user_id=3))
+        session.commit()
+    monkeypatch.setattr(user_identity, "session_scope", lambda: Session(engine))
+
+    assert backfill_user_identities() == 5
+    assert backfill_user_identities() == 0
+
+    with Session(engine) as session:
+        identities = dict(session.execute(
+            select(UserIdentity.identifier, UserIdentity.user_id)).all())
+    assert identities == {
+        "one@gmail.com": 1, "+8801712345678": 1, "two@gmail.com": 2,
+        "three@gmail.com": 3, "+8801812345678": 3,
+    }
+    assert "rider 2 mobile +8801712345678 already belongs to rider 1" in capsys.readouterr().out
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from conftest import ASGIWebSocket
+
+
+@pytest.mark.parametrize("message_type", ["bid-from-driver", "driver-bid-offer"])
+@pytest.mark.parametrize("req_id, closed", [(42, [42]), ("42", [42]), ("not-a-number", [])])
+def test_bid_reaches_rider_and_closes_dispatch(api, monkeypatch, message_type, req_id, closed):
+    forwarded, closed_ids = [], []
+
+    async def send_to_user(message, user_id):
+        forwarded.append(user_id)
+        return True
+
+    async def saved_notification(notification_data):
+        return 1
+
+    monkeypatch.setattr(api.manager, "send_to_user", send_to_user)
+    monkeypatch.setattr(api.trip_dispatcher, "close", closed_ids.append)
+    monkeypatch.setattr(api, "_get_trip_rider_name", lambda req_id: "Rider")
+    monkeypatch.setattr(api, "save_notification_to_db", saved_notification)
+
+    async def scenario():
+        driver = ASGIWebSocket(api.app, "/ws")
+        await driver.connect()
+        await driver.send_json({"type": message_type, "data": {
+            "driver_id": 1, "rider_id": 2, "req_id": req_id, "amount": 500}})
+        # Messages are handled in order, so the pong follows the bid
+        await driver.send_json({"type": "ping", "timestamp": 1})
+        pong = await asyncio.wait_for(driver.receive_json(), timeout=5)
+        await driver.close()
+        return pong
+
+    assert asyncio.run(scenario())["type"] == "pong"
+    assert forwarded == [2]
+    assert closed_ids == closed
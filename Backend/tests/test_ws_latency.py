@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from conftest import ASGIWebSocket
+
+SLOW_QUERY_SECONDS = 1.0
+
+
+def test_slow_query_does_not_delay_another_connections_ping(api, monkeypatch):
+    def slow_rider_name(req_id):
+        # Blocking, like a slow database round-trip
+        time.sleep(SLOW_QUERY_SECONDS)
+        return "Rider"
+
+    async def saved_notification(notification_data):
+        return 1
+
+    monkeypatch.setattr(api, "_get_trip_rider_name", slow_rider_name)
+    monkeypatch.setattr(api, "save_notification_to_db", saved_notification)
+
+    async def scenario():
+        busy = ASGIWebSocket(api.app, "/ws")
+        idle = ASGIWebSocket(api.app, "/ws")
+        await busy.connect()
+        await idle.connect()
+
+        started = time.perf_counter()
+        # The busy socket's handler waits on the slow lookup meanwhile
+        await busy.send_json({"type": "driver-bid-offer", "data": {
+            "driver_id": 1, "rider_id": 2, "amount": 500}})
+        await asyncio.sleep(0.05)
+        await idle.send_json({"type": "ping", "timestamp": 1})
+        pong = await asyncio.wait_for(idle.receive_json(), timeout=SLOW_QUERY_SECONDS * 2)
+        elapsed = time.perf_counter() - started
+
+        await idle.close()
+        await busy.close()
+        return pong, elapsed
+
+    pong, elapsed = asyncio.run(scenario())
+
+    assert pong["type"] == "pong"
+    assert elapsed < SLOW_QUERY_SECONDS / 4
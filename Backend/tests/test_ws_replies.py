@@ -0,0 +1,46 @@
+import asyncio
+
+from conftest import ASGIWebSocket
+
+
+def test_pong_is_sent_by_the_connection_writer(api):
+    async def scenario():
+        client = ASGIWebSocket(api.app, "/ws")
+        welcome = await client.connect()
+        writer = api.manager.writers[welcome["connection_id"]]
+
+        await client.send_json({"type": "ping", "timestamp": 1})
+        pong = await asyncio.wait_for(client.receive_json(), timeout=2)
+        await asyncio.sleep(0)
+        sent = writer.stats["sent"]
+
+        await client.close()
+        return pong, sent
+
+    pong, sent = asyncio.run(scenario())
+
+    assert pong["type"] == "pong"
+    # The welcome message and the pong
+    assert sent == 2
+
+
+def test_evicted_connection_does_not_reply_to_bad_input(api):
+    async def scenario():
+        client = ASGIWebSocket(api.app, "/ws")
+        welcome = await client.connect()
+        connection_id = welcome["connection_id"]
+
+        api.manager.writers[connection_id]._evict("test")
+        closed = await asyncio.wait_for(client._outgoing.get(), timeout=2)
+        await client._incoming.put({"type": "websocket.receive", "text": "not json"})
+
+        # The handler must wind down on its own instead of raising
+        await asyncio.wait_for(client._task, timeout=2)
+        return connection_id, closed, client._outgoing.qsize()
+
+    connection_id, closed, pending = asyncio.run(scenario())
+
+    assert closed["type"] == "websocket.close"
+    assert pending == 0
+    assert connection_id not in api.manager.writers
+    assert connection_id not in api.manager.active_connections
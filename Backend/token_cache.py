@@ -0,0 +1,151 @@
+"""
+Bounded cache of already-verified JWTs for authenticated endpoints.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Maximum number of verified tokens kept in memory
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Re-verify a cached token at least this often (seconds), even before it expires
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+
+
+class TokenCache:
+    """
+    LRU cache mapping a token digest to its verified claims.
+
+    An entry is served until the earlier of the token's `exp` and
+    `ttl` seconds after it was cached. Revoked tokens are remembered
+    until they would have expired, so they are rejected even on a miss.
+    Safe to use from the threadpool that runs sync dependencies.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Maps token digest -> (cached value, valid until as epoch seconds)
+        self._entries: "OrderedDict[bytes, Tuple[Any, float]]" = OrderedDict()
+        # Maps revoked token digest -> token exp as epoch seconds
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "revoked": 0}
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str, now: Optional[float] = None) -> Optional[Any]:
+        """
+        Get the cached value for a token.
+
+        Args:
+            token: Raw JWT
+            now: Current epoch time (defaults to time.time())
+
+        Returns:
+            The cached value, or None on a miss or an expired entry
+        """
+        if now is None:
+            now = time.time()
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, valid_until = entry
+            if valid_until <= now:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, token: str, value: Any, exp: Optional[float], now: Optional[float] = None):
+        """
+        Cache the verified value of a token.
+
+        Args:
+            token: Raw JWT
+            value: Value to return on later hits
+            exp: Token expiry as epoch seconds (None if it has none)
+            now: Current epoch time (defaults to time.time())
+        """
+        if now is None:
+            now = time.time()
+        valid_until = now + self.ttl
+        if exp is not None:
+            valid_until = min(valid_until, float(exp))
+        if valid_until <= now:
+            return
+        key = self._digest(token)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def is_revoked(self, token: str, now: Optional[float] = None) -> bool:
+        """
+        Check whether a token was revoked and has not expired since.
+        """
+        if now is None:
+            now = time.time()
+        key = self._digest(token)
+        with self._lock:
+            exp = self._revoked.get(key)
+            if exp is None:
+                return False
+            if exp <= now:
+                del self._revoked[key]
+                return False
+            return True
+
+    def revoke(self, token: str, exp: Optional[float], now: Optional[float] = None):
+        """
+        Drop a token from the cache and reject it until it expires.
+
+        Args:
+            token: Raw JWT
+            exp: Token expiry as epoch seconds (None keeps it for one TTL)
+            now: Current epoch time (defaults to time.time())
+        """
+        if now is None:
+            now = time.time()
+        key = self._digest(token)
+        with self._lock:
+            self._entries.pop(key, None)
+            # Forget revocations whose tokens have expired anyway
+            for revoked_key, revoked_exp in list(self._revoked.items()):
+                if revoked_exp <= now:
+                    del self._revoked[revoked_key]
+            self._revoked[key] = float(exp) if exp is not None else now + self.ttl
+            self.stats["revoked"] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Get hit/miss counters and the current size.
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "size": len(self._entries),
+                "revoked_tokens": len(self._revoked),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+            }
+
+
+# Global instance
+token_cache = TokenCache()
@@ -0,0 +1,230 @@
+"""
+Staged dispatch of new trip requests to the nearest available drivers.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from models import Driver, EngagedDriver
+from db import run_db, session_scope
+from driver_location_service import driver_location_service
+
+# Drivers notified in the first ring; each later ring adds this many more
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "5"))
+# Seconds to wait for a bid before widening the ring
+DISPATCH_RING_TIMEOUT = float(os.getenv("DISPATCH_RING_TIMEOUT", "15"))
+# Number of rings before dispatch gives up and leaves the request to the feed
+DISPATCH_MAX_ROUNDS = int(os.getenv("DISPATCH_MAX_ROUNDS", "4"))
+# Drivers further than this from the pickup point are never rung
+DISPATCH_MAX_RADIUS_KM = float(os.getenv("DISPATCH_MAX_RADIUS_KM", "50"))
+
+# Sends a message to a set of user ids
+SendFunc = Callable[[Any, Iterable[int]], Awaitable[Any]]
+
+
+def _filter_dispatchable(driver_ids: List[int]) -> Set[int]:
+    """
+    Keep the drivers that are available and not engaged (blocking).
+    """
+    with session_scope() as session:
+        rows = session.query(Driver.driver_id).filter(
+            Driver.driver_id.in_(driver_ids),
+            Driver.is_available == True,
+            ~Driver.driver_id.in_(session.query(EngagedDriver.driver_id))
+        ).all()
+    return {row.driver_id for row in rows}
+
+
+class _Dispatch:
+    """
+    State of one trip request being dispatched.
+    """
+
+    def __init__(self, req_id: int, latitude: float, longitude: float, message: Any):
+        self.req_id = req_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.message = message
+        self.started_at = time.monotonic()
+        self.round = 0
+        self.notified: Set[int] = set()
+        self.declined: Set[int] = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class TripDispatcher:
+    """
+    Pushes a new trip request to the K nearest available, unengaged drivers
+    and widens the ring when nobody bids.
+
+    Round n notifies the next `batch_size * n` nearest drivers that are
+    connected and have not been notified yet. A round ends after
+    `ring_timeout` seconds, or as soon as every notified driver declined.
+    Dispatch stops when a driver bids or the trip starts (see close()).
+    After `max_rounds` rounds the request is left to the pending trip feed.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = DISPATCH_BATCH_SIZE,
+        ring_timeout: float = DISPATCH_RING_TIMEOUT,
+        max_rounds: int = DISPATCH_MAX_ROUNDS,
+        max_radius_km: float = DISPATCH_MAX_RADIUS_KM
+    ):
+        self.batch_size = batch_size
+        self.ring_timeout = ring_timeout
+        self.max_rounds = max_rounds
+        self.max_radius_km = max_radius_km
+        # Maps req_id -> dispatch in progress
+        self._active: Dict[int, _Dispatch] = {}
+        self.stats = {
+            "dispatches": 0,
+            "rounds": 0,
+            "drivers_notified": 0,
+            "answered": 0,
+            "exhausted": 0,
+            "last_answer_ms": 0.0,
+        }
+
+    def dispatch(
+        self,
+        req_id: int,
+        latitude: float,
+        longitude: float,
+        message: Any,
+        send: SendFunc,
+        connected_drivers: Set[int]
+    ) -> bool:
+        """
+        Start dispatching a trip request on the running event loop.
+
+        Args:
+            req_id: ID of the trip request
+            latitude: Pickup latitude
+            longitude: Pickup longitude
+            message: Frame or text pushed to each selected driver
+            send: Coroutine function taking (message, driver_ids)
+            connected_drivers: Live set of connected driver ids
+
+        Returns:
+            bool: False if the request is already being dispatched
+        """
+        if req_id in self._active:
+            return False
+        state = _Dispatch(req_id, latitude, longitude, message)
+        self._active[req_id] = state
+        self.stats["dispatches"] += 1
+        state.task = asyncio.create_task(self._run(state, send, connected_drivers))
+        return True
+
+    def close(self, req_id: int, answered: bool = True):
+        """
+        Stop dispatching a trip request, e.g. when a driver bids on it.
+
+        Args:
+            req_id: ID of the trip request
+            answered: Whether a driver responded (counted in the stats)
+        """
+        state = self._active.pop(req_id, None)
+        if state is None:
+            return
+        if answered:
+            self.stats["answered"] += 1
+            self.stats["last_answer_ms"] = round(
+                (time.monotonic() - state.started_at) * 1000, 1)
+        if state.task and state.task is not asyncio.current_task():
+            state.task.cancel()
+
+    def declined(self, req_id: int, driver_id: int):
+        """
+        Record a decline; widen the ring at once if every notified driver declined.
+        """
+        state = self._active.get(req_id)
+        if state is None:
+            return
+        state.declined.add(driver_id)
+        if state.notified and state.notified <= state.declined:
+            state.wakeup.set()
+
+    def stop(self):
+        """
+        Cancel every dispatch in progress.
+        """
+        for req_id in list(self._active):
+            self.close(req_id, answered=False)
+
+    def get_stats(self) -> dict:
+        """
+        Get dispatch counters and the ring settings.
+        """
+        return {
+            **self.stats,
+            "active": len(self._active),
+            "batch_size": self.batch_size,
+            "ring_timeout": self.ring_timeout,
+            "max_rounds": self.max_rounds,
+        }
+
+    async def _run(self, state: _Dispatch, send: SendFunc, connected_drivers: Set[int]):
+        try:
+            for round_number in range(1, self.max_rounds + 1):
+                state.round = round_number
+                self.stats["rounds"] += 1
+
+                drivers = await self._next_ring(state, connected_drivers)
+                if drivers:
+                    state.notified.update(drivers)
+                    self.stats["drivers_notified"] += len(drivers)
+                    print(
+                        f"📣 Trip {state.req_id} round {round_number}: ringing drivers {sorted(drivers)}")
+                    await send(state.message, drivers)
+
+                state.wakeup.clear()
+                try:
+                    await asyncio.wait_for(state.wakeup.wait(), timeout=self.ring_timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            self.stats["exhausted"] += 1
+            print(f"⚠️ No bids for trip {state.req_id} after {self.max_rounds} rounds")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ Error dispatching trip {state.req_id}: {e}")
+        finally:
+            if self._active.get(state.req_id) is state:
+                del self._active[state.req_id]
+
+    async def _next_ring(self, state: _Dispatch, connected_drivers: Set[int]) -> Set[int]:
+        wanted = self.batch_size * state.round
+        nearest = driver_location_service.find_nearest_drivers(
+            state.latitude, state.longitude,
+            # Over-fetch: some candidates are offline, busy or unavailable
+            limit=wanted * 4,
+            exclude=state.notified
+        )
+        candidates = [
+            driver["driver_id"] for driver in nearest
+            if driver["distance_km"] <= self.max_radius_km
+            and driver["driver_id"] in connected_drivers
+        ]
+
+        if not candidates:
+            if state.round == 1:
+                # Nobody with a known position: ring drivers that have not
+                # reported one yet rather than nobody at all
+                return {
+                    driver_id for driver_id in connected_drivers
+                    if driver_location_service.get_driver_location(driver_id) is None
+                }
+            return set()
+
+        dispatchable = await run_db(_filter_dispatchable, candidates)
+        # Keep distance order while filtering
+        return set([driver_id for driver_id in candidates if driver_id in dispatchable][:wanted])
+
+
+# Global instance
+trip_dispatcher = TripDispatcher()
@@ -0,0 +1,293 @@
+"""
+Shared identity index over the driver and rider tables.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import session_scope
+from models import Driver, Rider, UserIdentity
+
+# Country code given to mobile numbers written in national form ("01...")
+MOBILE_COUNTRY_CODE = os.getenv("MOBILE_COUNTRY_CODE", "880")
+# Backfill conflicts logged one by one; the rest are only counted
+BACKFILL_REPORT_LIMIT = 50
+# Users read per backfill round-trip
+BACKFILL_BATCH_SIZE = 1000
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+
+
+def normalize_email(email: str) -> str:
+    """
+    Normalize an email for identity lookups (trimmed, lower case).
+    """
+    return email.strip().lower()
+
+
+def normalize_mobile(mobile: str) -> Optional[str]:
+    """
+    Normalize a mobile number for identity lookups to "+<country code><number>",
+    so "+8801712345678", "008801712345678" and "01712345678" share one key.
+
+    Returns:
+        Optional[str]: The canonical number, or None if it has no digits
+    """
+    digits = _NON_DIGITS.sub("", mobile)
+    if not digits:
+        return None
+    if mobile.strip().startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = MOBILE_COUNTRY_CODE + digits[1:]
+    elif not digits.startswith(MOBILE_COUNTRY_CODE):
+        digits = MOBILE_COUNTRY_CODE + digits
+    return "+" + digits if digits else None
+
+
+def normalize_identifier(phone_or_email: str) -> Optional[str]:
+    """
+    Normalize a login credential that may be an email or a mobile number.
+    Returns None for credentials that cannot match anyone.
+    """
+    if "@" in phone_or_email:
+        return normalize_email(phone_or_email) or None
+    return normalize_mobile(phone_or_email)
+
+
+def _mobile_forms(mobile: str) -> List[str]:
+    """
+    Ways the same number may be stored in the driver/rider tables.
+    """
+    forms = {mobile.strip()}
+    canonical = normalize_mobile(mobile)
+    if canonical:
+        forms.add(canonical)
+        if canonical.startswith("+" + MOBILE_COUNTRY_CODE):
+            forms.add("0" + canonical[len(MOBILE_COUNTRY_CODE) + 1:])
+    return sorted(forms)
+
+
+def identity_rows(role: str, user_id: int, email: str, mobile: str) -> List[UserIdentity]:
+    """
+    Build the identity rows for a user. Values that normalize to nothing
+    get no row.
+    """
+    rows = []
+    for kind, identifier in (("email", normalize_email(email)), ("mobile", normalize_mobile(mobile))):
+        if identifier:
+            rows.append(UserIdentity(
+                identifier=identifier, kind=kind, role=role, user_id=user_id))
+    return rows
+
+
+async def find_taken_kinds(session: AsyncSession, email: str, mobile: str) -> set:
+    """
+    Find which of email and mobile are already registered under either
+    role, with one primary-key lookup.
+
+    Returns:
+        set: Subset of {"email", "mobile"}
+    """
+    identifiers = [i for i in (normalize_email(email), normalize_mobile(mobile)) if i]
+    result = await session.execute(
+        select(UserIdentity.kind).where(UserIdentity.identifier.in_(identifiers))
+    )
+    return set(result.scalars().all())
+
+
+async def find_user_by_identifier(session: AsyncSession, phone_or_email: str, user_type: str):
+    """
+    Find a driver or rider by email or mobile through the identity index.
+
+    Users the index does not know yet (e.g. skipped by the backfill or
+    inserted outside create_user) are looked up in their own table and
+    indexed on the way, so they can still log in.
+
+    Returns:
+        Driver | Rider | None: The matching user of the given type
+    """
+    identifier = normalize_identifier(phone_or_email)
+    if identifier is None:
+        return None
+    model, id_column = (Driver, Driver.driver_id) if user_type == "driver" else (Rider, Rider.rider_id)
+    user = (await session.execute(
+        select(model)
+        .join(UserIdentity, (UserIdentity.user_id == id_column) & (UserIdentity.role == user_type))
+        .where(UserIdentity.identifier == identifier)
+    )).scalars().first()
+    if user is not None:
+        return user
+
+    if "@" in phone_or_email:
+        condition = func.lower(func.trim(model.email)) == identifier
+    else:
+        condition = model.mobile.in_(_mobile_forms(phone_or_email))
+    user = (await session.execute(select(model).where(condition))).scalars().first()
+    if user is not None:
+        await _index_user(session, user_type, user)
+    return user
+
+
+async def _index_user(session: AsyncSession, role: str, user):
+    """
+    Add the identity rows a user is missing; values owned by another
+    user are left alone and logged.
+    """
+    user_id = user.driver_id if role == "driver" else user.rider_id
+    for row in identity_rows(role, user_id, user.email, user.mobile):
+        owner = await session.get(UserIdentity, row.identifier)
+        if owner is not None:
+            if (owner.role, owner.user_id) != (role, user_id):
+                print(f"⚠️ {row.kind} of {role} {user_id} is indexed for {owner.role} {owner.user_id}")
+            continue
+        try:
+            async with session.begin_nested():
+                session.add(row)
+        except IntegrityError:
+            # Indexed concurrently by another request
+            pass
+    await session.commit()
+
+
+def get_identity_owner(session: Session, identifier: str) -> Optional[UserIdentity]:
+    """
+    Get the identity row for an already normalized email or mobile.
+    """
+    return session.get(UserIdentity, identifier)
+
+
+def replace_identifier(session: Session, role: str, user_id: int, kind: str, old_value: str, new_value: str) -> bool:
+    """
+    Point a user's email or mobile identity at a new value.
+    The caller commits.
+
+    Args:
+        session: Database session
+        role: "driver" or "rider"
+        user_id: ID of the user
+        kind: "email" or "mobile"
+        old_value: Current email or mobile as stored on the user
+        new_value: New email or mobile
+
+    Returns:
+        bool: False if the new value belongs to another user
+
+    Raises:
+        ValueError: If the new value normalizes to nothing
+    """
+    normalize = normalize_email if kind == "email" else normalize_mobile
+    old_identifier, new_identifier = normalize(old_value), normalize(new_value)
+    if not new_identifier:
+        raise ValueError(f"Invalid {kind}: {new_value!r}")
+
+    owner = get_identity_owner(session, new_identifier)
+    if owner is not None:
+        return owner.role == role and owner.user_id == user_id
+
+    old_row = get_identity_owner(session, old_identifier) if old_identifier else None
+    if old_row is not None and old_row.role == role and old_row.user_id == user_id:
+        session.delete(old_row)
+        # Free the old key before the new row is inserted
+        session.flush()
+    session.add(UserIdentity(identifier=new_identifier,
+                kind=kind, role=role, user_id=user_id))
+    return True
+
+
+def backfill_user_identities() -> int:
+    """
+    Add identity rows for drivers and riders that are missing them. Safe
+    to run repeatedly; only users without a full set of rows are read.
+    Mobile rows from before numbers were canonicalized (keys without a
+    leading "+") are replaced. Values that cannot be indexed, because
+    they normalize to nothing or another user already owns them, are
+    logged per user rather than dropped silently.
+
+    Returns:
+        int: Number of identity rows inserted
+    """
+    inserted = 0
+    skipped: List[str] = []
+    with session_scope() as session:
+        # Keys written before mobiles had one canonical form
+        session.execute(delete(UserIdentity).where(
+            UserIdentity.kind == "mobile",
+            UserIdentity.identifier.not_like("+%")))
+        session.commit()
+
+        for role, model, id_column in (
+            ("driver", Driver, Driver.driver_id),
+            ("rider", Rider, Rider.rider_id),
+        ):
+            indexed = (
+                select(UserIdentity.user_id)
+                .where(UserIdentity.role == role)
+                .group_by(UserIdentity.user_id)
+                .having(func.count() == 2)
+            )
+            users = session.execute(
+                select(id_column, model.email, model.mobile)
+                .where(id_column.not_in(indexed))
+                .order_by(id_column)
+            ).all()
+            for start in range(0, len(users), BACKFILL_BATCH_SIZE):
+                rows, problems = _identity_rows_for_batch(
+                    session, role, users[start:start + BACKFILL_BATCH_SIZE])
+                session.add_all(rows)
+                session.commit()
+                inserted += len(rows)
+                skipped.extend(problems)
+
+    for line in skipped[:BACKFILL_REPORT_LIMIT]:
+        print(f"⚠️ Not indexed: {line}")
+    if len(skipped) > BACKFILL_REPORT_LIMIT:
+        print(f"⚠️ ... and {len(skipped) - BACKFILL_REPORT_LIMIT} more values not indexed")
+    return inserted
+
+
+def _identity_rows_for_batch(session: Session, role: str, users) -> Tuple[List[UserIdentity], List[str]]:
+    """
+    Build the missing identity rows for (user_id, email, mobile) tuples.
+
+    Returns:
+        tuple: (rows to insert, descriptions of values that cannot be indexed)
+    """
+    wanted = []
+    problems = []
+    for user_id, email, mobile in users:
+        for kind, value, identifier in (
+            ("email", email, normalize_email(email)),
+            ("mobile", mobile, normalize_mobile(mobile)),
+        ):
+            if identifier:
+                wanted.append((user_id, kind, identifier))
+            else:
+                problems.append(f"{role} {user_id} {kind} {value!r} normalizes to nothing")
+
+    # One lookup for every value of the batch
+    owners: Dict[str, Tuple[str, int]] = {
+        identifier: (owner_role, owner_id)
+        for identifier, owner_role, owner_id in session.execute(
+            select(UserIdentity.identifier, UserIdentity.role, UserIdentity.user_id)
+            .where(UserIdentity.identifier.in_([identifier for _, _, identifier in wanted]))
+        )
+    }
+    rows = []
+    for user_id, kind, identifier in wanted:
+        owner = owners.get(identifier)
+        if owner is None:
+            owners[identifier] = (role, user_id)
+            rows.append(UserIdentity(
+                identifier=identifier, kind=kind, role=role, user_id=user_id))
+        elif owner != (role, user_id):
+            problems.append(
+                f"{role} {user_id} {kind} {identifier} already belongs to {owner[0]} {owner[1]}")
+    return rows, problems